@@ -0,0 +1,166 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import json
+import time
+import shutil
+import numbers
+import tempfile
+
+### Installed libs. ###
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+### Nom du manifeste d'un artefact, et version du format. ###
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+def is_artifact(path):
+	"""
+	Indique si le chemin est un artefact, c'est-à-dire un dossier avec un manifeste.
+	"""
+
+	return os.path.isfile(os.path.join(path, MANIFEST))
+
+def save_artifact(path, arrays, kind, metadata = None):
+	"""
+	Enregistre un artefact de modèle : un dossier avec un fichier `.npy` par tableau et un manifeste JSON (type, tableaux, métadonnées).
+	Le dossier est écrit à côté puis renommé, pour qu'un lecteur ne voie jamais un artefact à moitié écrit.
+
+			Args:
+				path (str) : le chemin du dossier de l'artefact.
+				arrays (dict) : les tableaux NumPy, par nom.
+				kind (str) : le type d'artefact, vérifié au chargement.
+				metadata (dict) : les métadonnées sérialisables en JSON.
+
+			Returns:
+				(none)
+	"""
+
+	path = os.path.abspath(path)
+	directory = tempfile.mkdtemp(dir = os.path.dirname(path), prefix = '.artifact-')
+	try:
+		manifest = {
+			'kind': kind,
+			'version': FORMAT_VERSION,
+			'created_at': time.time(),
+			'metadata': metadata or dict(),
+			'arrays': dict()
+		}
+		for name, array in arrays.items():
+			array = np.ascontiguousarray(array)
+			np.save(os.path.join(directory, '%s.npy' % name), array, allow_pickle = False)
+			manifest['arrays'][name] = {'file': '%s.npy' % name, 'dtype': array.dtype.str, 'shape': list(array.shape)}
+		with open(os.path.join(directory, MANIFEST), 'w', encoding = 'utf8') as f:
+			json.dump(manifest, f, indent = 2)
+
+		### Remplace l'ancien artefact : un dossier non vide ne peut pas être écrasé par un renommage. ###
+		previous = None
+		if os.path.exists(path):
+			previous = tempfile.mkdtemp(dir = os.path.dirname(path), prefix = '.artifact-old-')
+			os.rename(path, os.path.join(previous, 'artifact'))
+		os.rename(directory, path)
+		if previous:
+			shutil.rmtree(previous, ignore_errors = True)
+	except Exception:
+		shutil.rmtree(directory, ignore_errors = True)
+		raise
+
+def load_artifact(path, kind, mmap = True):
+	"""
+	Charge un artefact de modèle. Les tableaux sont projetés en mémoire (memmap, lecture seule) par défaut :
+	les processus qui chargent le même artefact partagent les pages du cache système au lieu d'en avoir chacun une copie.
+
+			Args:
+				path (str) : le chemin du dossier de l'artefact.
+				kind (str) : le type d'artefact attendu.
+				mmap (bool) : projette les tableaux en mémoire plutôt que de les lire.
+
+			Returns:
+				(tuple) Les tableaux par nom, et les métadonnées.
+	"""
+
+	with open(os.path.join(path, MANIFEST), 'r', encoding = 'utf8') as f:
+		manifest = json.load(f)
+	if manifest['kind'] != kind:
+		raise ValueError('%s is a %s artifact, not %s' % (path, manifest['kind'], kind))
+	if manifest['version'] > FORMAT_VERSION:
+		raise ValueError('%s uses artifact format %s, only %s is supported' % (path, str(manifest['version']), str(FORMAT_VERSION)))
+
+	arrays = dict()
+	for name, description in manifest['arrays'].items():
+		arrays[name] = np.load(os.path.join(path, description['file']), mmap_mode = 'r' if mmap else None, allow_pickle = False)
+	return arrays, manifest['metadata']
+
+def encode_column(values):
+	"""
+	Encode une colonne de valeurs Python en tableau NumPy : booléens, entiers, flottants et chaînes gardent un type natif,
+	le reste (listes, dictionnaires, valeurs nulles) est encodé en chaînes JSON.
+
+			Args:
+				values (list) : les valeurs de la colonne.
+
+			Returns:
+				(tuple) Le tableau, et l'encodage de la colonne.
+	"""
+
+	if all(isinstance(value, (bool, np.bool_)) for value in values):
+		return np.array(values, dtype = bool), 'bool'
+	if all(isinstance(value, numbers.Integral) and not isinstance(value, (bool, np.bool_)) for value in values):
+		return np.array(values, dtype = np.int64), 'int'
+	if all(isinstance(value, numbers.Real) and not isinstance(value, (bool, np.bool_)) for value in values):
+		return np.array(values, dtype = np.float64), 'float'
+	if all(isinstance(value, str) for value in values):
+		return np.array(values, dtype = str), 'str'
+	return np.array([json.dumps(value, default = str) for value in values], dtype = str), 'json'
+
+def save_records(path, records, kind = 'records'):
+	"""
+	Enregistre une liste de dictionnaires (comme le modèle d'utilisateurs) en colonnes : un tableau par champ.
+	"""
+
+	keys = list(dict.fromkeys(key for record in records for key in record))
+	arrays, encodings = dict(), dict()
+	for key in keys:
+		arrays[key], encodings[key] = encode_column([record.get(key) for record in records])
+	save_artifact(path, arrays, kind, {'columns': keys, 'encodings': encodings, 'n_records': len(records)})
+
+def load_records(path, kind = 'records'):
+	"""
+	Recharge une liste de dictionnaires enregistrée avec `save_records`.
+
+			Args:
+				path (str) : le chemin du dossier de l'artefact.
+				kind (str) : le type d'artefact attendu.
+
+			Returns:
+				(dict[]) Les enregistrements.
+	"""
+
+	arrays, metadata = load_artifact(path, kind)
+	columns = list()
+	for key in metadata['columns']:
+		values = arrays[key].tolist()
+		columns.append(list(map(json.loads, values)) if metadata['encodings'][key] == 'json' else values)
+	return [dict(zip(metadata['columns'], values)) for values in zip(*columns)] if columns else [dict() for _ in range(metadata['n_records'])]
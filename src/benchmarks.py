@@ -0,0 +1,526 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import io
+import time
+import json
+import math
+import random
+import pickle
+import atexit
+import argparse
+import platform
+import tempfile
+import contextlib
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from fake_api import ReplayInstagramAPI, FakeImageDownloader, make_image
+from profiling import enable as enable_profiling
+
+### Taille des jeux de données synthétiques à l'échelle 1, par étape. ###
+N_POSTS = 50
+N_USERS = 10
+N_IMAGES = 50
+N_COMMENTS = 2000
+N_PREDICTIONS = 1000
+N_FEATURES = 100000
+N_TRAIN = 200
+N_ESTIMATORS = 500
+N_ROUNDS = 3
+IMAGE_SIZE = 320
+STAGES = ['ingest', 'upserts', 'users', 'images', 'comments', 'features', 'classification']
+TABLES = ['users', 'posts', 'images', 'likes', 'comments', 'user_tags']
+
+@contextlib.contextmanager
+def quiet():
+	"""
+	Coupe la sortie standard pendant une étape, les prints de progression fausseraient les mesures.
+	"""
+
+	with contextlib.redirect_stdout(io.StringIO()):
+		yield
+
+def result(items, seconds, unit, **extra):
+	"""
+	Construit le résultat d'une étape.
+
+			Args:
+				items (int) : le nombre d'éléments traités.
+				seconds (float) : la durée de l'étape.
+				unit (str) : l'unité des éléments ('posts', 'users'...).
+				extra : des mesures propres à l'étape.
+
+			Returns:
+				(dict) Le résultat, avec le débit en éléments par seconde.
+	"""
+
+	stage = {
+		'items': items,
+		'seconds': round(seconds, 4),
+		'rate': round(items / seconds, 4) if seconds > 0 else None,
+		'unit': '%s/sec' % unit
+	}
+	stage.update(extra)
+	return stage
+
+def bench_ingest(n_posts, seed, latency = 0, error_rate = 0):
+	"""
+	Mesure le débit de `Streamer.process_post` sur l'API rejouée et la base Postgres du fichier de config.
+	Les posts viennent d'un hashtag propre au run, pour ne pas retomber sur des posts déjà en base.
+
+			Args:
+				n_posts (int) : le nombre de posts à traiter.
+				seed (int) : la graine des données synthétiques.
+				latency (float) : la latence simulée des appels à l'API et au CDN.
+				error_rate (float) : le taux d'erreur simulé de l'API et du CDN.
+
+			Returns:
+				(tuple) Le résultat de l'étape et les noms des auteurs insérés.
+	"""
+
+	import streamer
+
+	hashtag = 'benchmark%s' % str(seed)
+	api = ReplayInstagramAPI(latency = latency, error_rate = error_rate, seed = seed, n_authors = max(n_posts // 2, 1), n_pages = n_posts + 1)
+	downloader = FakeImageDownloader(latency = latency, error_rate = error_rate, seed = seed)
+	ttw, streamer.TTW = streamer.TTW, 0
+	try:
+		with quiet():
+			stream = streamer.Streamer(
+				seedAuthorCache = False,
+				api = api,
+				downloader = downloader,
+				hashtags = ([hashtag], list()),
+				checkpointPath = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+			)
+		atexit.unregister(stream.exit_handler)
+
+		### Les pages sont récupérées avant la mesure : seul le traitement des posts est chronométré. ###
+		posts, maxid = list(), ''
+		while len(posts) < n_posts and api.getHashtagFeed(hashtag, maxid):
+			posts += api.LastJson['items']
+			maxid = api.LastJson['next_max_id']
+		posts = posts[:n_posts]
+
+		stream.sqlClient.setHashtag(hashtag)
+		stream.sqlClient.openCursor()
+		calls_start, rows_start = api.n_calls, stream.n_posts
+		time_start = time.time()
+		with quiet():
+			for post in posts:
+				stream.process_post(post)
+			### Avec l'écriture différée, la mesure inclut l'écriture des dernières unités en base. ###
+			if stream.writer is not None:
+				stream.writer.flush()
+		seconds = time.time() - time_start
+		if stream.writer is not None:
+			stream.writer.close()
+		stream.sqlClient.close()
+		downloader.close()
+	finally:
+		streamer.TTW = ttw
+
+	usernames = list(dict.fromkeys(post['user']['username'] for post in posts))
+	return result(len(posts), seconds, 'posts', rows = stream.n_posts - rows_start, api_calls = api.n_calls - calls_start, api_errors = api.n_errors, latencies = stream.metrics.snapshot()['stages']), usernames
+
+def table_stats(sqlClient):
+	"""
+	Relève, pour chaque table écrite par le streamer, les lignes mises à jour, les versions mortes et la taille sur le disque.
+	"""
+
+	### Les compteurs de la session sont publiés avant la lecture (Postgres 15+); sinon on laisse au collecteur le temps de les recevoir. ###
+	try:
+		sqlClient.cursor.execute('SELECT pg_stat_force_next_flush()')
+		sqlClient.conn.commit()
+		time.sleep(0.1)
+	except Exception:
+		sqlClient.conn.rollback()
+		time.sleep(1)
+	sqlClient.cursor.execute('SELECT pg_stat_clear_snapshot()')
+	sqlClient.cursor.execute('''
+		SELECT relname, n_tup_upd, n_dead_tup, pg_total_relation_size(relid) FROM pg_stat_user_tables
+		WHERE relname = ANY(%s)
+	''', (TABLES,))
+	stats = {row[0]: {'updated': row[1], 'dead': row[2], 'bytes': row[3]} for row in sqlClient.cursor.fetchall()}
+	sqlClient.conn.commit()
+	return stats
+
+def bench_upserts(n_posts, seed, rounds = N_ROUNDS):
+	"""
+	Mesure la réécriture d'unités d'ingestion déjà en base, le cas courant quand le streamer repasse sur un auteur ou un hashtag.
+	Les unités sont écrites une première fois, puis réécrites à l'identique : on mesure le débit des réécritures et
+	ce qu'elles laissent derrière elles (lignes mises à jour, versions mortes, croissance des tables).
+
+			Args:
+				n_posts (int) : le nombre d'unités.
+				seed (int) : la graine des données synthétiques.
+				rounds (int) : le nombre de réécritures.
+
+			Returns:
+				(dict) Le résultat de l'étape.
+	"""
+
+	from sql_client import SqlClient
+	from utils import get_post_image_url
+
+	hashtag = 'upserts%s' % str(seed)
+	api = ReplayInstagramAPI(seed = seed, n_authors = max(n_posts // 2, 1), n_pages = n_posts + 1)
+	posts, maxid = list(), ''
+	while len(posts) < n_posts and api.getHashtagFeed(hashtag, maxid):
+		posts += api.LastJson['items']
+		maxid = api.LastJson['next_max_id']
+
+	units = list()
+	for post in posts[:n_posts]:
+		api.getUsernameInfo(post['user']['pk'])
+		user = api.LastJson['user']
+		api.getUserFeed(post['user']['pk'])
+		feed = api.LastJson['items']
+		api.getMediaLikers(post['id'])
+		likers = api.LastJson['users']
+		api.getMediaComments(post['id'])
+		comments = api.LastJson['comments']
+		images = {get_post_image_url(post): make_image(get_post_image_url(post)) for post in [post] + feed}
+		units.append({'hashtag': hashtag, 'top_post': False, 'post': post, 'user': user, 'feed': feed, 'likers': likers, 'comments': comments, 'images': images})
+
+	sqlClient = SqlClient()
+	sqlClient.openCursor()
+	try:
+		with quiet():
+			sqlClient.insertUnits(units)
+		before = table_stats(sqlClient)
+		time_start = time.time()
+		with quiet():
+			for _ in range(rounds):
+				sqlClient.insertUnits(units)
+		seconds = time.time() - time_start
+		after = table_stats(sqlClient)
+	finally:
+		sqlClient.close()
+
+	tables = {
+		table: {key: after[table][key] - before[table][key] for key in after[table]}
+		for table in TABLES if table in after and table in before
+	}
+	return result(len(units) * rounds, seconds, 'units', tables = tables)
+
+def bench_users(usernames):
+	"""
+	Mesure le débit de `User.getUserInfoSQL`, sur des utilisateurs en base.
+
+			Args:
+				usernames (str[]) : les noms des utilisateurs.
+
+			Returns:
+				(dict) Le résultat de l'étape.
+	"""
+
+	from user import User
+
+	errors, first_error = 0, None
+	time_start = time.time()
+	with quiet():
+		for username in usernames:
+			user = User()
+			user.username = username
+			try:
+				user.getUserInfoSQL()
+			except Exception as e:
+				errors += 1
+				first_error = first_error or '%s: %s' % (type(e).__name__, str(e))
+			finally:
+				if hasattr(user, 'sqlClient'):
+					user.sqlClient.close()
+	return result(len(usernames), time.time() - time_start, 'users', errors = errors, first_error = first_error)
+
+def bench_images(n_images, size = IMAGE_SIZE):
+	"""
+	Mesure le débit de `User.imageAnalysis` sur des images synthétiques.
+
+			Args:
+				n_images (int) : le nombre d'images.
+				size (int) : la taille des images, en pixels.
+
+			Returns:
+				(dict) Le résultat de l'étape.
+	"""
+
+	from user import User
+
+	images = [make_image('http://benchmark/%s.jpg' % str(index), size = size) for index in range(n_images)]
+	user = User()
+	user.initLists()
+	time_start = time.time()
+	with quiet():
+		for image in images:
+			user.imageAnalysis(image)
+	return result(n_images, time.time() - time_start, 'images', analyzed = len(user.dominant_colors_list))
+
+def bench_comments(n_comments, seed):
+	"""
+	Mesure le débit de `User.getCommentScore` sur des commentaires synthétiques, tirés du vocabulaire du modèle de commentaires.
+
+			Args:
+				n_comments (int) : le nombre de commentaires.
+				seed (int) : la graine des tirages.
+
+			Returns:
+				(dict) Le résultat de l'étape.
+	"""
+
+	from user import User, comments_model_path, comments_vocabulary_path
+	from artifacts import is_artifact
+	from vocabulary import CompactVocabulary
+
+	user = User()
+	if is_artifact(comments_vocabulary_path):
+		user.comments_model = CompactVocabulary().load(comments_vocabulary_path)
+	else:
+		with open(comments_model_path, 'rb') as f:
+			user.comments_model = CompactVocabulary().build(pickle.load(f))
+
+	rng = random.Random(seed)
+	vocabulary = user.comments_model.tokens()[:10000] or ['love']
+	comments = [' '.join(rng.choice(vocabulary) for _ in range(rng.randint(1, 15))) for _ in range(n_comments)]
+	time_start = time.time()
+	for comment in comments:
+		user.getCommentScore(comment)
+	return result(n_comments, time.time() - time_start, 'comments')
+
+def bench_features(n_users, seed, n_reference = 1000):
+	"""
+	Mesure l'assemblage de la matrice des features (`FeatureMatrixBuilder`) sur des utilisateurs synthétiques, catégorie comprise,
+	et, pour comparaison, le `DictVectorizer.transform` utilisateur par utilisateur qu'il remplace, sur un échantillon.
+
+			Args:
+				n_users (int) : le nombre d'utilisateurs.
+				seed (int) : la graine des tirages.
+				n_reference (int) : le nombre d'utilisateurs de l'échantillon de référence.
+
+			Returns:
+				(dict) Le résultat de l'étape.
+	"""
+
+	from sklearn.feature_extraction import DictVectorizer
+	from train import Trainer
+	from features import FeatureMatrixBuilder
+	from forest import CompactForest
+
+	rng = random.Random(seed)
+	key_features = Trainer().key_features + ['category']
+	categories = ['Personal blog', 'Artist', 'Public figure', 'Product/Service', 'None']
+
+	def make_user():
+		user = {key: rng.lognormvariate(0, 2) for key in key_features}
+		user.update(category = rng.choice(categories), testset = rng.random() < 0.25, label = rng.randint(0, 1))
+		return user
+
+	users = [make_user() for _ in range(n_users)]
+	builder = FeatureMatrixBuilder(key_features).fit(users)
+	time_start = time.time()
+	matrix = builder.transform(users)
+	builder.split(matrix, users)
+	seconds = time.time() - time_start
+
+	reference = [{key: user[key] for key in key_features} for user in users[:n_reference]]
+	dictvec = DictVectorizer().fit(reference)
+	time_start = time.time()
+	for user in reference:
+		dictvec.transform(user).toarray().flatten()
+	reference_seconds = time.time() - time_start
+	return result(n_users, seconds, 'users', dictvec_rate = round(len(reference) / reference_seconds, 4) if reference_seconds > 0 else None)
+
+def bench_classification(n_predictions, seed, n_train = N_TRAIN, n_estimators = N_ESTIMATORS):
+	"""
+	Mesure le débit de prédiction du classifieur, entraîné comme dans `Trainer.train` sur des features synthétiques.
+	On mesure la prédiction utilisateur par utilisateur (comme `Trainer.classify_user`) et la prédiction par lot,
+	avec la forêt complète et avec sa forme compacte (`CompactForest`), dont on note aussi le temps de chargement et l'écart des scores.
+
+			Args:
+				n_predictions (int) : le nombre d'utilisateurs à classer.
+				seed (int) : la graine des tirages.
+				n_train (int) : le nombre d'utilisateurs du jeu d'entraînement.
+				n_estimators (int) : le nombre d'arbres de la forêt.
+
+			Returns:
+				(dict) Le résultat de l'étape.
+	"""
+
+	import numpy as np
+	from sklearn.ensemble import RandomForestClassifier
+	from train import Trainer
+	from features import FeatureMatrixBuilder
+	from forest import CompactForest
+
+	rng = random.Random(seed)
+	key_features = Trainer().key_features
+
+	def make_user():
+		return {key: rng.lognormvariate(0, 2) for key in key_features}
+
+	train = [make_user() for _ in range(n_train)]
+	labels = [rng.randint(0, 1) for _ in range(n_train)]
+	builder = FeatureMatrixBuilder(key_features)
+	clf = RandomForestClassifier(n_estimators = n_estimators, random_state = seed)
+	clf.fit(builder.fit_transform(train), labels)
+
+	users = [make_user() for _ in range(n_predictions)]
+	time_start = time.time()
+	for user in users:
+		clf.predict_proba(builder.transform([user]))
+	seconds = time.time() - time_start
+
+	time_start = time.time()
+	clf.predict_proba(builder.transform(users))
+	batch_seconds = time.time() - time_start
+
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, 'classifier')
+		CompactForest().compact(clf).save(path)
+		time_start = time.time()
+		compact = CompactForest().load(path)
+		load_seconds = time.time() - time_start
+
+	time_start = time.time()
+	for user in users:
+		compact.predict_proba(builder.transform([user]))
+	compact_seconds = time.time() - time_start
+
+	time_start = time.time()
+	compact.predict_proba(builder.transform(users))
+	compact_batch_seconds = time.time() - time_start
+
+	matrix = builder.transform(users)
+	return result(
+		n_predictions,
+		seconds,
+		'predictions',
+		batch_rate = round(n_predictions / batch_seconds, 4) if batch_seconds > 0 else None,
+		compact_rate = round(n_predictions / compact_seconds, 4) if compact_seconds > 0 else None,
+		compact_batch_rate = round(n_predictions / compact_batch_seconds, 4) if compact_batch_seconds > 0 else None,
+		compact_load_ms = round(1000 * load_seconds, 4),
+		compact_max_difference = float(np.abs(compact.predict_proba(matrix) - clf.predict_proba(matrix)).max())
+	)
+
+def run(stages = STAGES, scale = 1, seed = None, latency = 0, error_rate = 0):
+	"""
+	Lance les étapes de benchmark demandées. Une étape en échec est notée avec son erreur, sans interrompre les suivantes.
+
+			Args:
+				stages (str[]) : les étapes à lancer.
+				scale (float) : le facteur d'échelle des jeux de données synthétiques.
+				seed (int) : la graine des données synthétiques, par défaut l'heure courante.
+				latency (float) : la latence simulée de l'API et du CDN pour l'étape d'ingestion.
+				error_rate (float) : le taux d'erreur simulé de l'API et du CDN pour l'étape d'ingestion.
+
+			Returns:
+				(dict) Les résultats, avec les paramètres du run.
+	"""
+
+	seed = int(time.time()) if seed is None else seed
+	report = {
+		'timestamp': int(time.time()),
+		'python': platform.python_version(),
+		'scale': scale,
+		'seed': seed,
+		'latency': latency,
+		'error_rate': error_rate,
+		'stages': dict()
+	}
+	usernames = None
+
+	for stage in stages:
+		print('Running %s...' % stage, flush = True)
+		try:
+			if stage == 'ingest':
+				report['stages'][stage], usernames = bench_ingest(math.ceil(N_POSTS * scale), seed, latency = latency, error_rate = error_rate)
+			elif stage == 'upserts':
+				report['stages'][stage] = bench_upserts(math.ceil(N_POSTS * scale), seed)
+			elif stage == 'users':
+				### Sans ingestion préalable, on prend des utilisateurs annotés de la base. ###
+				if usernames is None:
+					from sql_client import SqlClient
+					sqlClient = SqlClient()
+					sqlClient.openCursor()
+					usernames = [user['user_name'] for user in sqlClient.getUserNames(math.ceil(N_USERS * scale))]
+					sqlClient.close()
+				report['stages'][stage] = bench_users(usernames[:math.ceil(N_USERS * scale)])
+			elif stage == 'images':
+				report['stages'][stage] = bench_images(math.ceil(N_IMAGES * scale))
+			elif stage == 'comments':
+				report['stages'][stage] = bench_comments(math.ceil(N_COMMENTS * scale), seed)
+			elif stage == 'features':
+				report['stages'][stage] = bench_features(math.ceil(N_FEATURES * scale), seed)
+			elif stage == 'classification':
+				report['stages'][stage] = bench_classification(math.ceil(N_PREDICTIONS * scale), seed)
+		except Exception as e:
+			report['stages'][stage] = {'error': '%s: %s' % (type(e).__name__, str(e))}
+		print('    %s' % json.dumps(report['stages'][stage]), flush = True)
+
+	return report
+
+def compare(report, baseline):
+	"""
+	Compare les débits d'un run à ceux d'un run de référence.
+
+			Args:
+				report (dict) : les résultats du run.
+				baseline (dict) : les résultats du run de référence.
+
+			Returns:
+				(dict) Le rapport des débits (run / référence) de chaque étape présente dans les deux runs.
+	"""
+
+	ratios = dict()
+	for stage, current in report['stages'].items():
+		previous = baseline.get('stages', dict()).get(stage, dict())
+		if current.get('rate') and previous.get('rate'):
+			ratios[stage] = round(current['rate'] / previous['rate'], 4)
+	return ratios
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--stages', nargs = '*', default = STAGES, choices = STAGES, help = 'Les étapes à lancer.')
+	parser.add_argument('--scale', type = float, default = 1, help = 'Le facteur d\'échelle des jeux de données synthétiques.')
+	parser.add_argument('--seed', type = int, default = None, help = 'La graine des données synthétiques.')
+	parser.add_argument('--latency', type = float, default = 0, help = 'La latence simulée de l\'API et du CDN, en secondes.')
+	parser.add_argument('--error-rate', type = float, default = 0, help = 'Le taux d\'erreur simulé de l\'API et du CDN.')
+	parser.add_argument('--output', default = 'benchmark.json', help = 'Le fichier JSON des résultats.')
+	parser.add_argument('--compare', default = None, help = 'Un fichier JSON de résultats de référence.')
+	parser.add_argument('--profile', default = None, help = 'Active le profilage des fonctions chaudes, avec les rapports dans ce dossier.')
+	args = parser.parse_args()
+
+	if args.profile:
+		enable_profiling(args.profile)
+
+	report = run(args.stages, scale = args.scale, seed = args.seed, latency = args.latency, error_rate = args.error_rate)
+	if args.compare:
+		with open(args.compare, 'r', encoding = 'utf8') as f:
+			report['comparison'] = compare(report, json.load(f))
+		for stage, ratio in report['comparison'].items():
+			print('%s: x%.2f' % (stage, ratio), flush = True)
+	with open(args.output, 'w', encoding = 'utf8') as f:
+		json.dump(report, f, indent = 2)
+	print('Results written to %s' % args.output, flush = True)
@@ -0,0 +1,238 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import argparse
+
+### Installed libs. ###
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from artifacts import is_artifact, save_artifact, load_artifact
+
+biographies_model_path = os.path.join(os.path.dirname(__file__), './models/biographies')
+
+ARTIFACT_KIND = 'biography_scorer'
+CLASSES = np.array([0, 1])
+
+### Taille de l'espace de hachage, régularisation et pas d'apprentissage du classifieur, et nombre de passes à l'entraînement complet. ###
+### Le pas est constant : les mises à jour avec de nouveaux labels gardent du poids, même après un long entraînement.                ###
+N_FEATURES = 2 ** 18
+ALPHA = 1e-4
+ETA0 = 0.05
+N_EPOCHS = 5
+
+### Score neutre, donné aux biographies tant qu'aucun utilisateur annoté n'a permis d'entraîner le modèle. ###
+NEUTRAL_SCORE = 0.5
+
+class BiographyScorer(object):
+	"""
+	Score de biographie : la probabilité qu'un utilisateur soit un influenceur d'après sa biographie.
+	Les biographies sont vectorisées par hachage (sans vocabulaire à apprendre ni à stocker), et classées par une régression logistique
+	apprise en ligne (`SGDClassifier.partial_fit`) : le modèle se met à jour avec de nouveaux labels sans tout réentraîner.
+	Les poids sont enregistrés en artefact projetable en mémoire; le score d'un lot de biographies est un seul produit matrice-vecteur.
+	"""
+
+	def __init__(self, n_features = N_FEATURES, alpha = ALPHA):
+		"""
+		__init__ function.
+
+				Args:
+					n_features (int) : la taille de l'espace de hachage.
+					alpha (float) : la régularisation L2 du classifieur.
+		"""
+
+		super().__init__()
+		self.setModel(n_features, alpha)
+		self.coef = None
+		self.intercept = 0.0
+		self.t = 1.0
+		self.n_seen = 0
+
+	def setModel(self, n_features, alpha):
+		"""
+		Installe le vectoriseur et un classifieur vierge pour ces paramètres.
+		"""
+
+		self.n_features = n_features
+		self.alpha = alpha
+		self.vectorizer = HashingVectorizer(n_features = n_features, alternate_sign = False, norm = 'l2')
+		self.clf = SGDClassifier(loss = 'log_loss', alpha = alpha, learning_rate = 'constant', eta0 = ETA0, shuffle = False)
+
+	def trained(self):
+		"""
+		Indique si le modèle a vu au moins une biographie annotée.
+		"""
+
+		return self.coef is not None
+
+	def partial_fit(self, bios, labels, count = True):
+		"""
+		Met à jour le modèle avec un lot de biographies annotées.
+
+				Args:
+					bios (str[]) : les biographies.
+					labels (int[]) : les labels (1 pour un influenceur).
+					count (bool) : compte les biographies dans `n_seen`; faux pour les passes qui les revoient.
+
+				Returns:
+					(BiographyScorer) Le scorer lui-même.
+		"""
+
+		if not bios:
+			return self
+
+		### Après un chargement, le classifieur repart des poids enregistrés. ###
+		if self.coef is not None and not hasattr(self.clf, 'coef_'):
+			self.clf.coef_ = np.array(self.coef, dtype = np.float64).reshape(1, -1)
+			self.clf.intercept_ = np.array([self.intercept], dtype = np.float64)
+			self.clf.classes_ = CLASSES
+			self.clf.t_ = self.t
+			self.clf.n_features_in_ = self.n_features
+
+		self.clf.partial_fit(self.vectorizer.transform(bios), labels, classes = CLASSES)
+		self.coef = self.clf.coef_[0].astype(np.float32)
+		self.intercept = float(self.clf.intercept_[0])
+		self.t = float(self.clf.t_)
+		if count:
+			self.n_seen += len(bios)
+		return self
+
+	def fit_stream(self, batches, epochs = N_EPOCHS, seed = None):
+		"""
+		Entraîne le modèle en plusieurs passes sur un flux de lots, sans charger toutes les biographies en mémoire.
+
+				Args:
+					batches (function) : retourne un nouvel itérateur de lots (biographies, labels) à chaque passe.
+					epochs (int) : le nombre de passes.
+					seed (int) : la graine du mélange des lots.
+
+				Returns:
+					(BiographyScorer) Le scorer lui-même.
+		"""
+
+		rng = np.random.RandomState(seed)
+		for epoch in range(epochs):
+			for bios, labels in batches():
+				### Les lignes sont mélangées dans chaque lot : l'ordre de la BDD regroupe souvent les labels. ###
+				order = rng.permutation(len(bios))
+				self.partial_fit([bios[index] for index in order], [labels[index] for index in order], count = epoch == 0)
+		return self
+
+	def score(self, bios):
+		"""
+		Calcule le score d'un lot de biographies.
+
+				Args:
+					bios (str[]) : les biographies.
+
+				Returns:
+					(np.ndarray) Les probabilités d'être un influenceur.
+		"""
+
+		if not self.trained():
+			raise ValueError('The biography scorer is not trained')
+		decision = self.vectorizer.transform([bio or '' for bio in bios]) @ self.coef + self.intercept
+		return 1 / (1 + np.exp(-decision))
+
+	def save(self, path = biographies_model_path):
+		"""
+		Enregistre le scorer en artefact (cf. `artifacts.py`).
+		"""
+
+		if not self.trained():
+			raise ValueError('The biography scorer is not trained')
+		save_artifact(path, {'coef': self.coef}, ARTIFACT_KIND, {
+			'n_features': self.n_features,
+			'alpha': self.alpha,
+			'intercept': self.intercept,
+			't': self.t,
+			'n_seen': self.n_seen
+		})
+
+	def load(self, path = biographies_model_path, mmap = True):
+		"""
+		Charge un scorer enregistré avec `save`.
+
+				Args:
+					path (str) : le chemin de l'artefact.
+					mmap (bool) : projette les poids en mémoire, partagés entre les processus, plutôt que de les lire.
+
+				Returns:
+					(BiographyScorer) Le scorer lui-même.
+		"""
+
+		arrays, metadata = load_artifact(path, ARTIFACT_KIND, mmap = mmap)
+		self.setModel(metadata['n_features'], metadata['alpha'])
+		self.coef = arrays['coef']
+		self.intercept = metadata['intercept']
+		self.t = metadata['t']
+		self.n_seen = metadata['n_seen']
+		return self
+
+def save_trained(scorer, path):
+	"""
+	Enregistre le scorer s'il a été entraîné : sans biographie annotée, aucun modèle vide n'est écrit.
+	"""
+
+	if scorer.trained():
+		scorer.save(path)
+	else:
+		print('No labelled biography, the biography model is not saved.', flush = True)
+	return scorer
+
+def train(sqlClient, epochs = N_EPOCHS, path = biographies_model_path):
+	"""
+	Entraîne le scorer sur toutes les biographies annotées, lues par lots depuis la BDD, et l'enregistre.
+	"""
+
+	return save_trained(BiographyScorer().fit_stream(sqlClient.iterBiographies, epochs = epochs), path)
+
+def update(sqlClient, usernames, path = biographies_model_path):
+	"""
+	Met à jour le scorer enregistré avec les biographies d'utilisateurs nouvellement annotés, sans réentraîner sur les autres.
+	"""
+
+	scorer = BiographyScorer().load(path, mmap = False) if is_artifact(path) else BiographyScorer()
+	for bios, labels in sqlClient.iterBiographies(usernames = usernames):
+		scorer.partial_fit(bios, labels)
+	return save_trained(scorer, path)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--epochs', type = int, default = N_EPOCHS, help = 'Le nombre de passes sur les biographies.')
+	parser.add_argument('--update', nargs = '+', default = None, help = 'Met à jour le modèle avec les biographies de ces utilisateurs nouvellement annotés.')
+	args = parser.parse_args()
+
+	from sql_client import SqlClient
+
+	sqlClient = SqlClient()
+	sqlClient.openCursor()
+	try:
+		scorer = update(sqlClient, args.update) if args.update else train(sqlClient, epochs = args.epochs)
+		print('Biography model trained on %s biographies.' % str(scorer.n_seen), flush = True)
+	finally:
+		sqlClient.close()
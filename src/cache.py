@@ -0,0 +1,116 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import time
+import threading
+from collections import OrderedDict
+
+### Taille et fraîcheur par défaut du cache d'auteurs (en secondes, par champ). ###
+MAX_SIZE = 50000
+TTLS = {
+	'user': 6 * 60 * 60,
+	'feed': 24 * 60 * 60
+}
+
+class AuthorCache(object):
+	"""
+	Cache LRU à durée de vie des auteurs récemment traités par le streamer.
+	Chaque auteur garde la date de dernière récupération de chacun de ses champs (profil, feed...), avec une fraîcheur propre à chaque champ.
+	"""
+
+	def __init__(self, max_size = MAX_SIZE, ttls = None):
+		"""
+		__init__ function.
+
+				Args:
+					max_size (int) : le nombre maximal d'auteurs gardés en mémoire.
+					ttls (dict) : la durée de fraîcheur de chaque champ, en secondes.
+		"""
+
+		super().__init__()
+		self.max_size = max_size
+		self.ttls = dict(TTLS if ttls is None else ttls)
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+
+	def isFresh(self, author_id, field, now = None):
+		"""
+		Indique si le champ de l'auteur a été récupéré il y a moins que sa durée de fraîcheur.
+
+				Args:
+					author_id (str) : l'id de l'auteur.
+					field (str) : le champ considéré ('user', 'feed').
+					now (float) : la date de référence, par défaut maintenant.
+
+				Returns:
+					(bool) Vrai si on peut se passer de récupérer le champ.
+		"""
+
+		now = time.time() if now is None else now
+		with self.lock:
+			entry = self.entries.get(str(author_id))
+			if entry is None or field not in entry:
+				return False
+			self.entries.move_to_end(str(author_id))
+			return now - entry[field] < self.ttls.get(field, 0)
+
+	def touch(self, author_id, field, timestamp = None):
+		"""
+		Enregistre la récupération d'un champ de l'auteur, et évince les auteurs les moins récemment utilisés au-delà de la taille maximale.
+
+				Args:
+					author_id (str) : l'id de l'auteur.
+					field (str) : le champ récupéré.
+					timestamp (float) : la date de récupération, par défaut maintenant.
+
+				Returns:
+					(none)
+		"""
+
+		timestamp = time.time() if timestamp is None else timestamp
+		with self.lock:
+			entry = self.entries.setdefault(str(author_id), dict())
+			entry[field] = max(entry.get(field, 0), timestamp)
+			self.entries.move_to_end(str(author_id))
+			while len(self.entries) > self.max_size:
+				self.entries.popitem(last = False)
+
+	def seed(self, rows, fields = None):
+		"""
+		Pré-remplit le cache à partir de couples (id d'auteur, date d'insertion), typiquement issus de la BDD.
+
+				Args:
+					rows (tuple[]) : les couples (author_id, timestamp).
+					fields (str[]) : les champs à marquer comme récupérés, par défaut tous les champs connus.
+
+				Returns:
+					(none)
+		"""
+
+		fields = list(self.ttls.keys()) if fields is None else fields
+		for author_id, timestamp in sorted(rows, key = lambda row: row[1] or 0):
+			for field in fields:
+				self.touch(author_id, field, timestamp or 0)
+
+	def __len__(self):
+		return len(self.entries)
+
+	def __contains__(self, author_id):
+		return str(author_id) in self.entries
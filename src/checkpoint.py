@@ -0,0 +1,170 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import os
+import json
+import tempfile
+from collections import OrderedDict
+
+### Chemin par défaut du fichier de checkpoint, et nombre d'ids de posts traités qu'on garde en mémoire. ###
+checkpoint_path = os.path.join(os.path.dirname(__file__), './checkpoint.json')
+MAX_PROCESSED = 10000
+
+class StreamCheckpoint(object):
+	"""
+	État durable du stream : étape en cours, curseurs de pagination par hashtag, posts déjà traités, compteurs et rendement des hashtags.
+	"""
+
+	def __init__(self, path = checkpoint_path, max_processed = MAX_PROCESSED):
+		"""
+		__init__ function.
+
+				Args:
+					path (str) : le chemin du fichier de checkpoint.
+					max_processed (int) : le nombre d'ids de posts traités à conserver.
+		"""
+
+		super().__init__()
+		self.path = path
+		self.max_processed = max_processed
+		self.step = 0
+		self.current = None
+		self.cursors = dict()
+		self.counters = dict()
+		self.scheduler = dict()
+		self.processed = OrderedDict()
+
+	def load(self):
+		"""
+		Charge le checkpoint depuis le disque, s'il existe.
+
+				Args:
+					(none)
+
+				Returns:
+					(bool) Vrai si un checkpoint a été chargé.
+		"""
+
+		if not os.path.isfile(self.path):
+			return False
+		with open(self.path, 'r', encoding = 'utf8') as f:
+			state = json.load(f)
+		self.step = state.get('step', 0)
+		self.current = state.get('current')
+		self.cursors = state.get('cursors', dict())
+		self.counters = state.get('counters', dict())
+		self.scheduler = state.get('scheduler', dict())
+		self.processed = OrderedDict((post_id, True) for post_id in state.get('processed', list()))
+		return True
+
+	def save(self):
+		"""
+		Écrit le checkpoint de manière atomique : fichier temporaire, fsync, puis renommage.
+
+				Args:
+					(none)
+
+				Returns:
+					(none)
+		"""
+
+		state = {
+			'step': self.step,
+			'current': self.current,
+			'cursors': self.cursors,
+			'counters': self.counters,
+			'scheduler': self.scheduler,
+			'processed': list(self.processed.keys())
+		}
+		directory = os.path.dirname(os.path.abspath(self.path))
+		fd, tmp_path = tempfile.mkstemp(dir = directory, prefix = '.checkpoint-')
+		try:
+			with os.fdopen(fd, 'w', encoding = 'utf8') as f:
+				json.dump(state, f)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(tmp_path, self.path)
+		except Exception:
+			os.remove(tmp_path)
+			raise
+
+	def beginStep(self, step, hashtag, getTopPosts, maxid = ''):
+		"""
+		Enregistre l'étape en cours, pour pouvoir la reprendre à l'identique après un redémarrage.
+
+				Args:
+					step (int) : le numéro de l'étape.
+					hashtag (str) : le hashtag streamé.
+					getTopPosts (bool) : l'étape traite-t-elle les Top Posts ?
+					maxid (str) : le curseur de pagination de la page streamée.
+
+				Returns:
+					(none)
+		"""
+
+		self.step = step
+		self.current = {
+			'hashtag': hashtag,
+			'top_posts': getTopPosts,
+			'max_id': maxid
+		}
+
+	def endStep(self, hashtag, next_max_id = None):
+		"""
+		Clôt l'étape en cours et enregistre le curseur de la page suivante du hashtag.
+
+				Args:
+					hashtag (str) : le hashtag streamé.
+					next_max_id (str) : le curseur de la page suivante, retourné par l'API.
+
+				Returns:
+					(none)
+		"""
+
+		if next_max_id:
+			self.cursors[hashtag] = next_max_id
+		else:
+			self.cursors.pop(hashtag, None)
+		self.current = None
+		self.step += 1
+
+	def getCursor(self, hashtag):
+		"""
+		Retourne le curseur de pagination enregistré pour le hashtag ('' pour la première page).
+		"""
+
+		return self.cursors.get(hashtag, '')
+
+	def isProcessed(self, post_id):
+		"""
+		Indique si le post a déjà été traité.
+		"""
+
+		return str(post_id) in self.processed
+
+	def markProcessed(self, post_id):
+		"""
+		Marque le post comme traité, en oubliant les plus anciens au-delà de la limite.
+		"""
+
+		self.processed[str(post_id)] = True
+		self.processed.move_to_end(str(post_id))
+		while len(self.processed) > self.max_processed:
+			self.processed.popitem(last = False)
@@ -0,0 +1,288 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import sys
+import os
+import time
+import zlib
+import queue
+import argparse
+import configparser
+import multiprocessing
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from utils import get_sponsor_hashtags, get_random_hashtags
+
+config_path = os.path.join(os.path.dirname(__file__), './config.ini')
+checkpoints_dir = os.path.dirname(__file__)
+
+### Délai avant de relancer un worker tombé, doublé à chaque plantage rapproché, et période d'affichage du statut. ###
+RESTART_DELAY = 5
+MAX_RESTART_DELAY = 300
+STATUS_PERIOD = 60
+
+def partition(items, n):
+	"""
+	Répartit des éléments entre n workers, sans recouvrement, selon un hash stable (le même d'un lancement à l'autre).
+
+			Args:
+				items (str[]) : les éléments à répartir.
+				n (int) : le nombre de workers.
+
+			Returns:
+				(list[]) Les n listes d'éléments.
+	"""
+
+	parts = [list() for _ in range(n)]
+	for item in dict.fromkeys(items):
+		parts[zlib.crc32(str(item).encode('utf8')) % n].append(item)
+	return parts
+
+def round_robin(items, n):
+	"""
+	Répartit des éléments entre n workers, sans recouvrement, à tour de rôle : pour peu d'éléments, chacun va à un worker différent.
+
+			Args:
+				items (str[]) : les éléments à répartir.
+				n (int) : le nombre de workers.
+
+			Returns:
+				(list[]) Les n listes d'éléments.
+	"""
+
+	parts = [list() for _ in range(n)]
+	for index, item in enumerate(dict.fromkeys(items)):
+		parts[index % n].append(item)
+	return parts
+
+def get_accounts(config):
+	"""
+	Retourne les sections de comptes Instagram du fichier de config : [Instagram], [Instagram.2], [Instagram.3], etc.
+
+			Args:
+				config (ConfigParser) : le fichier de config.
+
+			Returns:
+				(str[]) Les noms des sections.
+	"""
+
+	return [section for section in config.sections() if section == 'Instagram' or section.startswith('Instagram.')]
+
+def run_streamer(account, hashtags, statusQueue, stub = False):
+	"""
+	Point d'entrée d'un worker : un streamer avec son propre compte, ses hashtags et son checkpoint.
+
+			Args:
+				account (str) : la section de config du compte Instagram.
+				hashtags (tuple) : les hashtags sponsorisés et populaires du worker.
+				statusQueue (Queue) : la file où publier les compteurs.
+				stub (bool) : utilise le bouchon de l'API au lieu d'Instagram.
+
+			Returns:
+				(none)
+	"""
+
+	### Import local : chaque processus ouvre ses propres connexions. ###
+	from streamer import Streamer
+	from fake_api import StubInstagramAPI
+
+	streamer = Streamer(
+		account = account,
+		api = StubInstagramAPI(seed = zlib.crc32(account.encode('utf8'))) if stub else None,
+		hashtags = hashtags,
+		checkpointPath = os.path.join(checkpoints_dir, 'checkpoint-%s.json' % account),
+		statusQueue = statusQueue
+	)
+	streamer.start_stream()
+
+class Coordinator(object):
+	"""
+	Coordinateur de plusieurs streamers, un par compte Instagram, dans des processus séparés.
+	"""
+
+	def __init__(self, accounts = None, target = run_streamer, stub = False, restart_delay = RESTART_DELAY):
+		"""
+		__init__ function.
+
+				Args:
+					accounts (str[]) : les sections de config des comptes, par défaut toutes les sections [Instagram*].
+					target (function) : le point d'entrée des workers, appelé avec (account, hashtags, statusQueue, stub).
+					stub (bool) : fait tourner les workers sur le bouchon de l'API.
+					restart_delay (float) : le délai de base avant de relancer un worker tombé.
+		"""
+
+		super().__init__()
+		if accounts is None:
+			config = configparser.ConfigParser()
+			config.read(config_path)
+			accounts = get_accounts(config)
+		if not accounts:
+			raise ValueError('No Instagram account section found in %s' % config_path)
+		self.accounts = list(accounts)
+		self.target = target
+		self.stub = stub
+		self.restart_delay = restart_delay
+
+		### Les hashtags sont répartis entre les comptes : deux workers ne streament jamais le même hashtag, ni donc les mêmes posts. ###
+		### Les hashtags sponsorisés, peu nombreux, sont distribués à tour de rôle pour aller chacun à un worker différent.          ###
+		sponsor_hashtags = get_sponsor_hashtags()
+		sponsor_parts = round_robin(sponsor_hashtags, len(self.accounts))
+		random_parts = partition([hashtag for hashtag in get_random_hashtags() if hashtag not in sponsor_hashtags], len(self.accounts))
+		self.hashtags = {account: (sponsor_parts[index], random_parts[index]) for index, account in enumerate(self.accounts)}
+
+		self.statusQueue = multiprocessing.Queue()
+		self.processes = dict()
+		self.restarts = {account: 0 for account in self.accounts}
+		self.next_start = {account: 0 for account in self.accounts}
+		self.counters = {account: dict() for account in self.accounts}
+
+	def startWorker(self, account):
+		"""
+		Lance (ou relance) le worker du compte.
+		"""
+
+		process = multiprocessing.Process(
+			target = self.target,
+			args = (account, self.hashtags[account], self.statusQueue, self.stub),
+			name = 'streamer-%s' % account
+		)
+		process.daemon = True
+		process.start()
+		self.processes[account] = (process, time.time())
+
+	def collect(self, timeout = 0):
+		"""
+		Récupère les compteurs publiés par les workers.
+
+				Args:
+					timeout (float) : le temps d'attente maximal du premier message.
+
+				Returns:
+					(none)
+		"""
+
+		try:
+			account, counters = self.statusQueue.get(timeout = timeout) if timeout else self.statusQueue.get_nowait()
+			self.counters[account] = counters
+			while True:
+				account, counters = self.statusQueue.get_nowait()
+				self.counters[account] = counters
+		except queue.Empty:
+			pass
+
+	def supervise(self):
+		"""
+		Relance les workers tombés, avec un délai qui double si un worker plante peu après son lancement.
+
+				Args:
+					(none)
+
+				Returns:
+					(none)
+		"""
+
+		now = time.time()
+		for account in self.accounts:
+			if account in self.processes:
+				process, started_at = self.processes[account]
+				if process.is_alive():
+					continue
+				print('Worker %s exited with code %s.' % (account, str(process.exitcode)), flush = True)
+				del self.processes[account]
+				self.restarts[account] = self.restarts[account] + 1 if now - started_at < MAX_RESTART_DELAY else 0
+				self.next_start[account] = now + min(self.restart_delay * 2 ** self.restarts[account], MAX_RESTART_DELAY)
+			if now >= self.next_start[account]:
+				self.startWorker(account)
+
+	def status(self):
+		"""
+		Retourne la vue agrégée des compteurs de tous les workers.
+
+				Args:
+					(none)
+
+				Returns:
+					(dict) Les compteurs sommés sur tous les workers, et le nombre de workers en vie.
+		"""
+
+		total = dict()
+		for counters in self.counters.values():
+			for key, value in counters.items():
+				total[key] = total.get(key, 0) + value
+		total['workers_alive'] = len([1 for process, _ in self.processes.values() if process.is_alive()])
+		return total
+
+	def display_status(self):
+		"""
+		Affiche le statut agrégé.
+		"""
+
+		total = self.status()
+		print('Workers alive : %s/%s' % (str(total['workers_alive']), str(len(self.accounts))), flush = True)
+		for key in sorted(total.keys()):
+			if key != 'workers_alive':
+				print('    %s: %s' % (key, str(total[key])), flush = True)
+
+	def run(self, status_period = STATUS_PERIOD, duration = None):
+		"""
+		Lance tous les workers et les supervise.
+
+				Args:
+					status_period (float) : la période d'affichage du statut agrégé.
+					duration (float) : la durée de fonctionnement, par défaut sans fin.
+
+				Returns:
+					(dict) Le statut agrégé final.
+		"""
+
+		time_start = time.time()
+		last_status = time_start
+		try:
+			while duration is None or time.time() - time_start < duration:
+				self.supervise()
+				self.collect(timeout = 1)
+				if time.time() - last_status >= status_period:
+					self.display_status()
+					last_status = time.time()
+		finally:
+			self.stop()
+		return self.status()
+
+	def stop(self):
+		"""
+		Arrête tous les workers.
+		"""
+
+		for process, _ in self.processes.values():
+			process.terminate()
+		for process, _ in self.processes.values():
+			process.join(timeout = 10)
+		self.collect()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--stub', action = 'store_true', help = 'Fait tourner les workers sur le bouchon de l\'API Instagram.')
+	parser.add_argument('--workers', type = int, default = 0, help = 'Avec --stub, le nombre de workers à lancer.')
+	args = parser.parse_args()
+
+	accounts = ['Instagram.stub%s' % str(index) for index in range(args.workers)] if args.stub and args.workers else None
+	Coordinator(accounts = accounts, stub = args.stub).run()
@@ -0,0 +1,143 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import json
+
+### Installed libs. ###
+import numpy as np
+from scipy.stats import rankdata
+
+sys.path.append(os.path.dirname(__file__))
+
+def pearson_matrix(matrix):
+	"""
+	Calcule la matrice des corrélations de Pearson entre les colonnes, en une passe de produits matriciels.
+	Chaque couple de colonnes est calculé sur les lignes où les deux valeurs sont connues (les NaN sont ignorés deux à deux).
+	Une corrélation avec une colonne constante, ou sur moins de deux lignes, vaut NaN.
+
+			Args:
+				matrix (np.ndarray) : la matrice (échantillons x variables).
+
+			Returns:
+				(np.ndarray) La matrice (variables x variables) des corrélations.
+	"""
+
+	matrix = np.asarray(matrix, dtype = np.float64)
+	known = np.isfinite(matrix)
+	mask = known.astype(np.float64)
+	counts = mask.sum(axis = 0)
+
+	### Les colonnes sont centrées sur leur moyenne avant les produits : sans cela, une colonne de grande moyenne et de faible ###
+	### dispersion (1e8 + N(0, 1)) perdrait toute sa variance en arrondis dans les sommes de carrés.                          ###
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		offset = np.where(counts > 0, np.where(known, matrix, 0).sum(axis = 0) / counts, 0)
+	values = np.where(known, matrix - offset, 0)
+	peak = np.where(known, np.abs(matrix), 0).max(axis = 0, initial = 0)
+
+	### Sommes restreintes aux lignes connues des deux colonnes : n[i, j], sum_x[i, j] = somme de la colonne i, etc. ###
+	n = mask.T @ mask
+	sum_x = values.T @ mask
+	sum_y = sum_x.T
+	sum_xx = (values ** 2).T @ mask
+	sum_yy = sum_xx.T
+	sum_xy = values.T @ values
+
+	with np.errstate(divide = 'ignore', invalid = 'ignore'):
+		covariance = sum_xy - sum_x * sum_y / n
+		variance_x = sum_xx - sum_x ** 2 / n
+		variance_y = sum_yy - sum_y ** 2 / n
+		denominator = np.sqrt(variance_x * variance_y)
+		correlation = covariance / denominator
+	### Les variances de l'ordre de l'arrondi des valeurs (colonnes constantes) donnent NaN plutôt qu'un bruit d'arrondi. ###
+	resolution = (16 * np.finfo(np.float64).eps * peak) ** 2
+	degenerate = (n < 2) | (variance_x <= n * resolution[:, None]) | (variance_y <= n * resolution[None, :])
+	correlation[degenerate] = np.nan
+	return np.clip(correlation, -1, 1)
+
+def rank_columns(matrix):
+	"""
+	Remplace chaque colonne par ses rangs (rangs moyens en cas d'égalité), les NaN restant NaN.
+	"""
+
+	matrix = np.asarray(matrix, dtype = np.float64)
+	ranks = np.full(matrix.shape, np.nan)
+	for column in range(matrix.shape[1]):
+		known = np.isfinite(matrix[:, column])
+		ranks[known, column] = rankdata(matrix[known, column])
+	return ranks
+
+def spearman_matrix(matrix):
+	"""
+	Calcule la matrice des corrélations de Spearman : la corrélation de Pearson des rangs de chaque colonne.
+	Les rangs sont calculés sur les valeurs connues de chaque colonne.
+	"""
+
+	return pearson_matrix(rank_columns(matrix))
+
+def correlation_report(matrix, feature_names, labels = None):
+	"""
+	Construit le rapport de corrélations des features : matrices de Pearson et de Spearman, corrélations de chaque feature avec le label,
+	colonnes constantes et valeurs manquantes. Les NaN sont écrits `None`, pour que le rapport soit du JSON valide.
+
+			Args:
+				matrix (np.ndarray) : la matrice des features (utilisateurs x features).
+				feature_names (str[]) : les noms des colonnes.
+				labels (int[]) : les labels des utilisateurs, optionnels.
+
+			Returns:
+				(dict) Le rapport.
+	"""
+
+	matrix = np.asarray(matrix, dtype = np.float64)
+	if labels is not None:
+		matrix = np.column_stack([matrix, np.asarray(labels, dtype = np.float64)])
+	pearson = pearson_matrix(matrix)
+	spearman = spearman_matrix(matrix)
+
+	def serialize(values):
+		return [None if not np.isfinite(value) else round(float(value), 6) for value in values]
+
+	n_features = len(feature_names)
+	finite = np.isfinite(matrix[:, :n_features])
+	report = {
+		'n_samples': int(matrix.shape[0]),
+		'features': list(feature_names),
+		'pearson': [serialize(row[:n_features]) for row in pearson[:n_features]],
+		'spearman': [serialize(row[:n_features]) for row in spearman[:n_features]],
+		'constant': [name for index, name in enumerate(feature_names) if np.all(np.isnan(pearson[index, :n_features]))],
+		'missing': {name: int((~finite[:, index]).sum()) for index, name in enumerate(feature_names) if not finite[:, index].all()}
+	}
+	if labels is not None:
+		report['label'] = {
+			'pearson': dict(zip(feature_names, serialize(pearson[n_features, :n_features]))),
+			'spearman': dict(zip(feature_names, serialize(spearman[n_features, :n_features])))
+		}
+	return report
+
+def write_report(report, path):
+	"""
+	Écrit le rapport de corrélations en JSON.
+	"""
+
+	with open(path, 'w', encoding = 'utf8') as f:
+		json.dump(report, f, indent = 2)
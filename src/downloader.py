@@ -0,0 +1,173 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+### Installed libs. ###
+import requests
+from requests.adapters import HTTPAdapter
+
+### Paramètres par défaut du téléchargeur. ###
+CONCURRENCY = 8
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 10
+DEADLINE = 30
+MAX_BYTES = 5 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+RETRIES = 2
+BACKOFF = 0.5
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+class ImageDownloader(object):
+	"""
+	Téléchargeur d'images du CDN Instagram, avec un pool de connexions persistantes.
+	"""
+
+	def __init__(self, concurrency = CONCURRENCY, timeout = (CONNECT_TIMEOUT, READ_TIMEOUT), deadline = DEADLINE, max_bytes = MAX_BYTES, retries = RETRIES, backoff = BACKOFF):
+		"""
+		__init__ function.
+
+				Args:
+					concurrency (int) : le nombre de téléchargements simultanés.
+					timeout (tuple) : les timeouts de connexion et de lecture, en secondes.
+					deadline (float) : la durée maximale d'un téléchargement complet, pour couper les transferts qui traînent.
+					max_bytes (int) : la taille maximale acceptée pour une image.
+					retries (int) : le nombre de nouvelles tentatives en cas d'erreur transitoire.
+					backoff (float) : le délai de base entre deux tentatives, doublé à chaque essai.
+		"""
+
+		super().__init__()
+		self.timeout = timeout
+		self.deadline = deadline
+		self.max_bytes = max_bytes
+		self.retries = retries
+		self.backoff = backoff
+
+		### Session unique et keep-alive : une seule poignée de main TCP/TLS par connexion du pool. ###
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections = concurrency, pool_maxsize = concurrency)
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+		self.executor = ThreadPoolExecutor(max_workers = concurrency)
+
+	def fetch(self, url):
+		"""
+		Télécharge une image en streaming, en refusant les réponses trop volumineuses ou trop lentes.
+
+				Args:
+					url (str) : l'adresse de l'image.
+
+				Returns:
+					(bytes) Le contenu de l'image.
+		"""
+
+		time_start = time.time()
+		with self.session.get(url, timeout = self.timeout, stream = True) as response:
+			response.raise_for_status()
+
+			### On refuse d'emblée si le serveur annonce une taille supérieure à la limite. ###
+			length = response.headers.get('Content-Length')
+			if length and int(length) > self.max_bytes:
+				raise ValueError('Image too large (%s bytes): %s' % (length, url))
+
+			content = bytearray()
+			for chunk in response.iter_content(CHUNK_SIZE):
+				content.extend(chunk)
+				if len(content) > self.max_bytes:
+					raise ValueError('Image too large (more than %s bytes): %s' % (str(self.max_bytes), url))
+				if time.time() - time_start > self.deadline:
+					raise requests.Timeout('Download took more than %s seconds: %s' % (str(self.deadline), url))
+			return bytes(content)
+
+	def download(self, url):
+		"""
+		Télécharge une image, avec de nouvelles tentatives sur les erreurs transitoires.
+
+				Args:
+					url (str) : l'adresse de l'image.
+
+				Returns:
+					(bytes) Le contenu de l'image.
+		"""
+
+		for attempt in range(self.retries + 1):
+			try:
+				return self.fetch(url)
+			except requests.HTTPError as e:
+				if e.response is None or e.response.status_code not in RETRY_STATUSES or attempt == self.retries:
+					raise
+			except (requests.ConnectionError, requests.Timeout):
+				if attempt == self.retries:
+					raise
+			time.sleep(self.backoff * 2 ** attempt)
+
+	def prefetch(self, urls):
+		"""
+		Lance le téléchargement des images en tâche de fond, sans attendre le résultat.
+
+				Args:
+					urls (str[]) : les adresses des images.
+
+				Returns:
+					(dict) Les futures des téléchargements, par adresse.
+		"""
+
+		return {url: self.executor.submit(self.download, url) for url in set(urls) if url}
+
+	def collect(self, futures):
+		"""
+		Attend la fin des téléchargements lancés par `prefetch`.
+
+				Args:
+					futures (dict) : les futures des téléchargements, par adresse.
+
+				Returns:
+					(dict) Le contenu des images téléchargées, par adresse. Les images en échec sont absentes.
+		"""
+
+		images = dict()
+		for url, future in futures.items():
+			try:
+				images[url] = future.result()
+			except Exception as e:
+				print(e)
+		return images
+
+	def downloadAll(self, urls):
+		"""
+		Télécharge des images de manière concurrente.
+
+				Args:
+					urls (str[]) : les adresses des images.
+
+				Returns:
+					(dict) Le contenu des images téléchargées, par adresse. Les images en échec sont absentes.
+		"""
+
+		return self.collect(self.prefetch(urls))
+
+	def close(self):
+		"""
+		Arrête le pool de téléchargement et ferme la session.
+		"""
+
+		self.executor.shutdown(wait = True)
+		self.session.close()
@@ -0,0 +1,679 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import sys
+import os
+import io
+import copy
+import json
+import time
+import random
+import zlib
+import argparse
+import threading
+
+### Installed libs. ###
+import requests
+from PIL import Image, ImageDraw
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from downloader import ImageDownloader
+from fetcher import AsyncFetcher
+
+### Paramètres par défaut des données synthétiques. ###
+N_AUTHORS = 1000
+PAGE_SIZE = 9
+N_PAGES = 5
+FEED_SIZE = 18
+N_COMMENTS = 10
+N_LIKERS = 50
+IMAGE_SIZE = 150
+CDN_URL = 'http://127.0.0.1/cdn/'
+
+### Méthodes de l'API dont on enregistre les réponses, et message d'erreur simulé. ###
+RECORDED_METHODS = ['getHashtagFeed', 'getUsernameInfo', 'searchUsername', 'getUserFeed', 'getMediaComments', 'getMediaLikers']
+ERROR_MESSAGE = 'Please wait a few minutes before you try again.'
+
+### Gabarits des réponses synthétiques, sur le modèle des fixtures `postTest` et `userTest` de `test_user.py`. ###
+POST_TEMPLATE = {
+	'taken_at': 1526291552,
+	'pk': 1778984940287174928,
+	'id': '1778984940287174928_1423877615',
+	'media_type': 1,
+	'code': 'BiwOWCylikQ',
+	'filter_type': 0,
+	'image_versions2': {
+		'candidates': [
+			{'width': 780, 'height': 975, 'url': ''},
+			{'width': 240, 'height': 300, 'url': ''}
+		]
+	},
+	'original_width': 780,
+	'original_height': 975,
+	'user': {
+		'pk': 1423877615,
+		'username': 'nishikch',
+		'full_name': 'nishikch',
+		'is_private': False,
+		'profile_pic_url': '',
+		'has_anonymous_profile_picture': False,
+		'is_unpublished': False,
+		'is_favorite': False
+	},
+	'can_viewer_reshare': True,
+	'caption': {
+		'pk': 17926115968082468,
+		'user_id': 1423877615,
+		'text': '',
+		'type': 1,
+		'created_at': 1526291553,
+		'content_type': 'comment',
+		'status': 'Active',
+		'media_id': 1778984940287174928
+	},
+	'caption_is_edited': False,
+	'like_count': 5,
+	'has_liked': False,
+	'comment_likes_enabled': False,
+	'has_more_comments': False,
+	'max_num_visible_preview_comments': 2,
+	'preview_comments': list(),
+	'comment_count': 1,
+	'photo_of_you': False,
+	'can_viewer_save': True,
+	'usertags': {'in': list()}
+}
+USER_TEMPLATE = {
+	'pk': 5539569547,
+	'username': 'thecolorful_traveller',
+	'full_name': 'By Christine',
+	'has_anonymous_profile_picture': False,
+	'is_private': False,
+	'is_verified': False,
+	'profile_pic_url': '',
+	'media_count': 126,
+	'follower_count': 8892,
+	'following_count': 2564,
+	'geo_media_count': 0,
+	'is_business': True,
+	'biography': '',
+	'external_url': '',
+	'hd_profile_pic_url_info': {'height': 1080, 'url': '', 'width': 1080},
+	'usertags_count': 73,
+	'has_chaining': True,
+	'is_favorite': False,
+	'public_email': '',
+	'public_phone_number': '',
+	'public_phone_country_code': '',
+	'contact_phone_number': '',
+	'city_id': '',
+	'city_name': '',
+	'address_street': '',
+	'category': 'Blogger',
+	'zip': ''
+}
+
+def archive_key(method, args):
+	"""
+	Construit la clé d'une réponse dans l'archive : le nom de la méthode et ses arguments, sans les arguments vides de fin.
+	Ainsi `getUserFeed(42)` et `getUserFeed(42, '')` désignent la même réponse.
+
+			Args:
+				method (str) : le nom de la méthode de l'API.
+				args (tuple) : les arguments de l'appel.
+
+			Returns:
+				(str) La clé.
+	"""
+
+	args = list(args)
+	while args and args[-1] in ('', None):
+		args.pop()
+	return '|'.join([method] + [str(arg) for arg in args])
+
+def make_image(url, size = IMAGE_SIZE):
+	"""
+	Génère une image JPEG synthétique, déterministe pour une même adresse : un fond et quelques aplats de couleur.
+
+			Args:
+				url (str) : l'adresse de l'image.
+				size (int) : la largeur et la hauteur de l'image, en pixels.
+
+			Returns:
+				(bytes) Le contenu de l'image.
+	"""
+
+	rng = random.Random(zlib.crc32(url.encode('utf8')))
+	image = Image.new('RGB', (size, size), tuple(rng.randint(0, 255) for _ in range(3)))
+	draw = ImageDraw.Draw(image)
+	for _ in range(rng.randint(2, 6)):
+		x, y = rng.randint(0, size - 1), rng.randint(0, size - 1)
+		draw.rectangle([x, y, x + rng.randint(10, size // 2), y + rng.randint(10, size // 2)], fill = tuple(rng.randint(0, 255) for _ in range(3)))
+	output = io.BytesIO()
+	image.save(output, 'JPEG', quality = 85)
+	return output.getvalue()
+
+class FixtureArchive(object):
+	"""
+	Archive locale de réponses de l'API Instagram et d'images du CDN, pour rejouer un stream sans connexion.
+	Les réponses sont indexées dans `index.json`, les images sont écrites dans le dossier `images/`.
+	"""
+
+	def __init__(self, path):
+		"""
+		__init__ function.
+
+				Args:
+					path (str) : le dossier de l'archive.
+		"""
+
+		super().__init__()
+		self.path = path
+		self.responses = dict()
+		self.images = dict()
+		self.lock = threading.Lock()
+
+	def load(self):
+		"""
+		Charge l'index de l'archive, s'il existe.
+
+				Args:
+					(none)
+
+				Returns:
+					(bool) Vrai si une archive a été chargée.
+		"""
+
+		index_path = os.path.join(self.path, 'index.json')
+		if not os.path.isfile(index_path):
+			return False
+		with open(index_path, 'r', encoding = 'utf8') as f:
+			index = json.load(f)
+		self.responses = index.get('responses', dict())
+		self.images = index.get('images', dict())
+		return True
+
+	def save(self):
+		"""
+		Écrit l'index de l'archive (fichier temporaire puis renommage).
+		"""
+
+		os.makedirs(self.path, exist_ok = True)
+		index_path = os.path.join(self.path, 'index.json')
+		with self.lock:
+			with open(index_path + '.tmp', 'w', encoding = 'utf8') as f:
+				json.dump({'responses': self.responses, 'images': self.images}, f)
+			os.replace(index_path + '.tmp', index_path)
+
+	def putResponse(self, method, args, response):
+		"""
+		Enregistre la réponse d'un appel à l'API.
+		"""
+
+		with self.lock:
+			self.responses[archive_key(method, args)] = copy.deepcopy(response)
+
+	def getResponse(self, method, args):
+		"""
+		Retourne une copie de la réponse enregistrée pour l'appel, ou `None`.
+		"""
+
+		response = self.responses.get(archive_key(method, args))
+		return None if response is None else copy.deepcopy(response)
+
+	def putImage(self, url, content):
+		"""
+		Écrit le contenu d'une image dans l'archive.
+		"""
+
+		filename = '%08x.jpg' % zlib.crc32(url.encode('utf8'))
+		os.makedirs(os.path.join(self.path, 'images'), exist_ok = True)
+		with open(os.path.join(self.path, 'images', filename), 'wb') as f:
+			f.write(content)
+		with self.lock:
+			self.images[url] = filename
+
+	def getImage(self, url):
+		"""
+		Retourne le contenu de l'image enregistrée pour l'adresse, ou `None`.
+		"""
+
+		filename = self.images.get(url)
+		if filename is None:
+			return None
+		with open(os.path.join(self.path, 'images', filename), 'rb') as f:
+			return f.read()
+
+	def getTemplates(self):
+		"""
+		Extrait des réponses enregistrées des gabarits de posts et d'utilisateurs pour les données synthétiques.
+
+				Args:
+					(none)
+
+				Returns:
+					(tuple) La liste des posts et la liste des utilisateurs enregistrés.
+		"""
+
+		posts, users = list(), list()
+		for key, response in self.responses.items():
+			method = key.split('|')[0]
+			if method in ('getHashtagFeed', 'getUserFeed'):
+				posts += [post for post in response.get('items', list()) if post.get('media_type') == 1]
+			elif method in ('getUsernameInfo', 'searchUsername') and 'user' in response:
+				users.append(response['user'])
+		return posts, users
+
+class StubInstagramAPI(object):
+	"""
+	Bouchon de l'API Instagram, qui génère des réponses synthétiques déterministes dans le même format que l'API.
+	Permet de faire tourner le streamer sans accès à Instagram.
+	"""
+
+	def __init__(self, username = '', password = '', n_authors = N_AUTHORS, page_size = PAGE_SIZE, n_pages = N_PAGES, feed_size = FEED_SIZE, seed = 0, post_templates = None, user_templates = None):
+		"""
+		__init__ function.
+
+				Args:
+					username (str) : ignoré, pour garder la signature de `InstagramAPI`.
+					password (str) : ignoré, pour garder la signature de `InstagramAPI`.
+					n_authors (int) : la taille de la population d'auteurs, dans laquelle on tire les auteurs des posts.
+					page_size (int) : le nombre de posts par page de hashtag.
+					n_pages (int) : le nombre de pages de chaque hashtag.
+					feed_size (int) : le nombre de posts du feed de chaque utilisateur.
+					seed (int) : la graine des tirages.
+					post_templates (dict[]) : les posts servant de gabarits, par défaut `POST_TEMPLATE`.
+					user_templates (dict[]) : les utilisateurs servant de gabarits, par défaut `USER_TEMPLATE`.
+		"""
+
+		super().__init__()
+		self.username = username
+		self.n_authors = n_authors
+		self.page_size = page_size
+		self.n_pages = n_pages
+		self.feed_size = feed_size
+		self.seed = seed
+		self.post_templates = post_templates or [POST_TEMPLATE]
+		self.user_templates = user_templates or [USER_TEMPLATE]
+		self.LastJson = dict()
+		self.n_calls = 0
+
+	def random(self, *keys):
+		"""
+		Retourne un générateur aléatoire propre aux arguments de l'appel, pour que les réponses soient reproductibles.
+		"""
+
+		return random.Random(zlib.crc32(('%s|' % str(self.seed) + '|'.join(str(key) for key in keys)).encode('utf8')))
+
+	def respond(self, response):
+		"""
+		Enregistre la réponse dans `LastJson`, comme l'API.
+		"""
+
+		self.n_calls += 1
+		self.LastJson = response
+		return True
+
+	def makeUser(self, pk):
+		"""
+		Génère un utilisateur synthétique à partir d'un gabarit.
+		"""
+
+		rng = self.random('user', pk)
+		user = copy.deepcopy(rng.choice(self.user_templates))
+		user.update({
+			'pk': int(pk),
+			'username': 'user_%s' % str(pk),
+			'full_name': 'User %s' % str(pk),
+			'is_private': False,
+			'is_verified': rng.random() < 0.05,
+			'is_business': rng.random() < 0.3,
+			'media_count': rng.randint(1, 2000),
+			'follower_count': int(rng.paretovariate(1.2) * 100),
+			'following_count': rng.randint(0, 5000),
+			'usertags_count': rng.randint(0, 300),
+			'biography': 'Bio of user %s #%s' % (str(pk), rng.choice(['travel', 'fashion', 'food', 'fitness'])),
+			'category': rng.choice(['', 'Blogger', 'Public Figure', 'Brand']),
+			'profile_pic_url': CDN_URL + 'profile/s150x150/%s.jpg' % str(pk),
+			'hd_profile_pic_url_info': {'height': 1080, 'width': 1080, 'url': CDN_URL + 'profile/%s.jpg' % str(pk)}
+		})
+		return user
+
+	def makePost(self, media_pk, author_pk, rng):
+		"""
+		Génère un post synthétique à partir d'un gabarit.
+		"""
+
+		url = CDN_URL + '%s.jpg' % str(media_pk)
+		post = copy.deepcopy(rng.choice(self.post_templates))
+		taken_at = int(time.time()) - rng.randint(0, 60 * 60 * 24 * 90)
+		user = post.get('user', dict())
+		user.update({'pk': int(author_pk), 'username': 'user_%s' % str(author_pk), 'full_name': 'User %s' % str(author_pk)})
+		caption = post.get('caption') or dict()
+		caption.update({
+			'user_id': int(author_pk),
+			'media_id': int(media_pk),
+			'created_at': taken_at,
+			'text': 'Post %s by @user_%s #love' % (str(media_pk), str(author_pk))
+		})
+		post.update({
+			'pk': int(media_pk),
+			'id': '%s_%s' % (str(media_pk), str(author_pk)),
+			'taken_at': taken_at,
+			'media_type': 1,
+			'caption': caption,
+			'image_versions2': {'candidates': [{'width': 780, 'height': 975, 'url': url + '?size=tall'}, {'width': 240, 'height': 300, 'url': url}]},
+			'like_count': rng.randint(0, 5000),
+			'comment_count': rng.randint(0, 200),
+			'user': user,
+			'usertags': {'in': list()}
+		})
+		return post
+
+	def login(self, force = False):
+		return self.respond({'status': 'ok'})
+
+	def getHashtagFeed(self, hashtagString, maxid = ''):
+		page = int(maxid) if maxid else 0
+		rng = self.random('hashtag', hashtagString, page)
+		items = list()
+		for index in range(self.page_size):
+			author_pk = rng.randint(1, self.n_authors)
+			media_pk = zlib.crc32(('%s|%s|%s' % (hashtagString, str(page), str(index))).encode('utf8'))
+			items.append(self.makePost(media_pk, author_pk, rng))
+		more_available = page + 1 < self.n_pages
+		return self.respond({
+			'status': 'ok',
+			'items': items,
+			'ranked_items': items[:3],
+			'more_available': more_available,
+			'next_max_id': str(page + 1) if more_available else None
+		})
+
+	def getUsernameInfo(self, usernameId):
+		return self.respond({'status': 'ok', 'user': self.makeUser(usernameId)})
+
+	def searchUsername(self, usernameName):
+		pk = usernameName.split('_')[-1] if usernameName.startswith('user_') else zlib.crc32(usernameName.encode('utf8'))
+		return self.respond({'status': 'ok', 'user': self.makeUser(pk)})
+
+	def getUserFeed(self, usernameId, maxid = '', minTimestamp = None):
+		rng = self.random('feed', usernameId, maxid)
+		items = [self.makePost(int(usernameId) * 1000 + index, usernameId, rng) for index in range(self.feed_size)]
+		return self.respond({'status': 'ok', 'items': items, 'more_available': False})
+
+	def getMediaComments(self, mediaId, max_id = ''):
+		rng = self.random('comments', mediaId)
+		comments = [{
+			'pk': zlib.crc32(('%s|%s' % (str(mediaId), str(index))).encode('utf8')),
+			'user_id': rng.randint(1, self.n_authors),
+			'text': rng.choice(['Love it!', 'So beautiful 😍', 'Where is this place?', 'Great shot, the colors are amazing', 'follow me'])
+		} for index in range(rng.randint(0, N_COMMENTS))]
+		return self.respond({'status': 'ok', 'comments': comments})
+
+	def getMediaLikers(self, mediaId):
+		rng = self.random('likers', mediaId)
+		users = [{'pk': rng.randint(1, self.n_authors * 10)} for _ in range(rng.randint(0, N_LIKERS))]
+		return self.respond({'status': 'ok', 'users': users})
+
+class RecordingInstagramAPI(object):
+	"""
+	Enveloppe de l'API Instagram qui enregistre dans une archive la réponse (`LastJson`) de chaque appel réussi.
+	Les autres attributs (`LastJson`, `s`, `login`...) sont ceux de l'API enveloppée.
+	"""
+
+	def __init__(self, api, archive):
+		"""
+		__init__ function.
+
+				Args:
+					api (InstagramAPI) : l'API à enregistrer.
+					archive (FixtureArchive) : l'archive où écrire les réponses.
+		"""
+
+		super().__init__()
+		self.api = api
+		self.archive = archive
+
+	def __getattr__(self, name):
+		attribute = getattr(self.api, name)
+		if name not in RECORDED_METHODS:
+			return attribute
+
+		def record(*args):
+			result = attribute(*args)
+			if result:
+				self.archive.putResponse(name, args, self.api.LastJson)
+			return result
+		return record
+
+class RecordingImageDownloader(ImageDownloader):
+	"""
+	Téléchargeur qui enregistre dans une archive les images téléchargées.
+	"""
+
+	def __init__(self, archive, **kwargs):
+		"""
+		__init__ function.
+
+				Args:
+					archive (FixtureArchive) : l'archive où écrire les images.
+					kwargs : les paramètres de `ImageDownloader`.
+		"""
+
+		super().__init__(**kwargs)
+		self.archive = archive
+
+	def fetch(self, url):
+		content = super().fetch(url)
+		self.archive.putImage(url, content)
+		return content
+
+class ReplayInstagramAPI(StubInstagramAPI):
+	"""
+	Remplaçant de l'API Instagram qui rejoue les réponses d'une archive, avec une latence et un taux d'erreur configurables.
+	Un appel absent de l'archive reçoit une réponse synthétique (générée à partir des gabarits de l'archive), ou échoue si `synthetic` est faux.
+	"""
+
+	def __init__(self, archive = None, latency = 0, error_rate = 0, synthetic = True, seed = 0, **kwargs):
+		"""
+		__init__ function.
+
+				Args:
+					archive (FixtureArchive) : l'archive à rejouer, par défaut aucune (réponses entièrement synthétiques).
+					latency (float) : la latence simulée de chaque appel, en secondes.
+					error_rate (float) : la proportion d'appels qui échouent, comme une limite de débit d'Instagram.
+					synthetic (bool) : génère une réponse pour les appels absents de l'archive.
+					seed (int) : la graine des tirages.
+					kwargs : les paramètres de `StubInstagramAPI`.
+		"""
+
+		post_templates, user_templates = archive.getTemplates() if archive is not None else (None, None)
+		super().__init__(seed = seed, post_templates = post_templates, user_templates = user_templates, **kwargs)
+		self.archive = archive
+		self.latency = latency
+		self.error_rate = error_rate
+		self.synthetic = synthetic
+		self.rng = random.Random(seed)
+		self.n_errors = 0
+
+	def fail(self, message):
+		"""
+		Simule un appel en échec : l'API retourne `False` et `LastJson` contient le message d'erreur.
+		"""
+
+		self.n_calls += 1
+		self.n_errors += 1
+		self.LastJson = {'status': 'fail', 'message': message}
+		return False
+
+	def replay(self, method, args, generate):
+		"""
+		Rejoue un appel à l'API.
+
+				Args:
+					method (str) : le nom de la méthode.
+					args (tuple) : les arguments de l'appel.
+					generate (function) : la méthode synthétique à appeler si la réponse n'est pas dans l'archive.
+
+				Returns:
+					(bool) Vrai si l'appel a réussi, comme l'API.
+		"""
+
+		if self.latency:
+			time.sleep(self.latency)
+		if self.error_rate and self.rng.random() < self.error_rate:
+			return self.fail(ERROR_MESSAGE)
+		response = self.archive.getResponse(method, args) if self.archive is not None else None
+		if response is not None:
+			return self.respond(response)
+		if self.synthetic:
+			return generate(*args)
+		return self.fail('No recorded response for %s' % archive_key(method, args))
+
+	def getHashtagFeed(self, hashtagString, maxid = ''):
+		return self.replay('getHashtagFeed', (hashtagString, maxid), super().getHashtagFeed)
+
+	def getUsernameInfo(self, usernameId):
+		return self.replay('getUsernameInfo', (usernameId,), super().getUsernameInfo)
+
+	def searchUsername(self, usernameName):
+		return self.replay('searchUsername', (usernameName,), super().searchUsername)
+
+	def getUserFeed(self, usernameId, maxid = '', minTimestamp = None):
+		return self.replay('getUserFeed', (usernameId, maxid, minTimestamp), super().getUserFeed)
+
+	def getMediaComments(self, mediaId, max_id = ''):
+		return self.replay('getMediaComments', (mediaId, max_id), super().getMediaComments)
+
+	def getMediaLikers(self, mediaId):
+		return self.replay('getMediaLikers', (mediaId,), super().getMediaLikers)
+
+class FakeImageDownloader(ImageDownloader):
+	"""
+	Remplaçant du téléchargeur qui sert les images d'une archive, ou des images synthétiques, avec une latence et un taux d'erreur configurables.
+	"""
+
+	def __init__(self, archive = None, latency = 0, error_rate = 0, seed = 0, **kwargs):
+		"""
+		__init__ function.
+
+				Args:
+					archive (FixtureArchive) : l'archive des images, par défaut aucune (images entièrement synthétiques).
+					latency (float) : la latence simulée de chaque téléchargement, en secondes.
+					error_rate (float) : la proportion de téléchargements qui échouent.
+					seed (int) : la graine des tirages.
+					kwargs : les paramètres de `ImageDownloader`.
+		"""
+
+		super().__init__(**kwargs)
+		self.archive = archive
+		self.latency = latency
+		self.error_rate = error_rate
+		self.rng = random.Random(seed)
+		self.lock = threading.Lock()
+
+	def fetch(self, url):
+		if self.latency:
+			time.sleep(self.latency)
+		with self.lock:
+			failed = self.error_rate and self.rng.random() < self.error_rate
+		if failed:
+			raise requests.ConnectionError('Simulated CDN error on %s' % url)
+		content = self.archive.getImage(url) if self.archive is not None else None
+		return content if content is not None else make_image(url)
+
+class ApiFetcher(AsyncFetcher):
+	"""
+	Couche de récupération du feed qui passe par l'objet API pour les commentaires, au lieu d'appels HTTP directs.
+	Les commentaires sont ainsi enregistrés par `RecordingInstagramAPI`, et rejoués par `ReplayInstagramAPI`.
+	"""
+
+	def __init__(self, api, downloader = None, **kwargs):
+		"""
+		__init__ function.
+
+				Args:
+					api (InstagramAPI) : l'API, enregistrée ou rejouée.
+					downloader (ImageDownloader) : le téléchargeur des images, par défaut un `FakeImageDownloader` sans archive.
+					kwargs : les paramètres de `AsyncFetcher`.
+		"""
+
+		super().__init__(api, downloader = downloader or FakeImageDownloader(), **kwargs)
+		self.lock = threading.Lock()
+
+	def fetchComments(self, media_id):
+		### `LastJson` est partagé : l'appel et sa lecture ne doivent pas être entrelacés entre threads. ###
+		with self.lock:
+			self.api.getMediaComments(str(media_id))
+			comments_server = self.api.LastJson
+		return [comment['text'] for comment in comments_server.get('comments', list())]
+
+def record(archive_path, steps = 1, usernames = None, account = 'Instagram'):
+	"""
+	Enregistre une archive depuis Instagram : quelques étapes du stream, et l'analyse live de quelques utilisateurs.
+	Le stream enregistré insère aussi ses données en base, comme un stream normal.
+
+			Args:
+				archive_path (str) : le dossier de l'archive.
+				steps (int) : le nombre d'étapes de stream à enregistrer.
+				usernames (str[]) : les noms des utilisateurs à analyser.
+				account (str) : la section de config du compte Instagram.
+
+			Returns:
+				(FixtureArchive) L'archive enregistrée.
+	"""
+
+	from InstagramAPI import InstagramAPI
+	from streamer import Streamer, config_path
+	from user import User
+	import configparser
+
+	config = configparser.ConfigParser()
+	config.read(config_path)
+	api = RecordingInstagramAPI(InstagramAPI(config[account]['user'], config[account]['password']), FixtureArchive(archive_path))
+	archive = api.archive
+	archive.load()
+	downloader = RecordingImageDownloader(archive)
+
+	try:
+		if steps:
+			streamer = Streamer(account = account, api = api, downloader = downloader, checkpointPath = os.path.join(archive_path, 'checkpoint.json'))
+			streamer.start_stream(max_steps = steps)
+		for username in usernames or list():
+			user = User()
+			user.username = username
+			user.getUserInfoIG(api = api, fetcher = ApiFetcher(api, downloader = RecordingImageDownloader(archive)))
+	finally:
+		archive.save()
+	print('Recorded %s responses and %s images in %s' % (str(len(archive.responses)), str(len(archive.images)), archive_path), flush = True)
+	return archive
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('archive', help = 'Le dossier de l\'archive à enregistrer.')
+	parser.add_argument('--steps', type = int, default = 1, help = 'Le nombre d\'étapes de stream à enregistrer.')
+	parser.add_argument('--users', nargs = '*', default = list(), help = 'Les utilisateurs à analyser en live.')
+	parser.add_argument('--account', default = 'Instagram', help = 'La section de config du compte Instagram.')
+	args = parser.parse_args()
+
+	record(args.archive, steps = args.steps, usernames = args.users, account = args.account)
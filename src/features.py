@@ -0,0 +1,139 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+from operator import itemgetter
+from itertools import repeat
+
+### Installed libs. ###
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+class FeatureMatrixBuilder(object):
+	"""
+	Assemble les features des utilisateurs en une matrice dense float32, en une passe, au lieu d'un `DictVectorizer.transform` par utilisateur.
+	Le schéma des colonnes est fixé à l'entraînement à partir des features clés, et suit celui du `DictVectorizer` : noms triés,
+	et une colonne `feature=valeur` par valeur des features textuelles (comme `category`), via des tables d'index précalculées.
+	"""
+
+	def __init__(self, key_features):
+		"""
+		__init__ function.
+
+				Args:
+					key_features (str[]) : les features clés à assembler.
+		"""
+
+		super().__init__()
+		self.key_features = list(key_features)
+		self.numeric = list()
+		self.categorical = dict()
+		self.columns = list()
+
+	def fit(self, records):
+		"""
+		Fixe le schéma des colonnes : les features dont une valeur est une chaîne de caractères sont encodées en one-hot.
+
+				Args:
+					records (dict[]) : les features des utilisateurs d'entraînement.
+
+				Returns:
+					(FeatureMatrixBuilder) Le builder lui-même.
+		"""
+
+		categorical = set(key for key in self.key_features if any(isinstance(record.get(key), str) for record in records))
+		self.numeric = sorted(key for key in self.key_features if key not in categorical)
+		self.categorical = {
+			key: {value: index for index, value in enumerate(sorted(set(str(record[key]) for record in records if record.get(key) is not None)))}
+			for key in sorted(categorical)
+		}
+
+		### Colonnes dans l'ordre du `DictVectorizer` : tous les noms triés, les valeurs textuelles sous la forme `feature=valeur`. ###
+		names = self.numeric + ['%s=%s' % (key, value) for key, values in self.categorical.items() for value in values]
+		self.columns = sorted(names)
+		self.positions = {name: index for index, name in enumerate(self.columns)}
+		self.numeric_positions = np.array([self.positions[key] for key in self.numeric], dtype = np.intp)
+		self.category_positions = {
+			key: np.array([self.positions['%s=%s' % (key, value)] for value in values], dtype = np.intp)
+			for key, values in self.categorical.items()
+		}
+		return self
+
+	def transform(self, records):
+		"""
+		Assemble la matrice des features. Les valeurs textuelles inconnues à l'entraînement sont ignorées, les valeurs nulles valent 0.
+
+				Args:
+					records (dict[]) : les features des utilisateurs.
+
+				Returns:
+					(np.ndarray) La matrice (utilisateurs x colonnes), en float32.
+		"""
+
+		n = len(records)
+		matrix = np.zeros((n, len(self.columns)), dtype = np.float32)
+		if n == 0:
+			return matrix
+
+		if self.numeric:
+			values = np.array(list(map(itemgetter(*self.numeric), records)), dtype = np.float32).reshape(n, len(self.numeric))
+			matrix[:, self.numeric_positions] = np.nan_to_num(values)
+
+		rows = np.arange(n)
+		for key, values in self.categorical.items():
+			indexes = np.fromiter(map(values.get, map(str, map(itemgetter(key), records)), repeat(-1)), dtype = np.intp, count = n)
+			known = indexes >= 0
+			matrix[rows[known], self.category_positions[key][indexes[known]]] = 1
+		return matrix
+
+	def fit_transform(self, records):
+		"""
+		Fixe le schéma des colonnes puis assemble la matrice.
+		"""
+
+		return self.fit(records).transform(records)
+
+	def split(self, matrix, records, test_key = 'testset', label_key = 'label'):
+		"""
+		Sépare la matrice en jeux d'entraînement et de test selon le masque des utilisateurs de test.
+
+				Args:
+					matrix (np.ndarray) : la matrice des features.
+					records (dict[]) : les features des utilisateurs, dans l'ordre des lignes de la matrice.
+					test_key (str) : le champ qui indique si l'utilisateur fait partie du jeu de test.
+					label_key (str) : le champ du label.
+
+				Returns:
+					(tuple) Les matrices et les labels d'entraînement et de test.
+		"""
+
+		mask = np.fromiter((bool(record[test_key]) for record in records), dtype = bool, count = len(records))
+		labels = np.fromiter((record[label_key] for record in records), dtype = np.int64, count = len(records))
+		return matrix[~mask], matrix[mask], labels[~mask], labels[mask]
+
+	def get_feature_names(self):
+		"""
+		Retourne les noms des colonnes, comme `DictVectorizer.get_feature_names`.
+		"""
+
+		return list(self.columns)
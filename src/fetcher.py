@@ -0,0 +1,191 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import sys
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+### Installed libs. ###
+import requests
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from utils import get_post_image_url
+from downloader import ImageDownloader
+
+### Paramètres par défaut de la couche de récupération. ###
+CONCURRENCY = 8
+TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+API_URL = 'https://i.instagram.com/api/v1/'
+
+class AsyncFetcher(object):
+	"""
+	Couche de récupération concurrente des images et des commentaires d'un feed Instagram.
+	"""
+
+	def __init__(self, api = None, concurrency = CONCURRENCY, timeout = TIMEOUT, retries = RETRIES, backoff = BACKOFF, downloader = None):
+		"""
+		__init__ function.
+
+				Args:
+					api (InstagramAPI) : l'API connectée, dont on reprend les cookies et les en-têtes pour les appels à l'API.
+					concurrency (int) : le nombre maximal de requêtes simultanées.
+					timeout (float) : le temps maximal d'une requête, en secondes.
+					retries (int) : le nombre de nouvelles tentatives en cas d'erreur réseau ou de code HTTP transitoire.
+					backoff (float) : le délai de base entre deux tentatives, doublé à chaque essai.
+					downloader (ImageDownloader) : le téléchargeur des images, par défaut un `ImageDownloader` aux mêmes paramètres.
+		"""
+
+		super().__init__()
+		self.api = api
+		self.concurrency = concurrency
+		self.timeout = timeout
+		self.retries = retries
+		self.backoff = backoff
+
+		### Une seule session, avec un pool de connexions à la taille de la concurrence, pour réutiliser les connexions TCP/TLS. ###
+		self.session = requests.Session()
+		adapter = HTTPAdapter(pool_connections = concurrency, pool_maxsize = concurrency)
+		self.session.mount('https://', adapter)
+		self.session.mount('http://', adapter)
+
+		### On reprend la session de l'API pour être authentifié sur les appels à l'API. ###
+		if api is not None and hasattr(api, 's'):
+			self.session.headers.update(api.s.headers)
+			self.session.cookies.update(api.s.cookies)
+
+		### L'API force `Connection: close`, ce qui empêcherait le keep-alive. ###
+		self.session.headers['Connection'] = 'keep-alive'
+
+		### Les images passent par le téléchargeur, qui borne leur taille. Un téléchargeur fourni par l'appelant reste à sa charge. ###
+		self.owns_downloader = downloader is None
+		self.downloader = downloader or ImageDownloader(concurrency = concurrency, retries = retries, backoff = backoff)
+
+	def get(self, url):
+		"""
+		Effectue une requête HTTP.GET bloquante, avec timeout et nouvelles tentatives.
+
+				Args:
+					url (str) : l'adresse à récupérer.
+
+				Returns:
+					(Response) La réponse HTTP.
+		"""
+
+		for attempt in range(self.retries + 1):
+			try:
+				response = self.session.get(url, timeout = self.timeout)
+				if response.status_code in RETRY_STATUSES and attempt < self.retries:
+					time.sleep(self.backoff * 2 ** attempt)
+					continue
+				response.raise_for_status()
+				return response
+			except (requests.ConnectionError, requests.Timeout):
+				if attempt == self.retries:
+					raise
+				time.sleep(self.backoff * 2 ** attempt)
+
+	def fetchImage(self, url):
+		"""
+		Récupère les octets d'une image du CDN Instagram.
+
+				Args:
+					url (str) : l'adresse de l'image.
+
+				Returns:
+					(bytes) Le contenu de l'image.
+		"""
+
+		return self.downloader.download(url)
+
+	def fetchComments(self, media_id):
+		"""
+		Récupère les commentaires d'un post via l'API Instagram.
+
+				Args:
+					media_id (str) : l'identifiant du post.
+
+				Returns:
+					(str[]) La liste des textes des commentaires.
+		"""
+
+		api_url = getattr(self.api, 'API_URL', API_URL)
+		comments_server = self.get(api_url + 'media/%s/comments/?' % str(media_id)).json()
+		if 'comments' in comments_server:
+			return [comment['text'] for comment in comments_server['comments']]
+		return list()
+
+	async def _run(self, loop, executor, semaphore, function, *args):
+		"""
+		Exécute une fonction bloquante dans le pool de threads, en respectant la borne de concurrence.
+		"""
+
+		async with semaphore:
+			return await loop.run_in_executor(executor, function, *args)
+
+	async def _fetchFeed(self, loop, feed):
+		"""
+		Lance en parallèle la récupération des images et des commentaires de tous les posts du feed.
+		"""
+
+		semaphore = asyncio.Semaphore(self.concurrency)
+		with ThreadPoolExecutor(max_workers = self.concurrency) as executor:
+			images = [self._run(loop, executor, semaphore, self.fetchImage, get_post_image_url(post)) for post in feed]
+			comments = [self._run(loop, executor, semaphore, self.fetchComments, post['id']) for post in feed]
+			results = await asyncio.gather(*(images + comments), return_exceptions = True)
+		return results[:len(feed)], results[len(feed):]
+
+	def fetchFeed(self, feed):
+		"""
+		Récupère de manière concurrente les images et les commentaires d'un feed.
+		Une requête en échec donne `None` pour l'image et une liste vide pour les commentaires, sans interrompre les autres.
+
+				Args:
+					feed (dict[]) : les posts du feed, tels que retournés par l'API.
+
+				Returns:
+					(tuple) La liste des images (bytes) et la liste des commentaires (str[]) de chaque post, dans l'ordre du feed.
+		"""
+
+		loop = asyncio.new_event_loop()
+		try:
+			images, comments = loop.run_until_complete(self._fetchFeed(loop, feed))
+		finally:
+			loop.close()
+
+		images = [None if isinstance(image, Exception) else image for image in images]
+		comments = [list() if isinstance(comment, Exception) else comment for comment in comments]
+		return images, comments
+
+	def close(self):
+		"""
+		Ferme les sessions HTTP. Le téléchargeur n'est fermé que s'il a été créé par le fetcher : il peut être partagé avec le streamer.
+		"""
+
+		if self.owns_downloader:
+			self.downloader.close()
+		self.session.close()
@@ -0,0 +1,201 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+
+### Installed libs. ###
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from artifacts import save_artifact, load_artifact
+
+ARTIFACT_KIND = 'compact_forest'
+### Nombre d'échantillons parcourus ensemble dans les arbres, pour borner la mémoire des prédictions par lot, ###
+### et nombre de niveaux descendus entre deux retraits des parcours arrivés à une feuille.                    ###
+BATCH_SIZE = 1024
+LEVELS_PER_PASS = 4
+
+class CompactForest(object):
+	"""
+	Forme compacte d'une forêt aléatoire entraînée, pour l'inférence : les arbres sont mis bout à bout dans quelques tableaux NumPy
+	(features et fils en int32, seuils et probabilités des classes à chaque nœud en float32), enregistrés en artefact projetable en mémoire, qui se charge en quelques millisecondes.
+	Tous les arbres sont parcourus ensemble, un niveau de profondeur à la fois, au lieu d'un appel par arbre.
+	Les arbres peuvent être tronqués à une profondeur maximale : les nœuds à cette profondeur deviennent des feuilles, avec la répartition des classes du nœud.
+	"""
+
+	def __init__(self):
+		"""
+		__init__ function.
+		"""
+
+		super().__init__()
+		self.classes = np.zeros(0)
+		self.roots = np.zeros(0, dtype = np.int32)
+		self.feature = np.zeros(0, dtype = np.int32)
+		self.threshold = np.zeros(0, dtype = np.float32)
+		self.children = np.zeros(0, dtype = np.int32)
+		self.value = np.zeros((0, 0), dtype = np.float32)
+		self.depth = 0
+
+	def compact(self, forest, max_depth = None):
+		"""
+		Aplatit les arbres d'une forêt scikit-learn entraînée.
+
+				Args:
+					forest (RandomForestClassifier) : la forêt entraînée.
+					max_depth (int) : la profondeur à laquelle tronquer les arbres, par défaut aucune.
+
+				Returns:
+					(CompactForest) La forêt compacte elle-même.
+		"""
+
+		trees = [estimator.tree_ for estimator in forest.estimators_]
+		sizes = np.array([tree.node_count for tree in trees])
+		offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+		feature, threshold, children, value = list(), list(), list(), list()
+		for tree, offset in zip(trees, offsets):
+			nodes = np.arange(tree.node_count)
+			leaf = tree.children_left == -1
+			if max_depth is not None:
+				depth = np.zeros(tree.node_count, dtype = np.int64)
+				for node in nodes[~leaf]:
+					depth[tree.children_left[node]] = depth[tree.children_right[node]] = depth[node] + 1
+				leaf = leaf | (depth >= max_depth)
+			### Une feuille boucle sur elle-même : le parcours peut continuer au-delà sans masque. ###
+			### Les fils d'un nœud sont rangés côte à côte : le droit en 2 * nœud, le gauche en 2 * nœud + 1. ###
+			feature.append(np.where(leaf, 0, tree.feature))
+			threshold.append(np.where(leaf, 0, tree.threshold))
+			children.append(np.column_stack([np.where(leaf, nodes, tree.children_right), np.where(leaf, nodes, tree.children_left)]).ravel() + offset)
+			probabilities = tree.value[:, 0, :]
+			value.append(probabilities / probabilities.sum(axis = 1, keepdims = True))
+
+		### scikit-learn compare les features en float32 à des seuils en float64 : on arrondit les seuils vers le bas, ###
+		### pour que `x <= seuil` donne exactement la même décision en float32.                                      ###
+		threshold = np.concatenate(threshold)
+		threshold32 = threshold.astype(np.float32)
+		above = threshold32 > threshold
+		threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+
+		self.classes = np.asarray(forest.classes_)
+		self.roots = offsets.astype(np.int32)
+		self.feature = np.concatenate(feature).astype(np.int32)
+		self.threshold = threshold32
+		self.children = np.concatenate(children).astype(np.int32)
+		self.value = np.ascontiguousarray(np.concatenate(value).T, dtype = np.float32)
+		self.depth = max(tree.max_depth for tree in trees) if max_depth is None else min(max(tree.max_depth for tree in trees), max_depth)
+		return self
+
+	def save(self, path):
+		"""
+		Enregistre la forêt compacte en artefact (cf. `artifacts.py`) : un `.npy` par tableau, projetable en mémoire.
+		"""
+
+		save_artifact(path, {
+			'classes': self.classes,
+			'roots': self.roots,
+			'feature': self.feature,
+			'threshold': self.threshold,
+			'children': self.children,
+			'value': self.value
+		}, ARTIFACT_KIND, {'depth': int(self.depth)})
+
+	def load(self, path, mmap = True):
+		"""
+		Charge une forêt compacte enregistrée avec `save`.
+
+				Args:
+					path (str) : le chemin de l'artefact.
+					mmap (bool) : projette les tableaux en mémoire, partagés entre les processus, plutôt que de les lire.
+
+				Returns:
+					(CompactForest) La forêt compacte elle-même.
+		"""
+
+		arrays, metadata = load_artifact(path, ARTIFACT_KIND, mmap = mmap)
+		self.classes = arrays['classes']
+		self.roots = arrays['roots']
+		self.feature = arrays['feature']
+		self.threshold = arrays['threshold']
+		self.children = arrays['children']
+		self.value = arrays['value']
+		self.depth = metadata['depth']
+		return self
+
+	def apply(self, matrix):
+		"""
+		Retourne la feuille atteinte par chaque échantillon dans chaque arbre.
+		Tous les couples (échantillon, arbre) descendent ensemble; ceux arrivés à une feuille sont retirés tous les `LEVELS_PER_PASS` niveaux.
+
+				Args:
+					matrix (np.ndarray) : la matrice des features (échantillons x colonnes).
+
+				Returns:
+					(np.ndarray) Les index des feuilles (échantillons x arbres).
+		"""
+
+		matrix = np.ascontiguousarray(matrix, dtype = np.float32)
+		n, n_columns = matrix.shape
+		values = matrix.ravel()
+		leaves = np.tile(self.roots, n)
+		offsets = np.repeat(np.arange(n, dtype = np.int32 if n * n_columns < 2 ** 31 else np.int64) * n_columns, len(self.roots))
+		active = np.arange(leaves.size)
+		nodes = leaves[active]
+		level = 0
+		while active.size and level < self.depth:
+			for _ in range(LEVELS_PER_PASS):
+				go_left = values.take(self.feature.take(nodes) + offsets) <= self.threshold.take(nodes)
+				nodes = self.children.take(2 * nodes + go_left)
+			level += LEVELS_PER_PASS
+			leaves[active] = nodes
+			running = self.children.take(2 * nodes) != nodes
+			active, nodes, offsets = active[running], nodes[running], offsets[running]
+		return leaves.reshape(n, len(self.roots))
+
+	def predict_proba(self, matrix, batch_size = BATCH_SIZE):
+		"""
+		Calcule les probabilités des classes, moyennes des probabilités des feuilles atteintes comme `RandomForestClassifier.predict_proba`.
+
+				Args:
+					matrix (np.ndarray) : la matrice des features (échantillons x colonnes).
+					batch_size (int) : le nombre d'échantillons parcourus ensemble.
+
+				Returns:
+					(np.ndarray) Les probabilités (échantillons x classes).
+		"""
+
+		matrix = np.asarray(matrix, dtype = np.float32)
+		probabilities = np.zeros((matrix.shape[0], len(self.classes)), dtype = np.float32)
+		for start in range(0, matrix.shape[0], batch_size):
+			leaves = self.apply(matrix[start:start + batch_size])
+			for index, values in enumerate(self.value):
+				probabilities[start:start + batch_size, index] = values.take(leaves).mean(axis = 1)
+		return probabilities
+
+	def predict(self, matrix):
+		"""
+		Retourne la classe la plus probable de chaque échantillon.
+		"""
+
+		return self.classes[np.argmax(self.predict_proba(matrix), axis = 1)]
@@ -0,0 +1,312 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import os
+import re
+import json
+import time
+import bisect
+import threading
+import contextlib
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+### Bornes des histogrammes de latence, en secondes, et préfixe des métriques exposées. ###
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+PREFIX = 'instaseek'
+SNAPSHOT_PERIOD = 60
+
+class Histogram(object):
+	"""
+	Histogramme de latences à bornes fixes, dans le format des histogrammes Prometheus.
+	"""
+
+	def __init__(self, buckets = BUCKETS):
+		"""
+		__init__ function.
+
+				Args:
+					buckets (float[]) : les bornes supérieures des classes, croissantes.
+		"""
+
+		super().__init__()
+		self.buckets = list(buckets)
+		self.counts = [0] * (len(self.buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+		self.max = 0.0
+
+	def observe(self, value):
+		"""
+		Ajoute une mesure.
+		"""
+
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+		self.max = max(self.max, value)
+
+	def quantile(self, q):
+		"""
+		Estime un quantile par interpolation linéaire dans la classe qui le contient.
+
+				Args:
+					q (float) : le quantile, entre 0 et 1.
+
+				Returns:
+					(float) L'estimation du quantile, `None` sans mesure.
+		"""
+
+		if self.count == 0:
+			return None
+		rank = q * self.count
+		cumulated = 0
+		for index, count in enumerate(self.counts):
+			if count and cumulated + count >= rank:
+				lower = self.buckets[index - 1] if index > 0 else 0.0
+				upper = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+				return lower + (upper - lower) * (rank - cumulated) / count
+			cumulated += count
+		return self.max
+
+	def summary(self):
+		"""
+		Retourne le résumé de l'histogramme : nombre, moyenne, médiane, p95 et maximum.
+		"""
+
+		return {
+			'count': self.count,
+			'sum': round(self.sum, 4),
+			'mean': round(self.sum / self.count, 4) if self.count else None,
+			'p50': round(self.quantile(0.5), 4) if self.count else None,
+			'p95': round(self.quantile(0.95), 4) if self.count else None,
+			'max': round(self.max, 4)
+		}
+
+class Metrics(object):
+	"""
+	Métriques d'un processus : histogrammes de latence par étape, compteurs de débit et compteurs d'erreurs par endpoint.
+	Exposées en texte Prometheus sur un port local, et/ou en instantanés JSON périodiques.
+	"""
+
+	def __init__(self, labels = None, buckets = BUCKETS):
+		"""
+		__init__ function.
+
+				Args:
+					labels (dict) : les labels ajoutés à toutes les métriques exposées (par exemple le compte Instagram).
+					buckets (float[]) : les bornes des histogrammes de latence.
+		"""
+
+		super().__init__()
+		self.labels = dict(labels or dict())
+		self.buckets = buckets
+		self.stages = dict()
+		self.counters = dict()
+		self.errors = dict()
+		self.time_start = time.time()
+		self.last_snapshot = 0
+		self.lock = threading.Lock()
+		self.server = None
+
+	def observe(self, stage, seconds):
+		"""
+		Enregistre la durée d'une étape.
+		"""
+
+		with self.lock:
+			if stage not in self.stages:
+				self.stages[stage] = Histogram(self.buckets)
+			self.stages[stage].observe(seconds)
+
+	@contextlib.contextmanager
+	def timer(self, stage):
+		"""
+		Chronomètre le bloc et enregistre sa durée dans l'histogramme de l'étape, qu'il réussisse ou non.
+		"""
+
+		time_start = time.time()
+		try:
+			yield
+		finally:
+			self.observe(stage, time.time() - time_start)
+
+	def inc(self, counter, n = 1):
+		"""
+		Incrémente un compteur de débit.
+		"""
+
+		with self.lock:
+			self.counters[counter] = self.counters.get(counter, 0) + n
+
+	def error(self, endpoint, n = 1):
+		"""
+		Incrémente le compteur d'erreurs d'un endpoint.
+		"""
+
+		with self.lock:
+			self.errors[endpoint] = self.errors.get(endpoint, 0) + n
+
+	def snapshot(self):
+		"""
+		Retourne l'état des métriques sous forme sérialisable.
+
+				Args:
+					(none)
+
+				Returns:
+					(dict) Les compteurs, les erreurs et le résumé de la latence de chaque étape.
+		"""
+
+		with self.lock:
+			uptime = time.time() - self.time_start
+			return {
+				'timestamp': int(time.time()),
+				'uptime': round(uptime, 1),
+				'labels': dict(self.labels),
+				'counters': dict(self.counters),
+				'rates': {counter: round(value / uptime, 4) for counter, value in self.counters.items()} if uptime > 0 else dict(),
+				'errors': dict(self.errors),
+				'stages': {stage: histogram.summary() for stage, histogram in self.stages.items()}
+			}
+
+	def formatLabels(self, **labels):
+		"""
+		Formate les labels d'une ligne Prometheus, labels globaux compris.
+		"""
+
+		labels = dict(self.labels, **labels)
+		if not labels:
+			return ''
+		return '{%s}' % ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"')) for key, value in sorted(labels.items()))
+
+	def toPrometheus(self):
+		"""
+		Retourne les métriques au format texte de Prometheus.
+
+				Args:
+					(none)
+
+				Returns:
+					(str) Le texte exposé sur `/metrics`.
+		"""
+
+		lines = list()
+		with self.lock:
+			for counter in sorted(self.counters):
+				name = '%s_%s_total' % (PREFIX, re.sub(r'[^a-zA-Z0-9_]', '_', counter))
+				lines.append('# TYPE %s counter' % name)
+				lines.append('%s%s %s' % (name, self.formatLabels(), str(self.counters[counter])))
+
+			name = '%s_errors_total' % PREFIX
+			lines.append('# TYPE %s counter' % name)
+			for endpoint in sorted(self.errors):
+				lines.append('%s%s %s' % (name, self.formatLabels(endpoint = endpoint), str(self.errors[endpoint])))
+
+			name = '%s_stage_seconds' % PREFIX
+			lines.append('# TYPE %s histogram' % name)
+			for stage in sorted(self.stages):
+				histogram = self.stages[stage]
+				cumulated = 0
+				for bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+					cumulated += count
+					lines.append('%s_bucket%s %s' % (name, self.formatLabels(stage = stage, le = bound), str(cumulated)))
+				lines.append('%s_sum%s %s' % (name, self.formatLabels(stage = stage), repr(histogram.sum)))
+				lines.append('%s_count%s %s' % (name, self.formatLabels(stage = stage), str(histogram.count)))
+		return '\n'.join(lines) + '\n'
+
+	def writeSnapshot(self, path):
+		"""
+		Écrit un instantané JSON des métriques (fichier temporaire puis renommage).
+		"""
+
+		with open(path + '.tmp', 'w', encoding = 'utf8') as f:
+			json.dump(self.snapshot(), f, indent = 2)
+		os.replace(path + '.tmp', path)
+		self.last_snapshot = time.time()
+
+	def maybeSnapshot(self, path, period = SNAPSHOT_PERIOD):
+		"""
+		Écrit un instantané JSON si le dernier date de plus d'une période.
+
+				Args:
+					path (str) : le fichier de l'instantané, aucun si vide.
+					period (float) : la période des instantanés, en secondes.
+
+				Returns:
+					(bool) Vrai si un instantané a été écrit.
+		"""
+
+		if not path or time.time() - self.last_snapshot < period:
+			return False
+		self.writeSnapshot(path)
+		return True
+
+	def serve(self, port, host = '127.0.0.1'):
+		"""
+		Expose les métriques sur un serveur HTTP local, dans un thread : `/metrics` en texte Prometheus, `/metrics.json` en JSON.
+
+				Args:
+					port (int) : le port d'écoute (0 pour un port libre).
+					host (str) : l'adresse d'écoute.
+
+				Returns:
+					(int) Le port d'écoute.
+		"""
+
+		metrics = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def do_GET(self):
+				if self.path == '/metrics':
+					body, content_type = metrics.toPrometheus().encode('utf8'), 'text/plain; version=0.0.4'
+				elif self.path == '/metrics.json':
+					body, content_type = json.dumps(metrics.snapshot()).encode('utf8'), 'application/json'
+				else:
+					self.send_error(404)
+					return
+				self.send_response(200)
+				self.send_header('Content-Type', content_type)
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, format, *args):
+				pass
+
+		class Server(ThreadingMixIn, HTTPServer):
+			daemon_threads = True
+
+		self.server = Server((host, port), Handler)
+		thread = threading.Thread(target = self.server.serve_forever, name = 'metrics-server')
+		thread.daemon = True
+		thread.start()
+		return self.server.server_address[1]
+
+	def close(self):
+		"""
+		Arrête le serveur HTTP, s'il tourne.
+		"""
+
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
@@ -21,6 +21,9 @@ import random
 
 from sql_client import SqlClient
 
+### Nombre de partitions (par hash de post_id) des likes et des commentaires. ###
+N_PARTITIONS = 16
+
 class Migrations(object):
     """
     Classe Migration. Définit les migrations à opérer sur la base de données, ainsi que les rollbacks possibles.
@@ -75,6 +78,196 @@ class Migrations(object):
             sqlClient.setTest(user['user_name'], False)
             sqlClient.closeCursor()
 
+    def mig_2(self):
+        """
+        Migration n°2. Indexe les images par post, pour vérifier en une requête les images déjà téléchargées.
+        """
+
+        sqlClient = SqlClient()
+        sqlClient.openCursor()
+        sqlClient.cursor.execute('''
+            CREATE INDEX IF NOT EXISTS fki_id_post_images ON public.images USING btree (post_id)
+        ''')
+        sqlClient.conn.commit()
+        sqlClient.close()
+
+    def mig_2_rollback(self):
+        """
+        Rollback de la migration n°2.
+        """
+
+        sqlClient = SqlClient()
+        sqlClient.openCursor()
+        sqlClient.cursor.execute('''
+            DROP INDEX IF EXISTS public.fki_id_post_images
+        ''')
+        sqlClient.conn.commit()
+        sqlClient.close()
+
+    def mig_3(self, partitions = N_PARTITIONS):
+        """
+        Migration n°3. Passe les likes et les commentaires dans une disposition partitionnée par hash de post_id, avec des clés compactes :
+        (post_id, user_id) pour les likes et (post_id, id_comment) pour les commentaires, au lieu des clés texte concaténées.
+        Les deux tables gagnent une date d'insertion, et la table `like_edges` reçoit les likes agrégés par la rétention (cf. `retention.py`).
+        Les posts gagnent la date de rétention de leurs likes agrégés (`likes_aged_before`), pour ne pas les réinsérer ni les compter deux fois.
+        Les lignes dont les ids ne sont pas numériques ne sont pas reprises. Tout se fait en une transaction.
+        """
+
+        sqlClient = SqlClient()
+        sqlClient.openCursor()
+        if sqlClient.isPartitioned():
+            print('Likes and comments are already partitioned.')
+            sqlClient.close()
+            return
+
+        with sqlClient.transaction():
+            ### Les vues de statistiques dépendent des anciennes tables : on les recrée sur les nouvelles. ###
+            stats_views = sqlClient.hasStatsViews()
+            if stats_views:
+                sqlClient.dropStatsViews(commit = False)
+            sqlClient.cursor.execute('''
+                ALTER TABLE public.likes RENAME TO likes_legacy;
+                ALTER TABLE public.likes_legacy RENAME CONSTRAINT likes_pkey TO likes_legacy_pkey;
+                ALTER TABLE public.comments RENAME TO comments_legacy;
+                ALTER TABLE public.comments_legacy RENAME CONSTRAINT comments_pkey TO comments_legacy_pkey;
+
+                CREATE TABLE public.likes (
+                    post_id text NOT NULL,
+                    user_id bigint NOT NULL,
+                    timestamp_inserted_at integer NOT NULL,
+                    CONSTRAINT likes_pkey PRIMARY KEY (post_id, user_id),
+                    CONSTRAINT id_post_likes FOREIGN KEY (post_id) REFERENCES public.posts(id_post)
+                ) PARTITION BY HASH (post_id);
+
+                CREATE TABLE public.comments (
+                    post_id text NOT NULL,
+                    id_comment bigint NOT NULL,
+                    user_id bigint NOT NULL,
+                    comment text NOT NULL,
+                    timestamp_inserted_at integer NOT NULL,
+                    CONSTRAINT comments_pkey PRIMARY KEY (post_id, id_comment),
+                    CONSTRAINT id_post_comments FOREIGN KEY (post_id) REFERENCES public.posts(id_post)
+                ) PARTITION BY HASH (post_id);
+
+                CREATE INDEX likes_timestamp_inserted_at ON public.likes USING btree (timestamp_inserted_at);
+
+                CREATE TABLE IF NOT EXISTS public.like_edges (
+                    liker_id bigint NOT NULL,
+                    author_id text NOT NULL,
+                    n_likes integer NOT NULL,
+                    CONSTRAINT like_edges_pkey PRIMARY KEY (liker_id, author_id)
+                );
+
+                ALTER TABLE public.posts ADD COLUMN IF NOT EXISTS likes_aged_before integer;
+            ''')
+            for table in ['likes', 'comments']:
+                for remainder in range(partitions):
+                    sqlClient.cursor.execute('''
+                        CREATE TABLE public.%s_%s PARTITION OF public.%s FOR VALUES WITH (MODULUS %s, REMAINDER %s)
+                    ''' % (table, str(remainder), table, str(partitions), str(remainder)))
+
+            ### Les likes et commentaires repris prennent la date d'insertion de leur post. ###
+            sqlClient.cursor.execute('''
+                INSERT INTO public.likes (post_id, user_id, timestamp_inserted_at)
+                SELECT l.post_id, l.user_id::bigint, COALESCE(p.timestamp_inserted_at, 0) FROM public.likes_legacy AS l
+                INNER JOIN public.posts AS p
+                ON p.id_post = l.post_id
+                WHERE l.user_id ~ '^[0-9]+$'
+                ON CONFLICT DO NOTHING
+            ''')
+            print('%s likes migrated.' % str(sqlClient.cursor.rowcount))
+            sqlClient.cursor.execute('''
+                INSERT INTO public.comments (post_id, id_comment, user_id, comment, timestamp_inserted_at)
+                SELECT c.post_id, c.id_comment::bigint, c.user_id::bigint, c.comment, COALESCE(p.timestamp_inserted_at, 0) FROM public.comments_legacy AS c
+                INNER JOIN public.posts AS p
+                ON p.id_post = c.post_id
+                WHERE c.id_comment ~ '^[0-9]+$' AND c.user_id ~ '^[0-9]+$'
+                ON CONFLICT DO NOTHING
+            ''')
+            print('%s comments migrated.' % str(sqlClient.cursor.rowcount))
+            sqlClient.cursor.execute('''
+                DROP TABLE public.likes_legacy;
+                DROP TABLE public.comments_legacy;
+            ''')
+            if stats_views:
+                sqlClient.createStatsViews(commit = False)
+        sqlClient.close()
+
+    def mig_3_rollback(self):
+        """
+        Rollback de la migration n°3. Revient à la disposition d'origine des likes et des commentaires.
+        Les likes déjà agrégés par la rétention ne sont plus que dans `like_edges`, qui est conservée avec `posts.likes_aged_before`.
+        """
+
+        sqlClient = SqlClient()
+        sqlClient.openCursor()
+        if not sqlClient.isPartitioned():
+            print('Likes and comments are not partitioned.')
+            sqlClient.close()
+            return
+
+        with sqlClient.transaction():
+            stats_views = sqlClient.hasStatsViews()
+            if stats_views:
+                sqlClient.dropStatsViews(commit = False)
+            sqlClient.cursor.execute('''
+                ALTER TABLE public.likes RENAME TO likes_partitioned;
+                ALTER TABLE public.likes_partitioned RENAME CONSTRAINT likes_pkey TO likes_partitioned_pkey;
+                ALTER TABLE public.comments RENAME TO comments_partitioned;
+                ALTER TABLE public.comments_partitioned RENAME CONSTRAINT comments_pkey TO comments_partitioned_pkey;
+
+                CREATE TABLE public.likes (
+                    post_id text NOT NULL,
+                    user_id text NOT NULL,
+                    id_like text NOT NULL,
+                    CONSTRAINT likes_pkey PRIMARY KEY (id_like),
+                    CONSTRAINT id_post_likes FOREIGN KEY (post_id) REFERENCES public.posts(id_post)
+                );
+
+                CREATE TABLE public.comments (
+                    post_id text NOT NULL,
+                    user_id text NOT NULL,
+                    comment text NOT NULL,
+                    id_comment text NOT NULL,
+                    CONSTRAINT comments_pkey PRIMARY KEY (id_comment),
+                    CONSTRAINT id_post_comments FOREIGN KEY (post_id) REFERENCES public.posts(id_post)
+                );
+
+                INSERT INTO public.likes (post_id, user_id, id_like)
+                SELECT post_id, user_id::text, post_id || user_id::text FROM public.likes_partitioned
+                ON CONFLICT DO NOTHING;
+
+                INSERT INTO public.comments (post_id, user_id, comment, id_comment)
+                SELECT post_id, user_id::text, comment, id_comment::text FROM public.comments_partitioned
+                ON CONFLICT DO NOTHING;
+
+                DROP TABLE public.likes_partitioned;
+                DROP TABLE public.comments_partitioned;
+            ''')
+            if stats_views:
+                sqlClient.createStatsViews(commit = False)
+        sqlClient.close()
+
+    def mig_4(self):
+        """
+        Migration n°4. Créée les vues matérialisées des rapports agrégés (cf. `SqlClient.createStatsViews`), rafraîchies par `stats.py`.
+        """
+
+        sqlClient = SqlClient()
+        sqlClient.openCursor()
+        sqlClient.createStatsViews()
+        sqlClient.close()
+
+    def mig_4_rollback(self):
+        """
+        Rollback de la migration n°4.
+        """
+
+        sqlClient = SqlClient()
+        sqlClient.openCursor()
+        sqlClient.dropStatsViews()
+        sqlClient.close()
+
 if __name__ == "__main__":
 
     migrations = Migrations()
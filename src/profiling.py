@@ -0,0 +1,273 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import os
+import io
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import functools
+import tracemalloc
+
+### Variables d'environnement d'activation : dossier des rapports, et profilage cProfile complet en plus des sections. ###
+ENV_PATH = 'INSTASEEK_PROFILE'
+ENV_CPROFILE = 'INSTASEEK_PROFILE_CPROFILE'
+TOP_PROFILES = 50
+TOP_ALLOCATIONS = 30
+TOP_CPROFILE = 40
+
+class Profiler(object):
+	"""
+	Profilage opt-in des fonctions chaudes du pipeline.
+	Chaque section décorée par `profiled` cumule ses appels, son temps réel, son temps CPU et la mémoire qu'elle retient.
+	Les sections sont aussi attribuées au profil Instagram en cours (`scope`), avec les compteurs d'utilisateurs et de posts (`tag`),
+	pour ramener les coûts à l'utilisateur et au post.
+	"""
+
+	def __init__(self):
+		"""
+		__init__ function.
+		"""
+
+		super().__init__()
+		self.enabled = False
+		self.path = None
+		self.cprofile = None
+		self.lock = threading.Lock()
+		self.local = threading.local()
+		self.reset()
+
+	def reset(self):
+		"""
+		Remet à zéro les statistiques.
+		"""
+
+		self.functions = dict()
+		self.counts = dict()
+		self.profiles = dict()
+		self.time_start = time.time()
+
+	def enable(self, path, cprofile = False):
+		"""
+		Active le profilage. Le rapport est écrit dans le dossier donné à la fin du processus.
+
+				Args:
+					path (str) : le dossier des rapports.
+					cprofile (bool) : active aussi cProfile sur tout le processus, pour le détail fonction par fonction.
+
+				Returns:
+					(none)
+		"""
+
+		if self.enabled:
+			return
+		os.makedirs(path, exist_ok = True)
+		self.path = path
+		self.reset()
+		tracemalloc.start()
+		if cprofile:
+			self.cprofile = cProfile.Profile()
+			self.cprofile.enable()
+		self.enabled = True
+		atexit.register(self.dump)
+
+	def disable(self):
+		"""
+		Désactive le profilage, sans écrire de rapport.
+		"""
+
+		if not self.enabled:
+			return
+		self.enabled = False
+		if self.cprofile is not None:
+			self.cprofile.disable()
+		tracemalloc.stop()
+		atexit.unregister(self.dump)
+
+	def record(self, name, wall, cpu, allocated):
+		"""
+		Cumule la mesure d'une section, globalement et pour le profil en cours.
+		"""
+
+		scope = getattr(self.local, 'scope', None)
+		with self.lock:
+			stats = self.functions.setdefault(name, {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'allocated': 0})
+			stats['calls'] += 1
+			stats['wall'] += wall
+			stats['cpu'] += cpu
+			stats['allocated'] += allocated
+			if scope is not None:
+				functions = self.profiles[scope]['functions']
+				functions[name] = functions.get(name, 0.0) + wall
+
+	def tag(self, **counts):
+		"""
+		Ajoute des compteurs (utilisateurs, posts...) au rapport, et au profil en cours.
+		"""
+
+		if not self.enabled:
+			return
+		scope = getattr(self.local, 'scope', None)
+		with self.lock:
+			for key, n in counts.items():
+				self.counts[key] = self.counts.get(key, 0) + n
+				if scope is not None:
+					self.profiles[scope]['counts'][key] = self.profiles[scope]['counts'].get(key, 0) + n
+
+	def section(self, name, scope = None):
+		"""
+		Décorateur qui mesure les appels de la fonction quand le profilage est actif. Inactif, il coûte un test de booléen.
+
+				Args:
+					name (str) : le nom de la section dans le rapport.
+					scope (function) : appelée avec les arguments de la fonction, retourne le nom du profil auquel attribuer les sections imbriquées.
+
+				Returns:
+					(function) Le décorateur.
+		"""
+
+		def decorator(function):
+			@functools.wraps(function)
+			def wrapper(*args, **kwargs):
+				if not self.enabled:
+					return function(*args, **kwargs)
+
+				previous_scope = getattr(self.local, 'scope', None)
+				if scope is not None:
+					self.local.scope = str(scope(*args, **kwargs))
+					with self.lock:
+						self.profiles.setdefault(self.local.scope, {'wall': 0.0, 'counts': dict(), 'functions': dict()})
+
+				memory_start = tracemalloc.get_traced_memory()[0]
+				wall_start, cpu_start = time.perf_counter(), time.process_time()
+				try:
+					return function(*args, **kwargs)
+				finally:
+					wall = time.perf_counter() - wall_start
+					self.record(name, wall, time.process_time() - cpu_start, tracemalloc.get_traced_memory()[0] - memory_start)
+					if scope is not None:
+						with self.lock:
+							self.profiles[self.local.scope]['wall'] += wall
+						self.local.scope = previous_scope
+			return wrapper
+		return decorator
+
+	def report(self):
+		"""
+		Construit le rapport : coût de chaque section (total, par utilisateur et par post), profils les plus coûteux et sites d'allocation.
+
+				Args:
+					(none)
+
+				Returns:
+					(dict) Le rapport.
+		"""
+
+		with self.lock:
+			users, posts = self.counts.get('users', 0), self.counts.get('posts', 0)
+			functions = dict()
+			for name, stats in sorted(self.functions.items(), key = lambda item: item[1]['wall'], reverse = True):
+				functions[name] = {
+					'calls': stats['calls'],
+					'wall': round(stats['wall'], 4),
+					'cpu': round(stats['cpu'], 4),
+					'allocated_kb': round(stats['allocated'] / 1024, 1),
+					'wall_per_call': round(stats['wall'] / stats['calls'], 6),
+					'wall_per_user': round(stats['wall'] / users, 6) if users else None,
+					'wall_per_post': round(stats['wall'] / posts, 6) if posts else None
+				}
+			profiles = dict()
+			for scope, profile in sorted(self.profiles.items(), key = lambda item: item[1]['wall'], reverse = True)[:TOP_PROFILES]:
+				profiles[scope] = {
+					'wall': round(profile['wall'], 4),
+					'counts': dict(profile['counts']),
+					'functions': {name: round(wall, 4) for name, wall in profile['functions'].items()}
+				}
+			report = {
+				'pid': os.getpid(),
+				'duration': round(time.time() - self.time_start, 2),
+				'counts': dict(self.counts),
+				'functions': functions,
+				'profiles': profiles
+			}
+
+		if tracemalloc.is_tracing():
+			current, peak = tracemalloc.get_traced_memory()
+			report['memory'] = {'current_kb': round(current / 1024, 1), 'peak_kb': round(peak / 1024, 1)}
+			report['allocations'] = [
+				{'site': str(stat.traceback), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+				for stat in tracemalloc.take_snapshot().statistics('lineno')[:TOP_ALLOCATIONS]
+			]
+		return report
+
+	def dump(self):
+		"""
+		Écrit le rapport JSON, et le rapport cProfile (binaire `.prof` et texte) s'il est actif, dans le dossier des rapports.
+
+				Args:
+					(none)
+
+				Returns:
+					(str) Le chemin du rapport JSON.
+		"""
+
+		if self.path is None:
+			return None
+		prefix = os.path.join(self.path, 'profile-%s-%s' % (str(os.getpid()), time.strftime('%Y%m%d-%H%M%S')))
+		if self.cprofile is not None:
+			self.cprofile.disable()
+			self.cprofile.dump_stats(prefix + '.prof')
+			output = io.StringIO()
+			pstats.Stats(self.cprofile, stream = output).sort_stats('cumulative').print_stats(TOP_CPROFILE)
+			with open(prefix + '.txt', 'w', encoding = 'utf8') as f:
+				f.write(output.getvalue())
+			self.cprofile.enable()
+		with open(prefix + '.json', 'w', encoding = 'utf8') as f:
+			json.dump(self.report(), f, indent = 2)
+		print('Profiling report written to %s.json' % prefix, flush = True)
+		return prefix + '.json'
+
+### Profileur du processus, activé par la variable d'environnement `INSTASEEK_PROFILE=<dossier>` ou par `enable`. ###
+profiler = Profiler()
+profiled = profiler.section
+tag = profiler.tag
+
+def enable(path, cprofile = None):
+	"""
+	Active le profilage du processus (par exemple depuis une option `--profile`).
+
+			Args:
+				path (str) : le dossier des rapports.
+				cprofile (bool) : active aussi cProfile, par défaut selon la variable d'environnement `INSTASEEK_PROFILE_CPROFILE`.
+
+			Returns:
+				(none)
+	"""
+
+	if cprofile is None:
+		cprofile = os.environ.get(ENV_CPROFILE, '') not in ('', '0')
+	profiler.enable(path, cprofile = cprofile)
+
+if os.environ.get(ENV_PATH):
+	enable(os.environ[ENV_PATH])
@@ -0,0 +1,81 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import time
+import argparse
+import configparser
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from sql_client import SqlClient
+
+config_path = os.path.join(os.path.dirname(__file__), './config.ini')
+
+### Durée de conservation des likes bruts (en jours), et nombre de likes agrégés par transaction. ###
+RETENTION_DAYS = 90
+BATCH_SIZE = 10000
+
+def run(days = None, batch_size = None):
+	"""
+	Tâche de rétention : agrège dans `like_edges` puis supprime les likes bruts plus anciens que la durée de conservation.
+	Les likes sont traités par lots, une transaction par lot, pour ne pas bloquer le streamer. Nécessite la disposition partitionnée (cf. `Migrations.mig_3`).
+
+			Args:
+				days (float) : la durée de conservation, par défaut celle de la section [Retention] du fichier de config.
+				batch_size (int) : le nombre de likes agrégés par transaction.
+
+			Returns:
+				(int) Le nombre de likes agrégés.
+	"""
+
+	config = configparser.ConfigParser()
+	config.read(config_path)
+	days = config.getfloat('Retention', 'days', fallback = RETENTION_DAYS) if days is None else days
+	batch_size = config.getint('Retention', 'batch_size', fallback = BATCH_SIZE) if batch_size is None else batch_size
+
+	sqlClient = SqlClient()
+	sqlClient.openCursor()
+	try:
+		if not sqlClient.isPartitioned():
+			print('Likes are not partitioned, run the migration n°3 first.', flush = True)
+			return 0
+		before = time.time() - days * 24 * 60 * 60
+		total = 0
+		while True:
+			n = sqlClient.ageOutLikes(before, batch_size)
+			total += n
+			if n < batch_size:
+				break
+		print('%s likes older than %s days aged out into like_edges.' % (str(total), str(days)), flush = True)
+		return total
+	finally:
+		sqlClient.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--days', type = float, default = None, help = 'La durée de conservation des likes bruts, en jours.')
+	parser.add_argument('--batch-size', type = int, default = None, help = 'Le nombre de likes agrégés par transaction.')
+	args = parser.parse_args()
+
+	run(days = args.days, batch_size = args.batch_size)
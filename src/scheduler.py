@@ -0,0 +1,177 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+### System libs. ###
+import math
+import random
+
+### Paramètres du bandit. ###
+EXPLORATION = 1.0
+DECAY = 0.8
+INFLUENCER_WEIGHT = 5.0
+SPONSOR_SHARE = 0.5
+MAX_PAGES = 5
+SATURATION = 0.2
+
+class HashtagScheduler(object):
+	"""
+	Ordonnanceur des hashtags à streamer.
+	Chaque hashtag est un bras d'un bandit (UCB) dont la récompense est le rendement par appel à l'API :
+	nouveaux auteurs, plus un bonus pour les influenceurs annotés rencontrés.
+	"""
+
+	def __init__(self, sponsor_hashtags, random_hashtags, exploration = EXPLORATION, decay = DECAY, influencer_weight = INFLUENCER_WEIGHT, sponsor_share = SPONSOR_SHARE):
+		"""
+		__init__ function.
+
+				Args:
+					sponsor_hashtags (str[]) : les hashtags des posts sponsorisés.
+					random_hashtags (str[]) : les hashtags populaires.
+					exploration (float) : le poids du terme d'exploration de l'UCB.
+					decay (float) : le facteur de lissage exponentiel des récompenses, pour suivre la saturation des hashtags.
+					influencer_weight (float) : la valeur d'un influenceur annoté rencontré, en nombre de nouveaux auteurs.
+					sponsor_share (float) : la part des étapes réservée aux hashtags sponsorisés.
+		"""
+
+		super().__init__()
+		self.sponsor_hashtags = list(dict.fromkeys(sponsor_hashtags))
+		self.random_hashtags = [hashtag for hashtag in dict.fromkeys(random_hashtags) if hashtag not in self.sponsor_hashtags]
+		self.exploration = exploration
+		self.decay = decay
+		self.influencer_weight = influencer_weight
+		self.sponsor_share = sponsor_share
+		self.stats = dict()
+
+	def getStats(self, hashtag):
+		"""
+		Retourne les statistiques de rendement du hashtag, en les initialisant si besoin.
+		"""
+
+		return self.stats.setdefault(hashtag, {
+			'visits': 0,
+			'api_calls': 0,
+			'posts': 0,
+			'unseen_posts': 0,
+			'new_authors': 0,
+			'influencers': 0,
+			'reward': None
+		})
+
+	def record(self, hashtag, api_calls, posts, unseen_posts, new_authors, influencers):
+		"""
+		Enregistre le rendement d'une page streamée du hashtag.
+
+				Args:
+					hashtag (str) : le hashtag streamé.
+					api_calls (int) : le nombre d'appels à l'API consommés par la page.
+					posts (int) : le nombre de posts de la page.
+					unseen_posts (int) : le nombre de posts qu'on n'avait pas encore en base.
+					new_authors (int) : le nombre d'auteurs qu'on n'avait pas encore en base.
+					influencers (int) : le nombre d'auteurs annotés influenceurs rencontrés.
+
+				Returns:
+					(none)
+		"""
+
+		stats = self.getStats(hashtag)
+		stats['visits'] += 1
+		stats['api_calls'] += api_calls
+		stats['posts'] += posts
+		stats['unseen_posts'] += unseen_posts
+		stats['new_authors'] += new_authors
+		stats['influencers'] += influencers
+
+		### Récompense lissée : les pages récentes comptent plus, un hashtag saturé perd vite son avance. ###
+		reward = (new_authors + self.influencer_weight * influencers) / max(api_calls, 1)
+		if stats['reward'] is None:
+			stats['reward'] = reward
+		else:
+			stats['reward'] = self.decay * stats['reward'] + (1 - self.decay) * reward
+
+	def score(self, hashtag, total_visits, prior):
+		"""
+		Calcule le score UCB du hashtag. Un hashtag jamais visité prend la récompense moyenne comme a priori.
+		"""
+
+		stats = self.getStats(hashtag)
+		reward = prior if stats['reward'] is None else stats['reward']
+		return reward + self.exploration * prior * math.sqrt(math.log(total_visits + 1) / (stats['visits'] + 1))
+
+	def choose(self, step):
+		"""
+		Choisit le prochain hashtag à streamer.
+		Une part des étapes reste réservée aux hashtags sponsorisés, qui alimentent le jeu annoté; dans chaque groupe, on prend le meilleur score UCB.
+
+				Args:
+					step (int) : le numéro de l'étape de stream.
+
+				Returns:
+					(str) Le hashtag choisi.
+		"""
+
+		if not self.random_hashtags or (self.sponsor_hashtags and (step % 4) < 4 * self.sponsor_share):
+			candidates = self.sponsor_hashtags
+		else:
+			candidates = self.random_hashtags
+
+		rewards = [stats['reward'] for stats in self.stats.values() if stats['reward'] is not None]
+		prior = sum(rewards) / len(rewards) if rewards and sum(rewards) > 0 else 1.0
+		total_visits = sum(stats['visits'] for stats in self.stats.values())
+
+		### On départage les ex-aequo au hasard, notamment les hashtags jamais visités. ###
+		scores = [(self.score(hashtag, total_visits, prior), random.random(), hashtag) for hashtag in candidates]
+		return max(scores)[2]
+
+	def isSaturated(self, posts, unseen_posts, threshold = SATURATION):
+		"""
+		Indique si une page est saturée, c'est-à-dire si la part de posts inédits est trop faible pour continuer à paginer.
+		"""
+
+		return posts == 0 or unseen_posts / posts < threshold
+
+	def report(self, n = 5):
+		"""
+		Retourne les lignes de rapport des n hashtags les plus productifs.
+		"""
+
+		lines = list()
+		ranked = sorted(self.stats.items(), key = lambda item: item[1]['reward'] or 0, reverse = True)
+		for hashtag, stats in ranked[:n]:
+			lines.append('#%s: %.2f new authors/call, %.0f%% unseen posts, %.1f%% influencers, %s calls' % (
+				hashtag,
+				stats['new_authors'] / max(stats['api_calls'], 1),
+				100 * stats['unseen_posts'] / max(stats['posts'], 1),
+				100 * stats['influencers'] / max(stats['posts'], 1),
+				str(stats['api_calls'])
+			))
+		return lines
+
+	def state(self):
+		"""
+		Retourne l'état sérialisable de l'ordonnanceur, pour le checkpoint.
+		"""
+
+		return self.stats
+
+	def load(self, state):
+		"""
+		Recharge l'état de l'ordonnanceur depuis le checkpoint.
+		"""
+
+		self.stats = dict(state or dict())
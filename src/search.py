@@ -0,0 +1,274 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import math
+import time
+import json
+import argparse
+
+### Installed libs. ###
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.svm import SVC
+from sklearn.linear_model import LogisticRegression
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.model_selection import ParameterGrid, ParameterSampler, StratifiedKFold, cross_val_score
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from artifacts import is_artifact, save_artifact, load_artifact
+
+search_dir = os.path.join(os.path.dirname(__file__), './models/search')
+
+### Paramètres de la recherche : facteur d'élimination entre deux tours, taille minimale de l'échantillon d'un tour, plis et score. ###
+FACTOR = 3
+MIN_SAMPLES = 60
+CV_FOLDS = 5
+SCORING = 'accuracy'
+N_JOBS = -1
+
+### Espace de recherche : le modèle, sa grille d'hyperparamètres, et s'il faut centrer-réduire les features avant. ###
+MODELS = {
+	'random_forest': (RandomForestClassifier, {
+		'n_estimators': [100, 300, 500],
+		'max_depth': [None, 8, 16],
+		'min_samples_leaf': [1, 3],
+		'max_features': ['sqrt', 0.5]
+	}, False),
+	'logistic_regression': (LogisticRegression, {
+		'C': [0.01, 0.1, 1, 10],
+		'max_iter': [1000]
+	}, True),
+	'svc': (SVC, {
+		'C': [0.1, 1, 10],
+		'gamma': ['scale', 0.01, 0.1]
+	}, True),
+	'gaussian_nb': (GaussianNB, {
+		'var_smoothing': [1e-9, 1e-6, 1e-3]
+	}, False)
+}
+
+def save_matrix(features, labels, directory = search_dir):
+	"""
+	Enregistre la matrice des features et les labels en artefact (cf. `artifacts.py`), pour les recharger sans reconstruire les utilisateurs.
+	"""
+
+	os.makedirs(directory, exist_ok = True)
+	save_artifact(os.path.join(directory, 'matrix'), {
+		'features': np.asarray(features, dtype = np.float32),
+		'labels': np.asarray(labels, dtype = np.int64)
+	}, 'feature_matrix')
+
+def load_matrix(directory = search_dir, mmap = True):
+	"""
+	Charge la matrice des features et les labels enregistrés, en mémoire partagée (memmap) par défaut : les workers les lisent sans copie.
+
+			Args:
+				directory (str) : le dossier du cache.
+				mmap (bool) : charge les tableaux en memmap, en lecture seule.
+
+			Returns:
+				(tuple) La matrice des features et les labels.
+	"""
+
+	arrays, _ = load_artifact(os.path.join(directory, 'matrix'), 'feature_matrix', mmap = mmap)
+	return arrays['features'], arrays['labels']
+
+def build_matrix(directory = search_dir):
+	"""
+	Construit la matrice des features des utilisateurs annotés avec le `Trainer`, et la met en cache.
+	"""
+
+	from train import Trainer
+
+	trainer = Trainer()
+	trainer.buildUsersModel()
+	features = np.concatenate([trainer.features_array_train, trainer.features_array_test])
+	labels = np.concatenate([trainer.labels_train, trainer.labels_test])
+	save_matrix(features, labels, directory)
+	return features, labels
+
+def candidates(models = None, n_iter = None, seed = None):
+	"""
+	Énumère les candidats de la recherche : toute la grille de chaque modèle, ou `n_iter` tirages au hasard par modèle.
+
+			Args:
+				models (str[]) : les modèles de `MODELS` à essayer, par défaut tous.
+				n_iter (int) : le nombre de tirages par modèle, par défaut la grille complète.
+				seed (int) : la graine des tirages.
+
+			Returns:
+				(tuple[]) Les couples (modèle, hyperparamètres).
+	"""
+
+	result = list()
+	for name in models or MODELS:
+		grid = MODELS[name][1]
+		if n_iter is None or n_iter >= len(ParameterGrid(grid)):
+			result.extend((name, params) for params in ParameterGrid(grid))
+		else:
+			result.extend((name, params) for params in ParameterSampler(grid, n_iter, random_state = seed))
+	return result
+
+def make_model(name, params, seed = None):
+	"""
+	Instancie le modèle avec ses hyperparamètres, précédé d'une mise à l'échelle si le modèle en a besoin.
+	"""
+
+	model, _, scaled = MODELS[name]
+	if 'random_state' in model().get_params():
+		params = dict(params, random_state = seed)
+	estimator = model(**params)
+	return make_pipeline(StandardScaler(), estimator) if scaled else estimator
+
+def evaluate(name, params, features, labels, rows, cv = CV_FOLDS, scoring = SCORING, seed = None):
+	"""
+	Évalue un candidat en validation croisée sur un sous-ensemble des lignes. Appelé dans les workers : la matrice memmap n'est pas copiée.
+
+			Args:
+				name (str) : le modèle.
+				params (dict) : ses hyperparamètres.
+				features (np.ndarray) : la matrice des features.
+				labels (np.ndarray) : les labels.
+				rows (np.ndarray) : les index des lignes du tour.
+				cv (int) : le nombre de plis.
+				scoring (str) : le score scikit-learn.
+				seed (int) : la graine des plis et des modèles.
+
+			Returns:
+				(dict) Le résultat du candidat.
+	"""
+
+	time_start = time.time()
+	try:
+		scores = cross_val_score(
+			make_model(name, params, seed),
+			features[rows],
+			labels[rows],
+			cv = StratifiedKFold(cv, shuffle = True, random_state = seed),
+			scoring = scoring
+		)
+		score, std, error = float(scores.mean()), float(scores.std()), None
+	except Exception as e:
+		score, std, error = -np.inf, 0.0, '%s: %s' % (type(e).__name__, str(e))
+	return {
+		'model': name,
+		'params': params,
+		'score': score,
+		'std': std,
+		'samples': len(rows),
+		'seconds': round(time.time() - time_start, 4),
+		'error': error
+	}
+
+def search(features, labels, models = None, n_iter = None, factor = FACTOR, min_samples = MIN_SAMPLES, cv = CV_FOLDS, scoring = SCORING, n_jobs = N_JOBS, seed = None):
+	"""
+	Recherche des modèles et hyperparamètres par élimination successive (successive halving) : tous les candidats sont évalués en parallèle
+	sur un petit échantillon, seul le meilleur tiers passe au tour suivant, avec un échantillon trois fois plus grand, jusqu'à toutes les lignes.
+	Les candidats éliminés s'arrêtent donc tôt, pour un coût à peine supérieur à celui du tour final.
+
+			Args:
+				features (np.ndarray) : la matrice des features, éventuellement en memmap.
+				labels (np.ndarray) : les labels.
+				models (str[]) : les modèles de `MODELS` à essayer, par défaut tous.
+				n_iter (int) : le nombre de tirages par modèle, par défaut la grille complète.
+				factor (int) : le facteur d'élimination et de croissance de l'échantillon entre deux tours.
+				min_samples (int) : la taille minimale de l'échantillon d'un tour.
+				cv (int) : le nombre de plis.
+				scoring (str) : le score scikit-learn.
+				n_jobs (int) : le nombre de processus, -1 pour tous les cœurs.
+				seed (int) : la graine de l'échantillonnage, des plis et des modèles.
+
+			Returns:
+				(dict[]) Le classement : le dernier résultat de chaque candidat, des plus loin allés aux premiers éliminés, puis par score.
+	"""
+
+	n = len(labels)
+	order = np.random.RandomState(seed).permutation(n)
+	survivors = candidates(models, n_iter, seed)
+	### Autant de tours que nécessaire pour n'en garder qu'un, sauf si le premier échantillon, n // factor ** (tours - 1), passait sous ###
+	### `min_samples` lignes : le nombre de tours est alors borné, et plusieurs finalistes sont évalués sur toutes les lignes.          ###
+	n_rounds = 1 + max(0, int(min(math.log(max(len(survivors), 1), factor), math.log(max(n / min_samples, 1), factor))))
+	results = dict()
+
+	with Parallel(n_jobs = n_jobs) as parallel:
+		for index in range(n_rounds):
+			samples = n // factor ** (n_rounds - 1 - index)
+			rows = np.sort(order[:samples])
+			round_results = parallel(delayed(evaluate)(name, params, features, labels, rows, cv, scoring, seed) for name, params in survivors)
+			for key, result in enumerate(round_results):
+				result['round'] = index
+				results[(survivors[key][0], json.dumps(survivors[key][1], sort_keys = True, default = str))] = result
+			print('Round %s: %s candidates on %s samples, best %.4f' % (str(index), str(len(survivors)), str(samples), max(result['score'] for result in round_results)), flush = True)
+			if index < n_rounds - 1:
+				ranked = sorted(range(len(survivors)), key = lambda key: round_results[key]['score'], reverse = True)
+				survivors = [survivors[key] for key in ranked[:max(1, math.ceil(len(survivors) / factor))]]
+
+	return sorted(results.values(), key = lambda result: (result['round'], result['score']), reverse = True)
+
+def write_leaderboard(leaderboard, path):
+	"""
+	Écrit le classement en JSON.
+	"""
+
+	with open(path, 'w', encoding = 'utf8') as f:
+		json.dump([dict(result, score = None if not np.isfinite(result['score']) else result['score']) for result in leaderboard], f, indent = 2, default = str)
+
+def display_leaderboard(leaderboard, n = 10):
+	"""
+	Affiche les n meilleurs candidats.
+	"""
+
+	for rank, result in enumerate(leaderboard[:n]):
+		print('%2d. %.4f (+/- %.4f) %s %s [round %s, %s samples, %.2fs]' % (
+			rank + 1,
+			result['score'],
+			2 * result['std'],
+			result['model'],
+			json.dumps(result['params'], sort_keys = True, default = str),
+			str(result['round']),
+			str(result['samples']),
+			result['seconds']
+		), flush = True)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--models', nargs = '*', default = list(MODELS), choices = list(MODELS), help = 'Les modèles à essayer.')
+	parser.add_argument('--n-iter', type = int, default = None, help = 'Recherche aléatoire : le nombre de tirages par modèle, par défaut la grille complète.')
+	parser.add_argument('--factor', type = int, default = FACTOR, help = 'Le facteur d\'élimination entre deux tours.')
+	parser.add_argument('--scoring', default = SCORING, help = 'Le score scikit-learn à maximiser.')
+	parser.add_argument('--n-jobs', type = int, default = N_JOBS, help = 'Le nombre de processus, -1 pour tous les cœurs.')
+	parser.add_argument('--seed', type = int, default = None, help = 'La graine de la recherche.')
+	parser.add_argument('--rebuild', action = 'store_true', help = 'Reconstruit la matrice des features au lieu de recharger le cache.')
+	args = parser.parse_args()
+
+	if args.rebuild or not is_artifact(os.path.join(search_dir, 'matrix')):
+		build_matrix()
+	features, labels = load_matrix()
+	leaderboard = search(features, labels, models = args.models, n_iter = args.n_iter, factor = args.factor, scoring = args.scoring, n_jobs = args.n_jobs, seed = args.seed)
+	write_leaderboard(leaderboard, os.path.join(search_dir, 'leaderboard.json'))
+	display_leaderboard(leaderboard)
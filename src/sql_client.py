@@ -22,9 +22,9 @@ import sys
 import os
 import time
 import math
-import requests
 import configparser
 import random
+import contextlib
 from io import BytesIO
 from collections import Counter
 
@@ -38,12 +38,19 @@ sys.path.append(os.path.dirname(__file__))
 
 ### Custom libs. ###
 from utils import *
+from profiling import profiled
 
 pp = pprint.PrettyPrinter(indent = 2)
 sys.path.append(os.path.dirname(__file__))
 min_timestamp_selection = 1529680225
 config_path = os.path.join(os.path.dirname(__file__), './config.ini')
 
+### Vues matérialisées de statistiques, dans l'ordre de leurs dépendances. ###
+STATS_VIEWS = ['stats_post_counts', 'stats_likes_histogram', 'stats_hashtags', 'stats_summary']
+
+### Nombre de lignes lues par aller-retour avec les curseurs côté serveur. ###
+FETCH_SIZE = 1000
+
 class SqlClient(object):
 	"""
 	SQL Client class.
@@ -56,13 +63,21 @@ class SqlClient(object):
 		super().__init__()
 		self.config = configparser.ConfigParser()
 		self.config.read(config_path)
+		self.connect()
+		self.hashtag = ''
+		self.partitioned = None
+		self.stats_views = None
+
+	def connect(self):
+		"""
+		Ouvre la connexion à la BDD.
+		"""
 		self.conn = psycopg2.connect("dbname='%s' user='%s' host='%s' password='%s'" % (
 			self.config['pgAdmin']['dbname'],
 			self.config['pgAdmin']['user'],
 			self.config['pgAdmin']['host'],
 			self.config['pgAdmin']['password']
 		))
-		self.hashtag = ''
 
 	def openCursor(self):
 		"""
@@ -76,6 +91,71 @@ class SqlClient(object):
 		"""
 		self.cursor.close()
 
+	def isPartitioned(self):
+		"""
+		Indique si les likes et les commentaires sont dans la disposition partitionnée (cf. `Migrations.mig_3`), et non dans la disposition d'origine.
+		"""
+		if self.partitioned is None:
+			self.cursor.execute('''
+				SELECT c.relkind FROM pg_catalog.pg_class AS c
+				INNER JOIN pg_catalog.pg_namespace AS n
+				ON n.oid = c.relnamespace
+				WHERE n.nspname = 'public' AND c.relname = 'likes'
+			''')
+			row = self.cursor.fetchone()
+			self.partitioned = row is not None and row[0] == 'p'
+		return self.partitioned
+
+	def isClosed(self):
+		"""
+		Indique si la connexion à la BDD est perdue.
+		"""
+		return bool(self.conn.closed)
+
+	def recover(self):
+		"""
+		Remet le client en état après une erreur : la transaction en cours est annulée, sans reconnexion tant que la connexion est ouverte.
+		"""
+		if self.isClosed():
+			self.connect()
+		else:
+			self.conn.rollback()
+		if getattr(self, 'cursor', None) is None or self.cursor.closed:
+			self.openCursor()
+
+	@contextlib.contextmanager
+	def transaction(self):
+		"""
+		Transaction : validée (un seul commit) en sortie de bloc, annulée en cas d'erreur. La connexion reste utilisable après l'annulation.
+		"""
+		try:
+			yield
+		except Exception:
+			if not self.isClosed():
+				self.conn.rollback()
+			raise
+		self.conn.commit()
+
+	@contextlib.contextmanager
+	def savepoint(self, name, optional = False):
+		"""
+		Point de sauvegarde dans la transaction en cours : une erreur dans le bloc n'annule que ce que le bloc a écrit.
+
+				Args:
+					name (str) : le nom du point de sauvegarde.
+					optional (bool) : si vrai, l'erreur est affichée puis ignorée, et la transaction continue; sinon elle est relevée.
+		"""
+		self.cursor.execute('SAVEPOINT %s' % name)
+		try:
+			yield
+		except Exception as e:
+			self.cursor.execute('ROLLBACK TO SAVEPOINT %s' % name)
+			if not optional:
+				raise
+			print('Skipped %s (%s)' % (name, str(e).strip()), flush = True)
+		else:
+			self.cursor.execute('RELEASE SAVEPOINT %s' % name)
+
 	def createDatabase(self):
 		"""
 		Créée la base de données vide.
@@ -315,6 +395,13 @@ class SqlClient(object):
 				CREATE INDEX fki_id_post_user_tags ON public.user_tags USING btree (post_id);
 
 
+				--
+				-- Name: fki_id_post_images; Type: INDEX; Schema: public; Owner: Bulb
+				--
+
+				CREATE INDEX fki_id_post_images ON public.images USING btree (post_id);
+
+
 				--
 				-- TOC entry 2049 (class 2606 OID 18284)
 				-- Name: posts author_user; Type: FK CONSTRAINT; Schema: public; Owner: Bulb
@@ -382,34 +469,25 @@ class SqlClient(object):
 		"""
 		self.hashtag = hashtag
 
-	def insertPost(self, post, topPost = False):
+	def upsertPost(self, post, topPost = False):
 		"""
-		Insère un post en BDD.
+		Écrit un post et ses identifications d'utilisateurs, sans commit.
+		Un post déjà en base n'est réécrit que si l'une de ses colonnes modifiables a changé (compteurs, texte, URLs...) :
+		sinon l'upsert ne crée pas de nouvelle version de la ligne. La date, le type de média et l'auteur d'un post ne changent jamais et ne sont pas réécrits.
 		"""
 
 		p__id, p__timestamp, p_media_type, p_text, p_small_img_url, p_tall_img_url, p_n_likes, p_n_comments, p_location, p_user_id, user_tags, sponsor_tags = get_post_fields(post)
 
 		self.cursor.execute('''
-			INSERT INTO posts (id_post, timestamp, timestamp_inserted_at, media_type, text, small_img_url, tall_img_url, n_likes, n_comments, location, user_id, is_top_post, hashtag_origin)
+			INSERT INTO posts AS p (id_post, timestamp, timestamp_inserted_at, media_type, text, small_img_url, tall_img_url, n_likes, n_comments, location, user_id, is_top_post, hashtag_origin)
 			VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
 			ON CONFLICT (id_post) DO UPDATE
-			SET (id_post, timestamp, timestamp_inserted_at, media_type, text, small_img_url, tall_img_url, n_likes, n_comments, location, user_id, is_top_post, hashtag_origin) = (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+			SET (timestamp_inserted_at, text, small_img_url, tall_img_url, n_likes, n_comments, location, is_top_post, hashtag_origin)
+				= (EXCLUDED.timestamp_inserted_at, EXCLUDED.text, EXCLUDED.small_img_url, EXCLUDED.tall_img_url, EXCLUDED.n_likes, EXCLUDED.n_comments, EXCLUDED.location, EXCLUDED.is_top_post, EXCLUDED.hashtag_origin)
+			WHERE (p.text, p.small_img_url, p.tall_img_url, p.n_likes, p.n_comments, p.location, p.is_top_post, p.hashtag_origin)
+				IS DISTINCT FROM (EXCLUDED.text, EXCLUDED.small_img_url, EXCLUDED.tall_img_url, EXCLUDED.n_likes, EXCLUDED.n_comments, EXCLUDED.location, EXCLUDED.is_top_post, EXCLUDED.hashtag_origin);
 			''',
 			(
-				str(p__id),
-				str(p__timestamp),
-				str(math.floor(time.time())),
-				str(p_media_type),
-				str(p_text),
-				str(p_small_img_url),
-				str(p_tall_img_url),
-				str(p_n_likes),
-				str(p_n_comments),
-				str(p_location),
-				str(p_user_id),
-				str(topPost),
-				str(self.hashtag),
-				# for update
 				str(p__id),
 				str(p__timestamp),
 				str(math.floor(time.time())),
@@ -425,163 +503,132 @@ class SqlClient(object):
 				str(self.hashtag)
 			)
 		)
-		self.conn.commit()
+		### Une identification ne change jamais : ses colonnes sont toutes dérivées de sa clé. ###
 		for user_tag in user_tags:
 			id_user_tag = user_tag['user']['pk']
-			_id = str(p__id) + str(id_user_tag)
 			self.cursor.execute('''
 				INSERT INTO user_tags (id_usertag, post_id, user_id)
 				VALUES (%s, %s, %s)
-				ON CONFLICT (id_usertag) DO UPDATE
-				SET (id_usertag, post_id, user_id) = (%s, %s, %s);
+				ON CONFLICT (id_usertag) DO NOTHING;
 				''',
 				(
-					str(_id),
+					str(p__id) + str(id_user_tag),
 					str(p__id),
-					str(id_user_tag),
-					# for update
-					str(_id),
-					str(p__id), 
 					str(id_user_tag)
 				)
 			)
+		return p__id
+
+	@profiled('SqlClient.insertPost')
+	def insertPost(self, post, topPost = False, image = None, commit = True):
+		"""
+		Insère un post en BDD.
+		L'image est téléchargée en amont (cf. `ImageDownloader`) : si elle n'est pas fournie, on n'insère pas de ligne dans `images`.
+		Avec `commit = False`, les requêtes restent dans la transaction en cours (cf. `insertUnits`).
+		"""
+
+		p__id = self.upsertPost(post, topPost = topPost)
+		if image is not None:
+			self.insertImage(get_post_image_url(post), p__id, image, commit = False)
+
+		if commit:
 			self.conn.commit()
-		
-		url = get_post_image_url(post)
-		response = requests.get(url)
 
+	@profiled('SqlClient.insertUserFeed')
+	def insertUserFeed(self, feed, images = None, commit = True):
+		"""
+		Insère un feed de profil en BDD.
+		Les images sont téléchargées en amont et passées sous forme de dictionnaire {url: octets}; les posts sans image téléchargée n'ont pas de ligne dans `images`.
+		"""
+		images = images or dict()
+		for post in feed:
+			p__id = self.upsertPost(post)
+			url = get_post_image_url(post)
+			if url in images:
+				self.insertImage(url, p__id, images[url], commit = False)
+		if commit:
+			self.conn.commit()
+
+	def insertImage(self, url, post_id, image, commit = True):
+		"""
+		Insère l'image téléchargée d'un post en BDD. Une image déjà en base n'est pas réécrite : son URL l'identifie.
+		"""
 		self.cursor.execute('''
 			INSERT INTO images (url, post_id, image)
 			VALUES (%s, %s, %s)
-			ON CONFLICT (url) DO UPDATE
-			SET (url, post_id, image) = (%s, %s, %s)
+			ON CONFLICT (url) DO NOTHING
 		''',
 		(
 			str(url),
-			str(p__id),
-			response.content,
-			# for udpate
-			str(url),
-			str(p__id),
-			response.content
+			str(post_id),
+			image
 		))
+		if commit:
+			self.conn.commit()
 
-	def insertUserFeed(self, feed):
+	def getKnownImages(self, urls, post_ids):
 		"""
-		Insère un feed de profil en BDD.
+		Récupère, en une requête, les images déjà en base parmi les URLs et les posts donnés. Sans URL ni post, aucune requête n'est faite.
 		"""
-		for post in feed:
-			
-			p__id, p__timestamp, p_media_type, p_text, p_small_img_url, p_tall_img_url, p_n_likes, p_n_comments, p_location, p_user_id, user_tags, sponsor_tags = get_post_fields(post)
-
-			self.cursor.execute('''
-				INSERT INTO posts (id_post, timestamp, timestamp_inserted_at, media_type, text, small_img_url, tall_img_url, n_likes, n_comments, location, user_id, is_top_post, hashtag_origin)
-				VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-				ON CONFLICT (id_post) DO UPDATE
-				SET (id_post, timestamp, timestamp_inserted_at, media_type, text, small_img_url, tall_img_url, n_likes, n_comments, location, user_id, is_top_post, hashtag_origin) = (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-				''',
-				(
-					str(p__id),
-					str(p__timestamp),
-					str(math.floor(time.time())),
-					str(p_media_type),
-					str(p_text),
-					str(p_small_img_url),
-					str(p_tall_img_url),
-					str(p_n_likes),
-					str(p_n_comments),
-					str(p_location),
-					str(p_user_id),
-					str('false'),
-					str(self.hashtag),
-					# for update
-					str(p__id),
-					str(p__timestamp),
-					str(math.floor(time.time())),
-					str(p_media_type),
-					str(p_text),
-					str(p_small_img_url),
-					str(p_tall_img_url),
-					str(p_n_likes),
-					str(p_n_comments),
-					str(p_location),
-					str(p_user_id),
-					str('false'),
-					str(self.hashtag)
-				)
-			)
+		if not urls and not post_ids:
+			return set(), set()
+		self.cursor.execute('''
+			SELECT url, post_id FROM images
+			WHERE url = ANY(%s) OR post_id = ANY(%s)
+		''', (list(urls), list(post_ids)))
+		values = self.cursor.fetchall()
+		return set(value[0] for value in values), set(value[1] for value in values)
 
-			for user_tag in user_tags:
-				id_user_tag = user_tag['user']['pk']
-				_id = str(p__id) + str(id_user_tag)
-				self.cursor.execute('''
-					INSERT INTO user_tags (id_usertag, post_id, user_id)
-					VALUES (%s, %s, %s)
-					ON CONFLICT (id_usertag) DO UPDATE
-					SET (id_usertag, post_id, user_id) = (%s, %s, %s);
-					''',
-					(
-						str(_id),
-						str(p__id),
-						str(id_user_tag),
-						# for update
-						str(_id),
-						str(p__id), 
-						str(id_user_tag)
-					)
-				)
+	def getKnownPosts(self, post_ids):
+		"""
+		Récupère, en une requête, les ids des posts déjà en BDD parmi ceux donnés.
+		"""
+		self.cursor.execute('''
+			SELECT id_post FROM posts
+			WHERE id_post = ANY(%s)
+		''', (list(post_ids),))
+		return set(value[0] for value in self.cursor.fetchall())
 
-			url = get_post_image_url(post)
-			response = requests.get(url)
+	def getUserLabels(self, user_ids):
+		"""
+		Récupère, en une requête, le label des utilisateurs déjà en BDD parmi ceux donnés.
+		"""
+		self.cursor.execute('''
+			SELECT id_user, label FROM users
+			WHERE id_user = ANY(%s)
+		''', (list(user_ids),))
+		return dict(self.cursor.fetchall())
 
-			self.cursor.execute('''
-				INSERT INTO images (url, post_id, image)
-				VALUES (%s, %s, %s)
-				ON CONFLICT (url) DO UPDATE
-				SET (url, post_id, image) = (%s, %s, %s)
-			''',
-			(
-				str(url),
-				str(p__id),
-				response.content,
-				# for udpate
-				str(url),
-				str(p__id),
-				response.content
-			))
-		self.conn.commit()
+	def getRecentAuthors(self, since):
+		"""
+		Récupère les auteurs dont le feed a été inséré en BDD depuis la date donnée, avec la date de leur dernière insertion.
+		"""
+		self.cursor.execute('''
+			SELECT p.user_id, MAX(p.timestamp_inserted_at) FROM public.posts AS p
+			INNER JOIN public.users AS u
+			ON u.id_user = p.user_id
+			WHERE u.with_feed = true AND p.timestamp_inserted_at > %s
+			GROUP BY p.user_id
+		''', (int(since),))
+		return self.cursor.fetchall()
 
-	def insertUser(self, user):
+	@profiled('SqlClient.insertUser')
+	def insertUser(self, user, commit = True):
 		"""
-		Insère un utilisateur en BDD.
+		Insère un utilisateur en BDD. Un utilisateur déjà en base n'est réécrit que si son profil a changé; son label et son jeu (test ou entraînement) ne sont jamais touchés.
 		"""
 		u_id, u_user_name, u_full_name, u_is_private, u_is_verified, u_profile_pic_url, u_category, u_n_media, u_n_follower, u_n_following, u_is_business, u_biography, u_n_usertags, u_email, u_phone, u_city_id = get_user_fields(
 			user
 		)
 		self.cursor.execute('''
-			INSERT INTO users (id_user, user_name, full_name, is_private, is_verified, profile_pic_url, category, n_media, n_follower, n_following, is_business, biography, n_usertags, email, phone, city_id, with_feed)
+			INSERT INTO users AS u (id_user, user_name, full_name, is_private, is_verified, profile_pic_url, category, n_media, n_follower, n_following, is_business, biography, n_usertags, email, phone, city_id, with_feed)
 			VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
 			ON CONFLICT (id_user) DO UPDATE
-			SET (id_user, user_name, full_name, is_private, is_verified, profile_pic_url, category, n_media, n_follower, n_following, is_business, biography, n_usertags, email, phone, city_id, with_feed) = (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+			SET (user_name, full_name, is_private, is_verified, profile_pic_url, category, n_media, n_follower, n_following, is_business, biography, n_usertags, email, phone, city_id, with_feed)
+				= (EXCLUDED.user_name, EXCLUDED.full_name, EXCLUDED.is_private, EXCLUDED.is_verified, EXCLUDED.profile_pic_url, EXCLUDED.category, EXCLUDED.n_media, EXCLUDED.n_follower, EXCLUDED.n_following, EXCLUDED.is_business, EXCLUDED.biography, EXCLUDED.n_usertags, EXCLUDED.email, EXCLUDED.phone, EXCLUDED.city_id, EXCLUDED.with_feed)
+			WHERE (u.user_name, u.full_name, u.is_private, u.is_verified, u.profile_pic_url, u.category, u.n_media, u.n_follower, u.n_following, u.is_business, u.biography, u.n_usertags, u.email, u.phone, u.city_id, u.with_feed)
+				IS DISTINCT FROM (EXCLUDED.user_name, EXCLUDED.full_name, EXCLUDED.is_private, EXCLUDED.is_verified, EXCLUDED.profile_pic_url, EXCLUDED.category, EXCLUDED.n_media, EXCLUDED.n_follower, EXCLUDED.n_following, EXCLUDED.is_business, EXCLUDED.biography, EXCLUDED.n_usertags, EXCLUDED.email, EXCLUDED.phone, EXCLUDED.city_id, EXCLUDED.with_feed)
 		''', (
-				str(u_id),
-				str(u_user_name),
-				str(u_full_name),
-				str(u_is_private),
-				str(u_is_verified),
-				str(u_profile_pic_url),
-				str(u_category),
-				str(u_n_media),
-				str(u_n_follower),
-				str(u_n_following),
-				str(u_is_business),
-				str(u_biography),
-				str(u_n_usertags),
-				str(u_email),
-				str(u_phone),
-				str(u_city_id),
-				'true',
-				# for update
 				str(u_id),
 				str(u_user_name),
 				str(u_full_name),
@@ -601,58 +648,146 @@ class SqlClient(object):
 				'true'
 			)
 		)
-		self.conn.commit()
+		if commit:
+			self.conn.commit()
 
-	def insertComments(self, post_id, comments):
+	@profiled('SqlClient.insertComments')
+	def insertComments(self, post_id, comments, commit = True):
 		"""
-		Insère un commentaire en BDD.
+		Insère les commentaires d'un post en BDD. Un commentaire ne se modifie pas : celui déjà en base n'est pas réécrit.
 		"""
+		partitioned = self.isPartitioned()
 		for comment in comments:
 			_id, comment_user_id, comment_text = get_comment_fields(comment)
+			if partitioned:
+				self.cursor.execute('''
+					INSERT INTO comments (post_id, id_comment, user_id, comment, timestamp_inserted_at)
+					VALUES (%s, %s, %s, %s, %s)
+					ON CONFLICT DO NOTHING;
+					''',
+					(
+						str(post_id),
+						int(_id),
+						int(comment_user_id),
+						str(comment_text),
+						math.floor(time.time())
+					)
+				)
+				continue
 			self.cursor.execute('''
 				INSERT INTO comments (id_comment, post_id, user_id, comment)
 				VALUES (%s, %s, %s, %s)
-				ON CONFLICT (id_comment) DO UPDATE
-				SET (id_comment, post_id, user_id, comment) = (%s, %s, %s, %s);
+				ON CONFLICT (id_comment) DO NOTHING;
 				''',
 				(
-					str(_id),
-					str(post_id), 
-					str(comment_user_id),
-					str(comment_text),
-					# for update
 					str(_id),
 					str(post_id), 
 					str(comment_user_id),
 					str(comment_text)
 				)
 			)
+		if commit:
 			self.conn.commit()
 
-	def insertLikers(self, post_id, likers):
+	@profiled('SqlClient.insertLikers')
+	def insertLikers(self, post_id, likers, commit = True):
 		"""
-		Insère un like en BDD.
+		Insère les likes d'un post en BDD. Un like déjà en base n'est pas réécrit.
+		Dans la disposition partitionnée, les likes d'un post dont la rétention a déjà agrégé des likes (cf. `ageOutLikes`) ne sont plus insérés :
+		re-streamés, ils seraient comptés une seconde fois dans `like_edges`.
 		"""
+		partitioned = self.isPartitioned()
+		if partitioned and likers:
+			self.cursor.execute('''
+				SELECT 1 FROM posts AS p
+				WHERE p.id_post = %s AND p.likes_aged_before IS NOT NULL
+			''', (str(post_id),))
+			if self.cursor.fetchone() is not None:
+				return
 		for liker in likers:
 			user_id = get_liker_fields(liker)
-			_id = str(post_id) + str(user_id)
+			if partitioned:
+				self.cursor.execute('''
+					INSERT INTO likes (post_id, user_id, timestamp_inserted_at)
+					VALUES (%s, %s, %s)
+					ON CONFLICT DO NOTHING;
+					''',
+					(
+						str(post_id),
+						int(user_id),
+						math.floor(time.time())
+					)
+				)
+				continue
 			self.cursor.execute('''
 				INSERT INTO likes (id_like, post_id, user_id)
 				VALUES (%s, %s, %s)
-				ON CONFLICT (id_like) DO UPDATE
-				SET (id_like, post_id, user_id) = (%s, %s, %s);
+				ON CONFLICT (id_like) DO NOTHING;
 				''',
 				(
-					str(_id),
-					str(post_id), 
-					str(user_id),
-					# for update
-					str(_id),
+					str(post_id) + str(user_id),
 					str(post_id), 
 					str(user_id)
 				)
 			)
-		self.conn.commit()
+		if commit:
+			self.conn.commit()
+
+	@profiled('SqlClient.insertUnits')
+	def insertUnits(self, units):
+		"""
+		Insère un lot d'unités d'ingestion en une seule transaction, donc un seul commit.
+		Une unité regroupe tout ce que le streamer écrit pour un post : l'auteur, le post, le feed de l'auteur, les likes, les commentaires et les images.
+		Chaque unité est écrite sous un point de sauvegarde : une unité en erreur est annulée et rejetée sans entraîner le reste du lot.
+		Les images et les likes sont optionnels : s'ils échouent, ils sont annulés seuls et le reste de l'unité est écrit.
+		Les posts présents dans plusieurs unités ne sont écrits qu'une fois, par la dernière unité qui les contient.
+		L'auteur est écrit par chaque unité, sous son propre point de sauvegarde : une unité sautée ou rejetée ne prive pas les autres de leur auteur,
+		et un auteur inchangé n'est pas réécrit (cf. `insertUser`).
+		Une erreur de connexion annule tout le lot et est relevée.
+
+				Args:
+					units (dict[]) : les unités, de la forme {hashtag, top_post, post, user, feed, likers, comments, images}.
+
+				Returns:
+					(dict[]) Les unités rejetées.
+		"""
+
+		post_owners, feed_owners = dict(), dict()
+		for index, unit in enumerate(units):
+			post_owners[str(unit['post']['id'])] = index
+			for post in unit.get('feed', list()):
+				feed_owners[str(post['id'])] = index
+
+		rejected = list()
+		with self.transaction():
+			for index, unit in enumerate(units):
+				post_id = str(unit['post']['id'])
+				if post_owners[post_id] != index:
+					continue
+				### Un post de feed déjà écrit comme post principal n'est pas réécrit. ###
+				feed = [post for post in unit.get('feed', list()) if feed_owners[str(post['id'])] == index and str(post['id']) not in post_owners]
+				images = unit.get('images', dict())
+				try:
+					with self.savepoint('unit'):
+						self.setHashtag(unit['hashtag'])
+						if unit.get('user'):
+							self.insertUser(unit['user'], commit = False)
+						self.insertPost(unit['post'], topPost = unit.get('top_post', False), commit = False)
+						self.insertUserFeed(feed, commit = False)
+						self.insertComments(post_id, unit.get('comments', list()), commit = False)
+						with self.savepoint('images', optional = True):
+							for post in [unit['post']] + feed:
+								url = get_post_image_url(post)
+								if url in images:
+									self.insertImage(url, post['id'], images[url], commit = False)
+						with self.savepoint('likers', optional = True):
+							self.insertLikers(post_id, unit.get('likers', list()), commit = False)
+				except (psycopg2.OperationalError, psycopg2.InterfaceError):
+					raise
+				except Exception as e:
+					print('Rejected post %s (%s)' % (post_id, str(e).strip()), flush = True)
+					rejected.append(unit)
+		return rejected
 
 	def setLabel(self, username, label):
 		"""
@@ -748,6 +883,86 @@ class SqlClient(object):
 		result = [dict(zip(keys, value)) for value in values]
 		return result
 
+	def getUserFeatures(self, usernames = None):
+		"""
+		Calcule dans Postgres, en un seul GROUP BY, les features numériques des utilisateurs donnés, ou de tous les utilisateurs annotés :
+		moyennes de likes et de commentaires, taux d'engagement, fréquence de post et ancienneté du dernier post, ainsi que les champs du profil.
+		Comme `User.getUserInfoSQL`, on ne considère que les posts dont l'image est en base; les images elles-mêmes ne sont pas lues.
+
+				Args:
+					usernames (str[]) : les noms des utilisateurs, par défaut tous les utilisateurs annotés.
+
+				Returns:
+					(dict[]) Les features de chaque utilisateur ayant au moins un post.
+		"""
+		self.cursor.execute('''
+			SELECT
+				u.user_name, u.id_user, u.n_following, u.n_follower, u.n_usertags, u.n_media, u.biography, u.category, u.is_verified, u.label, u.test_set,
+				count(*) AS n_posts,
+				CASE WHEN count(*) > 1 THEN avg(p.n_likes)::float8 ELSE 0 END AS avglikes,
+				CASE WHEN count(*) > 1 THEN avg(p.n_comments)::float8 ELSE 0 END AS avgcomments,
+				CASE WHEN u.n_follower = 0 THEN 0 ELSE avg((GREATEST(p.n_likes, 0) + GREATEST(p.n_comments, 0)) * 100.0 / u.n_follower)::float8 END AS engagement,
+				count(*)::float8 / GREATEST(floor((extract(epoch FROM now()) - min(p.timestamp)) / (60 * 60 * 24)), 1) AS frequency,
+				(extract(epoch FROM now()) - max(p.timestamp))::float8 AS lastpost
+			FROM public.users AS u
+			INNER JOIN public.posts AS p
+			ON p.user_id = u.id_user
+			INNER JOIN public.images AS i
+			ON i.post_id = p.id_post
+			WHERE %s
+			GROUP BY u.id_user
+		''' % ('u.user_name = ANY(%s)' if usernames is not None else 'u.label > -1'), (list(usernames),) if usernames is not None else None)
+		values = self.cursor.fetchall()
+		keys = [desc[0] for desc in self.cursor.description]
+		return [dict(zip(keys, value)) for value in values]
+
+	def getUserImages(self, username):
+		"""
+		Récupère les images des posts de l'utilisateur, pour les features d'image.
+		"""
+		self.cursor.execute('''
+			SELECT i.image FROM public.users AS u
+			INNER JOIN public.posts AS p
+			ON p.user_id = u.id_user
+			INNER JOIN public.images AS i
+			ON i.post_id = p.id_post
+			WHERE u.user_name = %s
+		''', (username,))
+		return [bytes(value[0]) for value in self.cursor.fetchall()]
+
+	def getUserComments(self, username, limit = 10):
+		"""
+		Récupère, en une requête, les premiers commentaires de chacun des posts (avec image) de l'utilisateur, pour les features de texte.
+
+				Args:
+					username (str) : le nom de l'utilisateur.
+					limit (int) : le nombre maximal de commentaires par post.
+
+				Returns:
+					(str[][]) Les commentaires, post par post.
+		"""
+		### Les premiers commentaires sont pris dans l'ordre d'insertion puis de leur id Instagram (chronologique), pour être les mêmes d'un appel à l'autre. ###
+		### La disposition d'origine n'a pas de date d'insertion, et ses ids sont du texte : on les trie numériquement.                                 ###
+		if self.isPartitioned():
+			order = 'c.timestamp_inserted_at, c.id_comment'
+		else:
+			order = 'length(c.id_comment), c.id_comment'
+		self.cursor.execute('''
+			SELECT post_id, comment FROM (
+				SELECT c.post_id, c.comment, row_number() OVER (PARTITION BY c.post_id ORDER BY %s) AS rank FROM public.users AS u
+				INNER JOIN public.posts AS p
+				ON p.user_id = u.id_user
+				INNER JOIN public.comments AS c
+				ON c.post_id = p.id_post
+				WHERE u.user_name = %%s AND EXISTS (SELECT 1 FROM public.images AS i WHERE i.post_id = p.id_post)
+			) AS comments
+			WHERE rank <= %%s
+		''' % order, (username, int(limit)))
+		comments = dict()
+		for post_id, comment in self.cursor.fetchall():
+			comments.setdefault(post_id, list()).append(comment)
+		return list(comments.values())
+
 	def getUser(self, username):
 		"""
 		Récupère les informations d'un utilisateur.
@@ -791,7 +1006,7 @@ class SqlClient(object):
 			WHERE u.label %s -1
 			GROUP BY u.user_name
 			%s
-		''' % ('>' if labeled else '=', 'LIMIT' + str(limit) if limit > 0 else ''))
+		''' % ('>' if labeled else '=', 'LIMIT ' + str(limit) if limit > 0 else ''))
 		values = self.cursor.fetchall()
 		keys = [desc[0] for desc in self.cursor.description]
 		result = [dict(zip(keys, value)) for value in values]
@@ -822,15 +1037,102 @@ class SqlClient(object):
 		''' % user_id)
 		return self.cursor.fetchall()
 
+	def hasStatsViews(self):
+		"""
+		Indique si les vues matérialisées de statistiques existent (cf. `createStatsViews`).
+		"""
+		if self.stats_views is None:
+			self.cursor.execute('''
+				SELECT count(*) FROM pg_catalog.pg_matviews
+				WHERE schemaname = 'public' AND matviewname = ANY(%s)
+			''', (STATS_VIEWS,))
+			self.stats_views = self.cursor.fetchone()[0] == len(STATS_VIEWS)
+		return self.stats_views
+
+	def createStatsViews(self, commit = True):
+		"""
+		Créée les vues matérialisées des rapports agrégés : nombre de likes et de commentaires par post, histogramme des likes,
+		répartition des hashtags et moyennes globales. Chaque vue a un index unique, pour pouvoir être rafraîchie sans bloquer les lectures.
+		"""
+		self.cursor.execute('''
+			CREATE MATERIALIZED VIEW IF NOT EXISTS public.stats_post_counts AS
+				SELECT COALESCE(l.post_id, c.post_id) AS post_id, COALESCE(l.n_likes, 0) AS n_likes, COALESCE(c.n_comments, 0) AS n_comments
+				FROM (SELECT post_id, count(*) AS n_likes FROM public.likes GROUP BY post_id) AS l
+				FULL OUTER JOIN (SELECT post_id, count(*) AS n_comments FROM public.comments GROUP BY post_id) AS c
+				ON c.post_id = l.post_id;
+			CREATE UNIQUE INDEX IF NOT EXISTS stats_post_counts_pkey ON public.stats_post_counts (post_id);
+
+			CREATE MATERIALIZED VIEW IF NOT EXISTS public.stats_likes_histogram AS
+				SELECT (n_likes / 10) * 10 AS likes_floor, count(*) AS n_posts
+				FROM public.stats_post_counts
+				WHERE n_likes > 0
+				GROUP BY likes_floor;
+			CREATE UNIQUE INDEX IF NOT EXISTS stats_likes_histogram_pkey ON public.stats_likes_histogram (likes_floor);
+
+			CREATE MATERIALIZED VIEW IF NOT EXISTS public.stats_hashtags AS
+				SELECT hashtag_origin AS hashtag, count(hashtag_origin) AS n_posts
+				FROM public.posts
+				GROUP BY hashtag_origin;
+			CREATE UNIQUE INDEX IF NOT EXISTS stats_hashtags_pkey ON public.stats_hashtags (hashtag);
+
+			CREATE MATERIALIZED VIEW IF NOT EXISTS public.stats_summary AS
+				SELECT 1 AS id, p.avg_likes, p.avg_comments, u.avg_followers, u.avg_followings, extract(epoch FROM now())::integer AS refreshed_at
+				FROM (
+					SELECT avg(n_likes) FILTER (WHERE n_likes > 0) AS avg_likes, avg(n_comments) FILTER (WHERE n_comments > 0) AS avg_comments
+					FROM public.stats_post_counts
+				) AS p, (
+					SELECT avg(n_follower) AS avg_followers, avg(n_following) AS avg_followings
+					FROM public.users
+				) AS u;
+			CREATE UNIQUE INDEX IF NOT EXISTS stats_summary_pkey ON public.stats_summary (id);
+		''')
+		self.stats_views = True
+		if commit:
+			self.conn.commit()
+
+	def dropStatsViews(self, commit = True):
+		"""
+		Supprime les vues matérialisées de statistiques.
+		"""
+		for view in reversed(STATS_VIEWS):
+			self.cursor.execute('DROP MATERIALIZED VIEW IF EXISTS public.%s' % view)
+		self.stats_views = False
+		if commit:
+			self.conn.commit()
+
+	def refreshStats(self, concurrently = True):
+		"""
+		Rafraîchit les vues de statistiques, dans l'ordre de leurs dépendances. En mode concurrent, les lectures ne sont pas bloquées
+		pendant le rafraîchissement; chaque vue est validée séparément.
+		"""
+		for view in STATS_VIEWS:
+			self.cursor.execute('REFRESH MATERIALIZED VIEW %s public.%s' % ('CONCURRENTLY' if concurrently else '', view))
+			self.conn.commit()
+
+	def getStatsSummary(self):
+		"""
+		Récupère les moyennes globales et la date du dernier rafraîchissement des vues de statistiques.
+		"""
+		self.cursor.execute('''
+			SELECT avg_likes, avg_comments, avg_followers, avg_followings, refreshed_at FROM public.stats_summary
+		''')
+		keys = [desc[0] for desc in self.cursor.description]
+		return dict(zip(keys, self.cursor.fetchone()))
+
 	def getAverageFollowersPerUser(self):
 		"""
 		Récupère le nombre moyen de followers par utilisateur.
 		"""
-		self.cursor.execute('''
-			SELECT AVG(n_follower)
-			FROM users
-			'''
-		)
+		if self.hasStatsViews():
+			self.cursor.execute('''
+				SELECT avg_followers FROM public.stats_summary
+			''')
+		else:
+			self.cursor.execute('''
+				SELECT AVG(n_follower)
+				FROM users
+				'''
+			)
 		result = "{0:0.2f}".format(self.cursor.fetchone()[0])
 		print('Average number of followers: ', result)
 
@@ -838,11 +1140,16 @@ class SqlClient(object):
 		"""
 		Récupère le nombre moyen d'abonnements par utilisateur.
 		"""
-		self.cursor.execute('''
-			SELECT AVG(n_following)
-			FROM users
-			'''
-		)
+		if self.hasStatsViews():
+			self.cursor.execute('''
+				SELECT avg_followings FROM public.stats_summary
+			''')
+		else:
+			self.cursor.execute('''
+				SELECT AVG(n_following)
+				FROM users
+				'''
+			)
 		result = "{0:0.2f}".format(self.cursor.fetchone()[0])
 		print('Average number of followings: ', result)
 
@@ -850,6 +1157,19 @@ class SqlClient(object):
 		"""
 		Récupère le nombre moyen de likes par post, ainsi que l'histogramme associé.
 		"""
+		if self.hasStatsViews():
+			self.cursor.execute('''
+				SELECT avg_likes FROM public.stats_summary
+			''')
+			average = "{0:0.2f}".format(self.cursor.fetchone()[0])
+			self.cursor.execute('''
+				SELECT likes_floor, n_posts FROM public.stats_likes_histogram
+				ORDER BY likes_floor
+			''')
+			return {
+				'average': average,
+				'histogram': self.cursor.fetchall()
+			}
 		self.cursor.execute(
 			'''
 			SELECT avg(count) FROM (
@@ -882,14 +1202,19 @@ class SqlClient(object):
 		"""
 		Récupère le nombre moyen de commentaires par post.
 		"""
-		self.cursor.execute('''
-			SELECT avg(count) FROM (
-				SELECT count(post_id) 
-				FROM comments 
-				GROUP BY post_id
-			) AS counts
-			'''
-		)
+		if self.hasStatsViews():
+			self.cursor.execute('''
+				SELECT avg_comments FROM public.stats_summary
+			''')
+		else:
+			self.cursor.execute('''
+				SELECT avg(count) FROM (
+					SELECT count(post_id) 
+					FROM comments 
+					GROUP BY post_id
+				) AS counts
+				'''
+			)
 		result = "{0:0.2f}".format(self.cursor.fetchone()[0])
 		print('Average number of comments: ', result)
 
@@ -897,12 +1222,17 @@ class SqlClient(object):
 		"""
 		Récupère la répartition des hashtags en BDD.
 		"""
-		self.cursor.execute('''
-			SELECT hashtag_origin, count(hashtag_origin) 
-			FROM posts
-			GROUP BY hashtag_origin
-			'''
-		)
+		if self.hasStatsViews():
+			self.cursor.execute('''
+				SELECT hashtag, n_posts FROM public.stats_hashtags
+			''')
+		else:
+			self.cursor.execute('''
+				SELECT hashtag_origin, count(hashtag_origin) 
+				FROM posts
+				GROUP BY hashtag_origin
+				'''
+			)
 		result = self.cursor.fetchall()
 		_result = dict()
 		for couple in result:
@@ -911,20 +1241,76 @@ class SqlClient(object):
 		
 	def getAllLikes(self, n = 0):
 		"""
-		Retourne n likes en base de données.
+		Retourne n likes en base de données, sous forme de couples (liker, auteur du post).
+		Dans la disposition partitionnée, les likes déjà agrégés par la rétention (cf. `ageOutLikes`) sont pris dans `like_edges`.
 		"""
-		self.cursor.execute('''
-			SELECT l.user_id, p.user_id FROM public.likes as l
-			INNER JOIN public.posts as p
-			ON l.post_id = p.id_post
-			ORDER BY RANDOM()
-			LIMIT %s
-		''' % str(n))
+		if self.isPartitioned():
+			self.cursor.execute('''
+				SELECT liker_id, author_id FROM (
+					SELECT l.user_id::text AS liker_id, p.user_id AS author_id FROM public.likes as l
+					INNER JOIN public.posts as p
+					ON l.post_id = p.id_post
+					UNION ALL
+					SELECT e.liker_id::text, e.author_id FROM public.like_edges as e
+				) AS likes
+				ORDER BY RANDOM()
+				LIMIT %s
+			''', (int(n),))
+		else:
+			self.cursor.execute('''
+				SELECT l.user_id, p.user_id FROM public.likes as l
+				INNER JOIN public.posts as p
+				ON l.post_id = p.id_post
+				ORDER BY RANDOM()
+				LIMIT %s
+			''' % str(n))
 		values = self.cursor.fetchall()
 		#keys = [desc[0] for desc in self.cursor.description]
 		#return [dict(zip(keys, value)) for value in values]
 		return values
 
+	def ageOutLikes(self, before, limit):
+		"""
+		Agrège dans `like_edges` (liker, auteur, nombre de likes) puis supprime les likes bruts insérés avant la date donnée, en une transaction.
+		Le graphe de likes (cf. `getAllLikes`) reste le même, mais les likes bruts ne grossissent plus sans fin. Disposition partitionnée uniquement.
+		Les posts dont des likes sont agrégés reçoivent la date de rétention (`posts.likes_aged_before`), une valeur par post et non par like :
+		`insertLikers` ne réinsère plus leurs likes, qui ne sont donc jamais comptés deux fois dans `like_edges`.
+
+				Args:
+					before (int) : la date (timestamp) avant laquelle les likes sont agrégés.
+					limit (int) : le nombre maximal de likes traités.
+
+				Returns:
+					(int) Le nombre de likes agrégés.
+		"""
+		with self.transaction():
+			self.cursor.execute('''
+				WITH aged AS (
+					DELETE FROM public.likes AS l
+					WHERE (l.post_id, l.user_id) IN (
+						SELECT post_id, user_id FROM public.likes
+						WHERE timestamp_inserted_at < %s
+						LIMIT %s
+					)
+					RETURNING l.post_id, l.user_id
+				), watermarks AS (
+					UPDATE public.posts AS p
+					SET likes_aged_before = GREATEST(COALESCE(p.likes_aged_before, 0), %s)
+					FROM (SELECT DISTINCT post_id FROM aged) AS a
+					WHERE p.id_post = a.post_id
+				), edges AS (
+					INSERT INTO public.like_edges (liker_id, author_id, n_likes)
+					SELECT a.user_id, p.user_id, count(*) FROM aged AS a
+					INNER JOIN public.posts AS p
+					ON p.id_post = a.post_id
+					GROUP BY a.user_id, p.user_id
+					ON CONFLICT (liker_id, author_id) DO UPDATE
+					SET n_likes = like_edges.n_likes + EXCLUDED.n_likes
+				)
+				SELECT count(*) FROM aged
+			''', (int(before), int(limit), int(before)))
+			return self.cursor.fetchone()[0]
+
 	def getAllComments(self):
 		"""
 		Récupère tous les commentaires de la BDD.
@@ -945,9 +1331,35 @@ class SqlClient(object):
 		values = self.cursor.fetchall()
 		keys = [desc[0] for desc in self.cursor.description]
 		result = [dict(zip(keys, value)) for value in values]
-		print(result)
 		return result
 
+	def iterBiographies(self, batch_size = FETCH_SIZE, usernames = None):
+		"""
+		Parcourt les biographies des utilisateurs annotés du jeu d'entraînement par lots, avec un curseur côté serveur :
+		seul le lot en cours est en mémoire.
+
+				Args:
+					batch_size (int) : le nombre de biographies par lot.
+					usernames (str[]) : les utilisateurs à parcourir, par défaut tous les utilisateurs annotés.
+
+				Returns:
+					(generator) Les lots, sous la forme (biographies, labels).
+		"""
+		cursor = self.conn.cursor(name = 'biographies')
+		cursor.itersize = batch_size
+		try:
+			cursor.execute('''
+				SELECT coalesce(biography, ''), label FROM public.users AS u
+				WHERE u.label > -1 AND u.test_set = false
+			''' + ('AND u.user_name = ANY(%s)' if usernames is not None else ''), (list(usernames),) if usernames is not None else None)
+			while True:
+				rows = cursor.fetchmany(batch_size)
+				if not rows:
+					break
+				yield [row[0] for row in rows], [row[1] for row in rows]
+		finally:
+			cursor.close()
+
 	def deleteUser(self, username):
 		"""
 		Supprime un utilisateur, notamment lorsque l'utilisateur a supprimé son compte ou changé son nom d'utilisateur.
@@ -0,0 +1,80 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import time
+import argparse
+import configparser
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from sql_client import SqlClient
+
+config_path = os.path.join(os.path.dirname(__file__), './config.ini')
+
+### Période de rafraîchissement des vues de statistiques, en secondes. ###
+REFRESH_PERIOD = 60
+
+def run(period = None, once = False):
+	"""
+	Rafraîchit périodiquement les vues matérialisées de statistiques, sans bloquer les tableaux de bord qui les lisent.
+	Les vues sont créées au premier lancement si besoin (cf. `Migrations.mig_4`).
+
+			Args:
+				period (float) : la période de rafraîchissement, par défaut celle de la section [Stats] du fichier de config.
+				once (bool) : ne rafraîchit qu'une fois.
+
+			Returns:
+				(none)
+	"""
+
+	config = configparser.ConfigParser()
+	config.read(config_path)
+	period = config.getfloat('Stats', 'refresh_period', fallback = REFRESH_PERIOD) if period is None else period
+
+	sqlClient = SqlClient()
+	sqlClient.openCursor()
+	try:
+		if not sqlClient.hasStatsViews():
+			sqlClient.createStatsViews()
+		while True:
+			time_start = time.time()
+			try:
+				sqlClient.refreshStats()
+				print('Stats refreshed in %.2f seconds.' % (time.time() - time_start), flush = True)
+			except Exception as e:
+				print('Stats refresh failed (%s)' % str(e).strip(), flush = True)
+				sqlClient.recover()
+			if once:
+				break
+			time.sleep(max(period - (time.time() - time_start), 0))
+	finally:
+		sqlClient.close()
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument('--period', type = float, default = None, help = 'La période de rafraîchissement, en secondes.')
+	parser.add_argument('--once', action = 'store_true', help = 'Ne rafraîchit les vues qu\'une fois.')
+	args = parser.parse_args()
+
+	run(period = args.period, once = args.once)
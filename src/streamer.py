@@ -28,7 +28,6 @@ import atexit
 import math
 import gc
 import pprint
-from random import randint
 
 ### Installed libs. ###
 import psycopg2
@@ -42,6 +41,13 @@ sys.path.append(os.path.dirname(__file__))
 ### Custom libs. ###
 from utils import *
 from sql_client import *
+from downloader import ImageDownloader
+from cache import AuthorCache, MAX_SIZE, TTLS
+from checkpoint import StreamCheckpoint, checkpoint_path
+from scheduler import HashtagScheduler, MAX_PAGES
+from metrics import Metrics, SNAPSHOT_PERIOD
+from profiling import tag
+from writer import WriteBehindWriter, QUEUE_SIZE, BATCH_SIZE, FLUSH_INTERVAL, RETRY_DELAY, spill_path
 
 ### Tracking du chemin des fichiers et instanciation du PrettyPrinter. ###
 config_path = os.path.join(os.path.dirname(__file__), './config.ini')
@@ -52,24 +58,84 @@ class Streamer(object):
 	"""
 	Streamer class.
 	"""
-	def __init__(self):
+	def __init__(self, seedAuthorCache = True, account = 'Instagram', api = None, hashtags = None, checkpointPath = None, statusQueue = None, downloader = None):
 		"""
 		__init__ function.
+
+				Args:
+					seedAuthorCache (bool) : pré-remplit le cache d'auteurs avec les auteurs insérés récemment en base.
+					account (str) : la section du fichier de config qui contient les identifiants du compte Instagram.
+					api (InstagramAPI) : une API déjà instanciée (par exemple un bouchon), à la place de celle du compte.
+					hashtags (tuple) : les hashtags sponsorisés et populaires attribués à ce streamer, par défaut tous.
+					checkpointPath (str) : le chemin du fichier de checkpoint, propre à chaque streamer.
+					statusQueue (Queue) : la file où publier les compteurs, lue par le coordinateur.
+					downloader (ImageDownloader) : le téléchargeur des images, par défaut un `ImageDownloader`.
 		"""
 		super().__init__()
 		### Login au compte Instagram du projet pour avoir accès à l'API. ###
 		self.config = configparser.ConfigParser()
 		self.config.read(config_path)
-		igusername = self.config['Instagram']['user']
-		igpassword = self.config['Instagram']['password']
+		self.account = account
+		self.statusQueue = statusQueue
 
 		### Connexion à l'API. ###
-		self.InstagramAPI = InstagramAPI(igusername, igpassword)
+		if api is None:
+			igusername = self.config[account]['user']
+			igpassword = self.config[account]['password']
+			api = InstagramAPI(igusername, igpassword)
+		self.InstagramAPI = api
 		self.InstagramAPI.login()
-		self.hashtags_sponsor_related = get_sponsor_hashtags()
-		self.hashtags_random = get_random_hashtags()
+		if hashtags is None:
+			hashtags = (get_sponsor_hashtags(), get_random_hashtags())
+		self.hashtags_sponsor_related, self.hashtags_random = hashtags
 		self.sqlClient = SqlClient()
-		self.n_posts, self.n_authors, self.n_likes, self.n_comments = [0] * 4
+		self.downloader = downloader or ImageDownloader()
+
+		### Cache des auteurs récemment traités, pour ne pas re-questionner l'API sur leur profil et leur feed. ###
+		### La section [Streamer] du fichier de config permet d'ajuster la taille et la fraîcheur par champ.    ###
+		self.authorCache = AuthorCache(
+			max_size = self.config.getint('Streamer', 'author_cache_size', fallback = MAX_SIZE),
+			ttls = {field: self.config.getint('Streamer', '%s_ttl' % field, fallback = ttl) for field, ttl in TTLS.items()}
+		)
+		if seedAuthorCache:
+			self.seedAuthorCache()
+
+		### Reprise de l'état du stream (étape, curseurs, posts traités, compteurs) là où il s'était arrêté. ###
+		self.checkpoint = StreamCheckpoint(checkpointPath or self.config.get('Streamer', 'checkpoint_path', fallback = checkpoint_path))
+		if self.checkpoint.load():
+			tqdm.write('Resuming stream from step n°%s' % str(self.checkpoint.step))
+		self.n_posts, self.n_authors, self.n_likes, self.n_comments, self.n_api_calls = [self.checkpoint.counters.get(counter, 0) for counter in ['n_posts', 'n_authors', 'n_likes', 'n_comments', 'n_api_calls']]
+
+		### Ordonnanceur des hashtags, qui suit le rendement de chacun pour y allouer les appels à l'API. ###
+		self.scheduler = HashtagScheduler(self.hashtags_sponsor_related, self.hashtags_random)
+		self.scheduler.load(self.checkpoint.scheduler)
+		self.max_pages = self.config.getint('Streamer', 'max_pages', fallback = MAX_PAGES)
+
+		### Métriques du stream : latence par étape, débit et erreurs par endpoint.                                 ###
+		### Exposées sur `http://127.0.0.1:<port>/metrics` si un port est configuré pour le compte ou dans [Metrics], ###
+		### et écrites en JSON dans `metrics-<compte>.json` si un dossier d'instantanés est configuré.                ###
+		self.metrics = Metrics(labels = {'account': account})
+		metrics_port = self.config.getint(account, 'metrics_port', fallback = self.config.getint('Metrics', 'port', fallback = 0))
+		if metrics_port:
+			self.metrics.serve(metrics_port)
+			tqdm.write('Serving metrics on http://127.0.0.1:%s/metrics' % str(metrics_port))
+		snapshot_dir = self.config.get('Metrics', 'snapshot_dir', fallback = '')
+		self.metrics_snapshot_path = os.path.join(snapshot_dir, 'metrics-%s.json' % account) if snapshot_dir else ''
+		self.metrics_snapshot_period = self.config.getint('Metrics', 'snapshot_period', fallback = SNAPSHOT_PERIOD)
+
+		### Écriture différée : les posts sont écrits en base par lots, dans un thread, pour que le stream n'attende pas Postgres. ###
+		### La section [Writer] du fichier de config règle la file, les lots et le journal local utilisé si la base est indisponible. ###
+		self.writer = None
+		if self.config.getboolean('Writer', 'enabled', fallback = True):
+			self.writer = WriteBehindWriter(
+				SqlClient,
+				queue_size = self.config.getint('Writer', 'queue_size', fallback = QUEUE_SIZE),
+				batch_size = self.config.getint('Writer', 'batch_size', fallback = BATCH_SIZE),
+				flush_interval = self.config.getfloat('Writer', 'flush_interval', fallback = FLUSH_INTERVAL),
+				spill_path = self.config.get('Writer', 'spill_path', fallback = spill_path if account == 'Instagram' else spill_path.replace('.jsonl', '-%s.jsonl' % account)),
+				retry_delay = self.config.getfloat('Writer', 'retry_delay', fallback = RETRY_DELAY),
+				metrics = self.metrics
+			)
 		atexit.register(self.exit_handler)
 
 	def exit_handler(self):
@@ -84,9 +150,45 @@ class Streamer(object):
 		"""
 
 		print('Process ended ! Closing the session.')
+		if self.writer is not None:
+			self.writer.close()
+			self.markDurable()
+		self.saveCheckpoint()
 		self.sqlClient.close()
+		self.downloader.close()
+		if self.metrics_snapshot_path:
+			self.metrics.writeSnapshot(self.metrics_snapshot_path)
+		self.metrics.close()
 		self.display_status()
 
+	def saveCheckpoint(self):
+		"""
+		Sauvegarde l'état du stream, compteurs compris.
+
+				Args:
+					(none)
+				
+				Returns:
+					(none)
+		"""
+
+		self.checkpoint.counters = {
+			'n_posts': self.n_posts,
+			'n_authors': self.n_authors,
+			'n_likes': self.n_likes,
+			'n_comments': self.n_comments,
+			'n_api_calls': self.n_api_calls
+		}
+		self.checkpoint.scheduler = self.scheduler.state()
+		self.checkpoint.save()
+
+		### Publication des compteurs pour le coordinateur, sans jamais bloquer le stream. ###
+		if self.statusQueue is not None:
+			try:
+				self.statusQueue.put_nowait((self.account, dict(self.checkpoint.counters)))
+			except Exception:
+				pass
+
 	def display_status(self):
 		"""
 		Affiche le statut du stream.
@@ -100,7 +202,94 @@ class Streamer(object):
 
 		tqdm.write('Number of posts and authors processed : %s,' % str(self.n_posts))
 		tqdm.write('Number of likes processed : %s,' % str(self.n_likes))
-		tqdm.write('Number of comments processed : %s' % str(self.n_comments))
+		tqdm.write('Number of comments processed : %s,' % str(self.n_comments))
+		tqdm.write('Number of API calls : %s, errors : %s' % (str(self.n_api_calls), str(sum(self.metrics.errors.values()))))
+
+	def writeUnit(self, unit):
+		"""
+		Écrit l'unité d'ingestion d'un post : via l'écriture différée si elle est active, sinon directement en une transaction.
+
+				Args:
+					unit (dict) : l'unité d'ingestion (cf. `SqlClient.insertUnits`).
+				
+				Returns:
+					(none)
+		"""
+
+		if self.writer is not None:
+			with self.metrics.timer('writer.put'):
+				self.writer.put(unit)
+			return
+		with self.metrics.timer('sql.insertUnits'):
+			rejected = self.sqlClient.insertUnits([unit])
+		if rejected:
+			self.metrics.inc('units_rejected', len(rejected))
+		self.checkpoint.markProcessed(unit['post']['id'])
+
+	def markDurable(self):
+		"""
+		Marque comme traités les posts que l'écriture différée a écrits en base (ou dans son journal) depuis le dernier appel.
+		"""
+
+		if self.writer is not None:
+			for post_id in self.writer.drainDurable():
+				self.checkpoint.markProcessed(post_id)
+
+	def callAPI(self, endpoint, *args):
+		"""
+		Appelle un endpoint de l'API Instagram, en mesurant sa latence et en comptant les appels et les erreurs.
+
+				Args:
+					endpoint (str) : le nom de la méthode de l'API (`getMediaLikers`...).
+					args : les arguments de l'appel.
+				
+				Returns:
+					(dict) La réponse de l'API (`LastJson`), qui contient le message d'erreur si l'appel a échoué.
+		"""
+
+		with self.metrics.timer('api.%s' % endpoint):
+			success = getattr(self.InstagramAPI, endpoint)(*args)
+		self.n_api_calls += 1
+		self.metrics.inc('api_calls')
+		if not success:
+			self.metrics.error(endpoint)
+		return self.InstagramAPI.LastJson
+
+	def seedAuthorCache(self):
+		"""
+		Pré-remplit le cache d'auteurs avec les auteurs dont le feed a été inséré récemment en base.
+
+				Args:
+					(none)
+				
+				Returns:
+					(none)
+		"""
+
+		### Au-delà de la plus longue durée de fraîcheur, un auteur devrait de toute façon être re-questionné. ###
+		self.sqlClient.openCursor()
+		since = math.floor(time.time()) - max(self.authorCache.ttls.values())
+		self.authorCache.seed(self.sqlClient.getRecentAuthors(since))
+		self.sqlClient.closeCursor()
+		tqdm.write('Seeded author cache with %s authors' % str(len(self.authorCache)))
+
+	def filterKnownImages(self, posts):
+		"""
+		Retire les posts dont l'image est déjà en base, en une seule requête.
+		On compare à la fois l'URL et l'id du post, car les URLs signées du CDN changent dans le temps.
+
+				Args:
+					posts (dict[]) : les posts Instagram dont on veut les images.
+				
+				Returns:
+					(dict[]) Les posts dont l'image n'est pas encore en base.
+		"""
+
+		known_urls, known_post_ids = self.sqlClient.getKnownImages(
+			[get_post_image_url(post) for post in posts],
+			[str(post['id']) for post in posts]
+		)
+		return [post for post in posts if get_post_image_url(post) not in known_urls and str(post['id']) not in known_post_ids]
 
 	def process_post(self, post, topPost = False):
 		"""
@@ -114,139 +303,217 @@ class Streamer(object):
 					(none)
 		"""
 
+		### Un post déjà traité (typiquement avant un redémarrage) ou en attente d'écriture n'est pas re-questionné. ###
+		self.markDurable()
+		if self.checkpoint.isProcessed(post['id']) or (self.writer is not None and self.writer.isPending(post['id'])):
+			tqdm.write('Post %s already processed' % str(post['id']))
+			return
+
 		### Calcul du temps d'exécution de la fonction. On veut que le temps minimal d'exécution soit de 10s. ###
 		time_start = time.time()
 		
 		try:
+			### Si l'auteur a été traité récemment, on ne re-questionne pas l'API sur son profil ni sur son feed. ###
+			author_id = str(post['user']['pk'])
+			fetch_user = not self.authorCache.isFresh(author_id, 'user')
+			fetch_feed = not self.authorCache.isFresh(author_id, 'feed')
+			if not fetch_user:
+				self.metrics.inc('authors_cached')
+
 			### Questionnement de l'API sur les champs du post. ###
-			time_temp_start = time.time()
-			self.InstagramAPI.getUsernameInfo(post['user']['pk'])
-			user_server = self.InstagramAPI.LastJson
-			tqdm.write('Got 1 Author in %.2f seconds' % float(time.time() - time_temp_start))
-
-			time_temp_start = time.time()
-			self.InstagramAPI.getMediaComments(str(post['id']))
-			comments_server = self.InstagramAPI.LastJson
-			tqdm.write('Got %s Comments in %.2f seconds' % (str(len(comments_server['comments'])), float(time.time() - time_temp_start)))
-
-			time_temp_start = time.time()
-			self.InstagramAPI.getMediaLikers(str(post['id']))
-			likers_server = self.InstagramAPI.LastJson
-			tqdm.write('Got %s Likers in %.2f seconds' % (str(len(likers_server['users'])), float(time.time() - time_temp_start)))
-
-			time_temp_start = time.time()
-			self.InstagramAPI.getUserFeed(post['user']['pk'])
-			feed = self.InstagramAPI.LastJson['items']
-			tqdm.write('Got %s posts from feed in %.2f seconds' % (str(len(feed)), float(time.time() - time_temp_start)))
-
-			### Insertion dans la BDD. ###
-			time_temp_start = time.time()
-			self.sqlClient.insertUser(user_server['user'])
-			tqdm.write('Inserted 1 Author in %.2f seconds' % float(time.time() - time_temp_start))
-			self.n_authors += 1
-
-			time_temp_start = time.time()
-			self.sqlClient.insertPost(post, topPost = topPost)
-			tqdm.write('Inserted 1 Post in %.2f seconds' % float(time.time() - time_temp_start))
-			self.n_posts += 1
-
-			time_temp_start = time.time()
-			self.sqlClient.insertUserFeed(feed)
-			tqdm.write('Inserted feed of %s posts in %.2f seconds' % (str(len(feed)), float(time.time() - time_temp_start)))
-			self.n_posts += len(feed)
-
-			time_temp_start = time.time()
-			self.sqlClient.insertLikers(post['id'], likers_server['users'])
-			tqdm.write('Inserted %s Likers in %.2f seconds' % (str(len(likers_server['users'])), float(time.time() - time_temp_start)))
+			if fetch_user:
+				user_server = self.callAPI('getUsernameInfo', post['user']['pk'])
+			comments_server = self.callAPI('getMediaComments', str(post['id']))
+			likers_server = self.callAPI('getMediaLikers', str(post['id']))
+			feed = self.callAPI('getUserFeed', post['user']['pk'])['items'] if fetch_feed else list()
+			tag(users = 1 if fetch_user else 0, posts = len(feed) + 1)
+
+			### On ne télécharge que les images qu'on n'a pas déjà en base (vérification groupée sur les URLs et les ids des posts). ###
+			with self.metrics.timer('sql.filterKnownImages'):
+				new_posts = self.filterKnownImages([post] + feed)
+			self.metrics.inc('images_skipped', len(feed) + 1 - len(new_posts))
+
+			### Les images sont toutes téléchargées avant l'insertion : les transactions n'attendent plus le réseau.        ###
+			### Une URL présente deux fois dans le feed n'est téléchargée, et comptée en erreur si elle échoue, qu'une fois. ###
+			urls = list(dict.fromkeys(get_post_image_url(_post) for _post in new_posts))
+			with self.metrics.timer('cdn.downloadAll'):
+				images = self.downloader.downloadAll(urls)
+			self.metrics.inc('images_downloaded', len(images))
+			self.metrics.error('cdn', len(urls) - len(images))
+
+			### Tout ce qui concerne le post forme une unité d'ingestion, écrite en une transaction. ###
+			unit = {
+				'hashtag': self.sqlClient.hashtag,
+				'top_post': topPost,
+				'post': post,
+				'user': user_server['user'] if fetch_user else None,
+				'feed': feed,
+				'likers': likers_server['users'],
+				'comments': comments_server['comments'],
+				'images': images
+			}
+			self.writeUnit(unit)
+
+			if fetch_user:
+				self.authorCache.touch(author_id, 'user')
+				self.n_authors += 1
+				self.metrics.inc('authors')
+			if fetch_feed:
+				self.authorCache.touch(author_id, 'feed')
+			self.n_posts += 1 + len(feed)
 			self.n_likes += len(likers_server['users'])
-
-			time_temp_start = time.time()
-			self.sqlClient.insertComments(post['id'], comments_server['comments'])
-			tqdm.write('Inserted %s Comments in %.2f seconds' % (str(len(comments_server['comments'])), float(time.time() - time_temp_start)))
 			self.n_comments += len(comments_server['comments'])
+			self.metrics.inc('posts', 1 + len(feed))
+			self.metrics.inc('likes', len(likers_server['users']))
+			self.metrics.inc('comments', len(comments_server['comments']))
 
+			self.saveCheckpoint()
 			self.display_status()
 
 		except Exception as e:
 			print(e)
-			### Si le client SQL ferme, on le réinstancie pour le rouvrir. ###
-			self.sqlClient = SqlClient()
-			self.sqlClient.openCursor()
-			pass
+			self.metrics.error('process_post')
+			### La transaction en erreur est annulée; le client ne se reconnecte que si la connexion est perdue. ###
+			self.sqlClient.recover()
 
+		self.metrics.observe('process_post', time.time() - time_start)
+		self.metrics.maybeSnapshot(self.metrics_snapshot_path, self.metrics_snapshot_period)
 		diff = time.time() - time_start
 		if diff < TTW:
 			tqdm.write('Waiting %.2f seconds before performing next request...' % float(TTW - diff))
 			time.sleep(TTW - diff)
 		tqdm.write('\n')
 
-	def stream_step(self, hashtag, getTopPosts, stepIndex):
+	def measurePage(self, posts):
+		"""
+		Mesure le rendement potentiel d'une page de hashtag avant de la traiter : posts inédits, nouveaux auteurs et influenceurs annotés.
+
+				Args:
+					posts (dict[]) : les posts de la page.
+				
+				Returns:
+					(tuple) Le nombre de posts inédits, de nouveaux auteurs et d'auteurs annotés influenceurs.
+		"""
+
+		post_ids = [str(post['id']) for post in posts]
+		author_ids = set(str(post['user']['pk']) for post in posts)
+		try:
+			known_posts = self.sqlClient.getKnownPosts(post_ids)
+			labels = self.sqlClient.getUserLabels(list(author_ids))
+		except Exception as e:
+			print(e)
+			known_posts, labels = set(), dict()
+
+		unseen_posts = len([post_id for post_id in post_ids if post_id not in known_posts and not self.checkpoint.isProcessed(post_id)])
+		new_authors = len([author_id for author_id in author_ids if author_id not in labels])
+		influencers = len([author_id for author_id in author_ids if labels.get(author_id) == 1])
+		return unseen_posts, new_authors, influencers
+
+	def stream_step(self, hashtag, getTopPosts, stepIndex, maxid = None):
 		"""
-		Définit une étape du stream.
+		Définit une étape du stream : on suit la pagination du hashtag tant que les pages rapportent des posts inédits.
 
 				Args:
 					hashtag (str) : le hashtag à streamer.
 					getTopPosts (bool) : prendre en compte les Top Posts uniquement ou non.
 					stepIndex (int) : le numéro de l'étape de stream.
+					maxid (str) : le curseur de pagination de la première page à streamer, par défaut celui enregistré pour le hashtag.
 				
 				Returns:
 					(none)
 		"""
 
-		### Récupération des top posts et des posts les plus récents liés au hashtag en question. ###
-		self.InstagramAPI.getHashtagFeed(hashtag)
-		feed = self.InstagramAPI.LastJson
+		maxid = self.checkpoint.getCursor(hashtag) if maxid is None else maxid
+		next_max_id = None
+		saturated = False
+		pages = 0
 		self.sqlClient.openCursor()
 
-		### Est-ce qu'on récupère les Top Posts Instagram ? ###
-		if getTopPosts:
-			topPostIter = tqdm(feed['ranked_items'])
-			topPostIter.set_description('Streaming #%s\'s top posts...' % hashtag)
-
-			### Processing des top posts. ###
-			for post in topPostIter:
-				self.process_post(post, topPost = True)
-				self.display_status()
+		while True:
+			### La page est enregistrée avant tout appel, pour pouvoir être reprise à l'identique. ###
+			self.checkpoint.beginStep(stepIndex, hashtag, getTopPosts, maxid)
+			self.saveCheckpoint()
+			api_calls_start = self.n_api_calls
+
+			### Récupération des top posts et des posts les plus récents liés au hashtag en question. ###
+			feed = self.callAPI('getHashtagFeed', hashtag, maxid)
+
+			### Les Top Posts ne sont que sur la première page. ###
+			top_posts = feed.get('ranked_items', list()) if getTopPosts and pages == 0 else list()
+			posts = feed.get('items', list())
+			unseen_posts, new_authors, influencers = self.measurePage(top_posts + posts)
+
+			### Est-ce qu'on récupère les Top Posts Instagram ? ###
+			if top_posts:
+				topPostIter = tqdm(top_posts)
+				topPostIter.set_description('Streaming #%s\'s top posts...' % hashtag)
+
+				### Processing des top posts. ###
+				for post in topPostIter:
+					self.process_post(post, topPost = True)
+					self.display_status()
+				sys.stdout.write("\033[K")
+
+			### On parcourt la réponse de l'API avec les posts pour récupérer les auteurs de chaque post. ###
+			postIter = tqdm(posts)
+			postIter.set_description('N°%s - Streaming #%s\'s recent posts (page %s)...' % (stepIndex, hashtag, str(pages + 1)))
+
+			for post in postIter:
+				self.process_post(post)
 			sys.stdout.write("\033[K")
 
-		### On parcourt la réponse de l'API avec les posts pour récupérer les auteurs de chaque post. ###
-		postIter = tqdm(feed['items'])
-		postIter.set_description('N°%s - Streaming #%s\'s recent posts...' % (stepIndex, hashtag))
+			### Rendement de la page, pour l'ordonnanceur. ###
+			pages += 1
+			self.scheduler.record(hashtag, self.n_api_calls - api_calls_start, len(top_posts) + len(posts), unseen_posts, new_authors, influencers)
+
+			### On s'arrête quand il n'y a plus de page, quand la page est saturée ou quand le budget de pages est consommé. ###
+			next_max_id = feed.get('next_max_id') if feed.get('more_available') else None
+			saturated = self.scheduler.isSaturated(len(top_posts) + len(posts), unseen_posts)
+			if not next_max_id or saturated or pages >= self.max_pages:
+				break
+			maxid = next_max_id
 
-		for post in postIter:
-			self.process_post(post)
 		self.sqlClient.closeCursor()
 
-		sys.stdout.write("\033[K")
+		### Étape terminée : si le hashtag n'est pas saturé, la prochaine visite reprendra à la page suivante. ###
+		self.checkpoint.endStep(hashtag, None if saturated else next_max_id)
+		self.saveCheckpoint()
+		for line in self.scheduler.report():
+			tqdm.write(line)
 
-	def start_stream(self):
+	def start_stream(self, max_steps = None):
 		"""
 		Démarre le stream.
 
 				Args:
-					(none)
+					max_steps (int) : le nombre d'étapes à streamer, par défaut sans fin.
 				
 				Returns:
 					(none)
 		"""
 
-		### Index de départ. ###
-		i = 0
+		### Index de départ, repris du checkpoint. ###
+		i = self.checkpoint.step
+		last_step = None if max_steps is None else i + max_steps
 
-		### On stream ad vitam eternam. ###
-		while True:
+		### Si une étape était en cours lors de l'arrêt, on la reprend sur le même hashtag et la même page. ###
+		if self.checkpoint.current:
+			current = self.checkpoint.current
+			print('Resuming step n°%s on #%s...' % (str(i), current['hashtag']), flush = True)
+			self.sqlClient.setHashtag(current['hashtag'])
+			self.stream_step(current['hashtag'], getTopPosts = current['top_posts'], stepIndex = i, maxid = current['max_id'])
+			gc.collect()
+			i += 1
+
+		### On stream ad vitam eternam, ou jusqu'à la dernière étape demandée. ###
+		while last_step is None or i < last_step:
 			print('Step n°%s...' % str(i), flush = True)
 			should_get_top_posts = False
 			if i % 10 == 0 and i != 0:
 				should_get_top_posts = True
-			### Selon le numéro de l'index, on va prendre des posts de hashtags sponsorisés, ou alors des hashtags populaires aléatoires. ###
-			if i % 4 < 2:
-				currentHashtag = self.hashtags_sponsor_related[i % 4]
-			else:
-				currentHashtag = self.hashtags_random[randint(0, len(self.hashtags_random) - 1)]
+			### L'ordonnanceur choisit, parmi les hashtags sponsorisés ou populaires selon l'étape, celui qui a le meilleur rendement attendu. ###
+			currentHashtag = self.scheduler.choose(i)
 			self.sqlClient.setHashtag(currentHashtag)
 			self.stream_step(currentHashtag, getTopPosts = should_get_top_posts, stepIndex = i)
 			gc.collect()
 			i += 1
-
-
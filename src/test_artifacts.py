@@ -0,0 +1,73 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+
+import sys
+import os
+from collections import Counter
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from artifacts import is_artifact, save_artifact, load_artifact, save_records, load_records
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def records():
+    return [
+        {'username': 'foo', 'followers': 100, 'avglikes': 10.5, 'is_verified': False, 'brandpresence': ['nike'], 'brandtypes': Counter(sport = 2)},
+        {'username': 'barbaz', 'followers': 5000, 'avglikes': 200, 'is_verified': True, 'brandpresence': [], 'brandtypes': Counter()}
+    ]
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_save_load(tmp_path):
+    path = str(tmp_path / 'model')
+    save_artifact(path, {'weights': np.arange(5, dtype = np.float32)}, 'test', {'alpha': 0.5})
+    arrays, metadata = load_artifact(path, 'test')
+    assert is_artifact(path)
+    assert isinstance(arrays['weights'], np.memmap) and list(arrays['weights']) == [0, 1, 2, 3, 4]
+    assert metadata == {'alpha': 0.5}
+    with pytest.raises(ValueError):
+        load_artifact(path, 'other')
+
+def test_overwrite(tmp_path):
+    path = str(tmp_path / 'model')
+    save_artifact(path, {'a': np.zeros(3)}, 'test')
+    save_artifact(path, {'b': np.ones(2)}, 'test')
+    arrays, _ = load_artifact(path, 'test', mmap = False)
+    assert list(arrays) == ['b']
+    assert sorted(os.listdir(str(tmp_path))) == ['model']
+
+def test_records(records, tmp_path):
+    path = str(tmp_path / 'users')
+    save_records(path, records, 'users')
+    loaded = load_records(path, 'users')
+    assert loaded == records
+    assert type(loaded[0]['followers']) is int and type(loaded[1]['avglikes']) is float
+    assert load_records(path, 'users')[1]['is_verified'] is True
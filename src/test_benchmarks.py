@@ -0,0 +1,43 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from benchmarks import bench_classification, compare
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_bench_classification():
+    result = bench_classification(20, seed = 0, n_train = 20, n_estimators = 5)
+    assert result['items'] == 20
+    assert result['rate'] > 0
+    assert result['unit'] == 'predictions/sec'
+
+def test_compare():
+    report = {'stages': {'images': {'rate': 20.0}, 'users': {'error': 'KeyError'}}}
+    baseline = {'stages': {'images': {'rate': 10.0}, 'users': {'rate': 5.0}}}
+    assert compare(report, baseline) == {'images': 2.0}
@@ -0,0 +1,82 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+
+import sys
+import os
+import random
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from biography import BiographyScorer, train
+
+WORDS = ['photo', 'travel', 'love', 'life', 'coffee', 'dog', 'cat', 'paris', 'family', 'music']
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def data():
+    rng = random.Random(0)
+    labels = [rng.randint(0, 1) for _ in range(600)]
+    bios = [' '.join(rng.sample(WORDS, 4) + (['blogger', 'collab', 'contact'] if label else [])) for label in labels]
+    return bios, labels
+
+@pytest.fixture
+def scorer(data):
+    bios, labels = data
+    return BiographyScorer(n_features = 2 ** 10).fit_stream(lambda: ((bios[i:i + 100], labels[i:i + 100]) for i in range(0, 500, 100)), seed = 0)
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_score(data, scorer):
+    bios, labels = data
+    scores = scorer.score(bios[500:])
+    assert scores.shape == (100,) and np.all((scores >= 0) & (scores <= 1))
+    assert np.mean((scores > 0.5) == np.array(labels[500:])) > 0.9
+    assert scorer.n_seen == 500
+
+def test_save_load_update(data, scorer, tmp_path):
+    bios, labels = data
+    scorer.save(str(tmp_path / 'biographies'))
+    loaded = BiographyScorer().load(str(tmp_path / 'biographies'))
+    assert np.allclose(loaded.score(bios), scorer.score(bios))
+    scorer.partial_fit(bios[500:], labels[500:])
+    loaded.partial_fit(bios[500:], labels[500:])
+    assert np.allclose(loaded.score(bios), scorer.score(bios), atol = 1e-5)
+
+def test_not_trained():
+    with pytest.raises(ValueError):
+        BiographyScorer().score(['hello'])
+
+def test_train_without_labels(tmp_path):
+    class EmptyClient(object):
+        def iterBiographies(self):
+            return iter([])
+    scorer = train(EmptyClient(), path = str(tmp_path / 'biographies'))
+    assert not scorer.trained()
+    assert not os.path.exists(str(tmp_path / 'biographies'))
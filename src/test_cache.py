@@ -0,0 +1,62 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from cache import AuthorCache
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def cache():
+    return AuthorCache(max_size = 2, ttls = {'user': 100, 'feed': 1000})
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_isFresh_unknown(cache):
+    assert not cache.isFresh('1', 'user')
+
+def test_isFresh_per_field(cache):
+    cache.touch('1', 'user', timestamp = 0)
+    cache.touch('1', 'feed', timestamp = 0)
+    assert not cache.isFresh('1', 'user', now = 500)
+    assert cache.isFresh('1', 'feed', now = 500)
+
+def test_lru_eviction(cache):
+    cache.touch('1', 'user')
+    cache.touch('2', 'user')
+    cache.isFresh('1', 'user')
+    cache.touch('3', 'user')
+    assert '1' in cache
+    assert '2' not in cache
+    assert len(cache) == 2
+
+def test_seed(cache):
+    cache.seed([(10, 0), (20, 950)])
+    assert cache.isFresh('20', 'feed', now = 1000)
+    assert not cache.isFresh('10', 'feed', now = 1000)
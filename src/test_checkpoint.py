@@ -0,0 +1,72 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from checkpoint import StreamCheckpoint
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('checkpoint.json'))
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_load_missing(path):
+    assert not StreamCheckpoint(path).load()
+
+def test_resume_current_step(path):
+    checkpoint = StreamCheckpoint(path)
+    checkpoint.beginStep(3, 'ad', False, 'QVFD')
+    checkpoint.markProcessed('1_2')
+    checkpoint.counters = {'n_posts': 19}
+    checkpoint.save()
+
+    resumed = StreamCheckpoint(path)
+    assert resumed.load()
+    assert resumed.step == 3
+    assert resumed.current == {'hashtag': 'ad', 'top_posts': False, 'max_id': 'QVFD'}
+    assert resumed.isProcessed('1_2')
+    assert resumed.counters['n_posts'] == 19
+
+def test_endStep(path):
+    checkpoint = StreamCheckpoint(path)
+    checkpoint.beginStep(0, 'ad', False)
+    checkpoint.endStep('ad', 'QVFD')
+    assert checkpoint.current is None
+    assert checkpoint.step == 1
+    assert checkpoint.getCursor('ad') == 'QVFD'
+    assert checkpoint.getCursor('sponsored') == ''
+
+def test_markProcessed_bounded(path):
+    checkpoint = StreamCheckpoint(path, max_processed = 2)
+    for post_id in ['1', '2', '3']:
+        checkpoint.markProcessed(post_id)
+    assert not checkpoint.isProcessed('1')
+    assert checkpoint.isProcessed('3')
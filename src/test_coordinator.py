@@ -0,0 +1,71 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from coordinator import Coordinator, partition
+from utils import get_random_hashtags, get_sponsor_hashtags
+
+def crashing_worker(account, hashtags, statusQueue, stub):
+    """
+    Worker qui publie ses compteurs puis plante aussitôt.
+    """
+    statusQueue.put((account, {'n_posts': len(hashtags[1])}))
+    raise SystemExit(1)
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def coordinator():
+    return Coordinator(accounts = ['Instagram', 'Instagram.2', 'Instagram.3'], target = crashing_worker, restart_delay = 0.05)
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_partition():
+    parts = partition(get_random_hashtags(), 3)
+    flattened = [hashtag for part in parts for hashtag in part]
+    assert len(flattened) == len(set(flattened))
+    assert set(flattened) == set(get_random_hashtags())
+
+def test_partition_stable():
+    assert partition(['ad', 'sponsored', 'love'], 2) == partition(['ad', 'sponsored', 'love'], 2)
+
+@pytest.mark.parametrize('n_accounts', [1, 2, 5])
+def test_hashtags_disjoint(n_accounts):
+    accounts = ['Instagram.%d' % index for index in range(n_accounts)]
+    coordinator = Coordinator(accounts = accounts, target = crashing_worker)
+    hashtags = [hashtag for account in accounts for part in coordinator.hashtags[account] for hashtag in part]
+    assert len(hashtags) == len(set(hashtags))
+    assert set(get_sponsor_hashtags()) <= set(hashtags)
+    sponsor_counts = [len(coordinator.hashtags[account][0]) for account in accounts]
+    assert max(sponsor_counts) - min(sponsor_counts) <= 1
+
+def test_run_restarts_and_aggregates(coordinator):
+    status = coordinator.run(status_period = 60, duration = 2)
+    assert all(restarts > 0 for restarts in coordinator.restarts.values())
+    assert status['n_posts'] == len(set(get_random_hashtags()))
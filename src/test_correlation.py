@@ -0,0 +1,78 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+
+import sys
+import os
+import json
+
+import numpy as np
+import pytest
+from scipy.stats import spearmanr
+
+sys.path.append(os.path.dirname(__file__))
+
+from correlation import pearson_matrix, spearman_matrix, correlation_report, write_report
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def matrix():
+    rng = np.random.RandomState(0)
+    x = rng.normal(size = 50)
+    return np.column_stack([x, 2 * x + rng.normal(size = 50), np.exp(x), rng.normal(size = 50)])
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_matches_numpy_and_scipy(matrix):
+    assert np.allclose(pearson_matrix(matrix), np.corrcoef(matrix, rowvar = False))
+    assert np.allclose(spearman_matrix(matrix), spearmanr(matrix).correlation)
+
+def test_nan_and_constant(matrix):
+    matrix[3, 0] = np.nan
+    matrix = np.column_stack([matrix, np.full(50, 7.0)])
+    pearson = pearson_matrix(matrix)
+    known = np.arange(50) != 3
+    assert np.isclose(pearson[0, 1], np.corrcoef(matrix[known, 0], matrix[known, 1])[0, 1])
+    assert np.isclose(pearson[1, 2], np.corrcoef(matrix[:, 1], matrix[:, 2])[0, 1])
+    assert np.all(np.isnan(pearson[4]))
+
+def test_report(matrix, tmp_path):
+    matrix = np.column_stack([matrix, np.zeros(50)])
+    matrix[0, 3] = np.nan
+    labels = (matrix[:, 0] > 0).astype(int)
+    report = correlation_report(matrix, ['a', 'b', 'c', 'd', 'e'], labels)
+    assert report['constant'] == ['e']
+    assert report['missing'] == {'d': 1}
+    assert report['pearson'][4][0] is None
+    assert report['label']['spearman']['a'] > 0.8
+    write_report(report, str(tmp_path / 'correlation.json'))
+    assert json.load(open(str(tmp_path / 'correlation.json')))['features'] == ['a', 'b', 'c', 'd', 'e']
+
+def test_large_offset(matrix):
+    shifted = np.column_stack([matrix[:, 0] + 1e8, matrix[:, 1]])
+    assert np.allclose(pearson_matrix(shifted), np.corrcoef(matrix[:, :2], rowvar = False))
+    shifted = (matrix[:, :2] + 1e5).astype(np.float32)
+    assert np.allclose(np.diag(pearson_matrix(shifted)), 1, rtol = 0, atol = 1e-12)
@@ -0,0 +1,105 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+import time
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+import pytest
+import requests
+
+sys.path.append(os.path.dirname(__file__))
+
+from downloader import ImageDownloader
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Faux CDN : `/small` renvoie une petite image, `/big` une image trop lourde, `/slow` un transfert qui traîne.
+    """
+
+    def do_GET(self):
+        if self.path == '/small':
+            body = b'\x89PNG' + b'0' * 1000
+        elif self.path == '/big':
+            body = b'0' * 4096
+        elif self.path == '/slow':
+            self.send_response(200)
+            self.end_headers()
+            for _ in range(20):
+                self.wfile.write(b'0')
+                self.wfile.flush()
+                time.sleep(0.1)
+            return
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def server():
+    httpd = ThreadingServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target = httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:%s' % str(httpd.server_port)
+    httpd.shutdown()
+
+@pytest.fixture
+def downloader():
+    _downloader = ImageDownloader(max_bytes = 2048, deadline = 0.5, retries = 0)
+    yield _downloader
+    _downloader.close()
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_download(downloader, server):
+    result = downloader.download(server + '/small')
+    assert type(result) is bytes
+    assert len(result) == 1004
+
+def test_download_too_large(downloader, server):
+    with pytest.raises(ValueError):
+        downloader.download(server + '/big')
+
+def test_download_stalled(downloader, server):
+    with pytest.raises(requests.Timeout):
+        downloader.download(server + '/slow')
+
+def test_downloadAll(downloader, server):
+    result = downloader.downloadAll([server + '/small', server + '/big', server + '/missing', server + '/small'])
+    assert list(result.keys()) == [server + '/small']
@@ -0,0 +1,73 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import sys
+import os
+import io
+
+import pytest
+from PIL import Image
+
+sys.path.append(os.path.dirname(__file__))
+
+from fake_api import FixtureArchive, StubInstagramAPI, RecordingInstagramAPI, ReplayInstagramAPI, FakeImageDownloader, archive_key
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def archive(tmpdir):
+    return FixtureArchive(str(tmpdir))
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_archive_key():
+    assert archive_key('getUserFeed', (42,)) == archive_key('getUserFeed', ('42', '', None))
+
+def test_record_replay(archive):
+    recorder = RecordingInstagramAPI(StubInstagramAPI(seed = 1), archive)
+    recorder.getHashtagFeed('ad')
+    recorded = recorder.LastJson
+    archive.putImage('http://cdn/1.jpg', b'image')
+    archive.save()
+
+    replayed = FixtureArchive(archive.path)
+    assert replayed.load()
+    api = ReplayInstagramAPI(replayed, synthetic = False)
+    assert api.getHashtagFeed('ad', '')
+    assert api.LastJson == recorded
+    assert not api.getHashtagFeed('love')
+    assert replayed.getImage('http://cdn/1.jpg') == b'image'
+
+def test_replay_errors():
+    api = ReplayInstagramAPI(error_rate = 1)
+    assert not api.getMediaLikers('1')
+    assert api.LastJson['status'] == 'fail'
+    assert api.n_errors == 1
+
+def test_fake_downloader():
+    downloader = FakeImageDownloader()
+    images = downloader.downloadAll(['http://cdn/1.jpg', 'http://cdn/2.jpg'])
+    downloader.close()
+    assert len(images) == 2
+    assert Image.open(io.BytesIO(images['http://cdn/1.jpg'])).size == (150, 150)
@@ -0,0 +1,73 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+import sys
+import os
+
+import numpy as np
+import pytest
+from sklearn.feature_extraction import DictVectorizer
+
+sys.path.append(os.path.dirname(__file__))
+
+from features import FeatureMatrixBuilder
+
+KEY_FEATURES = ['avglikes', 'followers', 'is_verified', 'category']
+
+def make_user(avglikes, followers, is_verified, category, testset, label):
+    return {'avglikes': avglikes, 'followers': followers, 'is_verified': is_verified, 'category': category, 'testset': testset, 'label': label, 'username': 'foo'}
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def users():
+    return [
+        make_user(10.5, 100, False, 'Artist', False, 0),
+        make_user(200.0, 5000, True, 'Public figure', True, 1),
+        make_user(0, 0, False, 'None', False, 0),
+        make_user(42.0, 1200, True, 'Artist', True, 1)
+    ]
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_matches_dictvectorizer(users):
+    builder = FeatureMatrixBuilder(KEY_FEATURES)
+    matrix = builder.fit_transform(users)
+    dictvec = DictVectorizer().fit([{key: user[key] for key in KEY_FEATURES} for user in users])
+    assert builder.get_feature_names() == list(dictvec.feature_names_)
+    assert matrix.dtype == np.float32
+    assert np.allclose(matrix, dictvec.transform(users).toarray())
+
+def test_unknown_category(users):
+    builder = FeatureMatrixBuilder(KEY_FEATURES).fit(users)
+    matrix = builder.transform([make_user(None, 10, True, 'Unknown', False, 0)])
+    assert matrix.shape == (1, len(builder.get_feature_names()))
+    assert matrix.sum() == 11
+
+def test_split(users):
+    builder = FeatureMatrixBuilder(KEY_FEATURES)
+    train, test, labels_train, labels_test = builder.split(builder.fit_transform(users), users)
+    assert train.shape[0] == 2 and test.shape[0] == 2
+    assert list(labels_train) == [0, 0] and list(labels_test) == [1, 1]
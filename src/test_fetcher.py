@@ -0,0 +1,133 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+import json
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+import pytest
+import requests
+
+sys.path.append(os.path.dirname(__file__))
+
+from fetcher import AsyncFetcher
+from downloader import ImageDownloader
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Fausse API : `/media/<id>/comments/` renvoie deux commentaires, `/flaky` une erreur 503 avant de répondre, `/down` toujours une erreur 503.
+    """
+
+    def do_GET(self):
+        self.server.hits[self.path] = self.server.hits.get(self.path, 0) + 1
+        if self.path.startswith('/media/'):
+            body = json.dumps({'comments': [{'text': 'love it'}, {'text': 'so beautiful'}]}).encode('utf8')
+        elif self.path == '/image':
+            body = b'\x89PNG' + b'0' * 100
+        elif self.path == '/flaky' and self.server.hits[self.path] > 1:
+            body = b'ok'
+        elif self.path in ['/flaky', '/down']:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        else:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+class StubApi(object):
+    """
+    Fausse `InstagramAPI`, dont seule l'adresse de l'API est reprise.
+    """
+
+    def __init__(self, api_url):
+        super().__init__()
+        self.API_URL = api_url
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def server():
+    httpd = ThreadingServer(('127.0.0.1', 0), StubHandler)
+    httpd.hits = dict()
+    thread = threading.Thread(target = httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+
+@pytest.fixture
+def fetcher(server):
+    _fetcher = AsyncFetcher(api = StubApi('http://127.0.0.1:%s/' % str(server.server_port)), concurrency = 2, timeout = 2, retries = 2, backoff = 0.01)
+    yield _fetcher
+    _fetcher.close()
+
+def url(server, path):
+    return 'http://127.0.0.1:%s%s' % (str(server.server_port), path)
+
+def post(server, media_id, path):
+    return {'id': media_id, 'media_type': 1, 'image_versions2': {'candidates': [dict(), {'url': url(server, path)}]}}
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_get(fetcher, server):
+    response = fetcher.get(url(server, '/image'))
+    assert response.status_code == 200
+    assert server.hits['/image'] == 1
+
+def test_get_retry(fetcher, server):
+    response = fetcher.get(url(server, '/flaky'))
+    assert response.content == b'ok'
+    assert server.hits['/flaky'] == 2
+
+def test_get_retries_exhausted(fetcher, server):
+    with pytest.raises(requests.HTTPError):
+        fetcher.get(url(server, '/down'))
+    assert server.hits['/down'] == 3
+
+def test_fetchFeed(fetcher, server):
+    images, comments = fetcher.fetchFeed([post(server, '1', '/image'), post(server, '2', '/missing')])
+    assert images[0] == b'\x89PNG' + b'0' * 100 and images[1] is None
+    assert comments == [['love it', 'so beautiful'], ['love it', 'so beautiful']]
+
+def test_close_keeps_shared_downloader(server):
+    downloader = ImageDownloader(retries = 0)
+    fetcher = AsyncFetcher(downloader = downloader)
+    fetcher.close()
+    assert downloader.downloadAll([url(server, '/image')]) == {url(server, '/image'): b'\x89PNG' + b'0' * 100}
+    downloader.close()
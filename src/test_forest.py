@@ -0,0 +1,73 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+
+import sys
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.append(os.path.dirname(__file__))
+
+from forest import CompactForest
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    matrix = rng.lognormal(0, 2, (300, 6)).astype(np.float32)
+    labels = (matrix[:, 0] + rng.normal(size = 300) > 1).astype(int)
+    return matrix, labels
+
+@pytest.fixture
+def forest(data):
+    return RandomForestClassifier(n_estimators = 20, random_state = 0).fit(*data)
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_matches_forest(data, forest):
+    matrix, _ = data
+    compact = CompactForest().compact(forest)
+    assert np.array_equal(compact.apply(matrix) - compact.roots, forest.apply(matrix))
+    assert np.allclose(compact.predict_proba(matrix, batch_size = 64), forest.predict_proba(matrix), atol = 1e-6)
+    assert np.array_equal(compact.predict(matrix), forest.predict(matrix))
+
+def test_save_load(data, forest, tmp_path):
+    matrix, _ = data
+    path = str(tmp_path / 'classifier')
+    CompactForest().compact(forest).save(path)
+    compact = CompactForest().load(path)
+    assert compact.threshold.dtype == np.float32
+    assert np.allclose(compact.predict_proba(matrix), forest.predict_proba(matrix), atol = 1e-6)
+
+def test_max_depth(data, forest):
+    matrix, _ = data
+    compact = CompactForest().compact(forest, max_depth = 2)
+    assert compact.depth == 2
+    assert np.allclose(compact.predict_proba(matrix).sum(axis = 1), 1)
+    assert (compact.predict(matrix) == forest.predict(matrix)).mean() > 0.8
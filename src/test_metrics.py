@@ -0,0 +1,72 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import sys
+import os
+import json
+
+import pytest
+import requests
+
+sys.path.append(os.path.dirname(__file__))
+
+from metrics import Metrics, Histogram
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def metrics():
+    _metrics = Metrics(labels = {'account': 'Instagram'})
+    for seconds in [0.02, 0.03, 0.04, 3]:
+        _metrics.observe('api.getMediaLikers', seconds)
+    _metrics.inc('posts', 19)
+    _metrics.error('getMediaLikers')
+    yield _metrics
+    _metrics.close()
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_histogram_quantile():
+    histogram = Histogram([1, 2, 3])
+    for value in [0.5, 0.5, 1.5, 2.5]:
+        histogram.observe(value)
+    assert histogram.quantile(0.5) == 1.0
+    assert 2 < histogram.quantile(0.95) <= 3
+
+def test_snapshot(metrics):
+    snapshot = metrics.snapshot()
+    assert snapshot['counters'] == {'posts': 19}
+    assert snapshot['errors'] == {'getMediaLikers': 1}
+    assert snapshot['stages']['api.getMediaLikers']['count'] == 4
+
+def test_prometheus(metrics):
+    text = metrics.toPrometheus()
+    assert 'instaseek_posts_total{account="Instagram"} 19' in text
+    assert 'instaseek_errors_total{account="Instagram",endpoint="getMediaLikers"} 1' in text
+    assert 'instaseek_stage_seconds_bucket{account="Instagram",le="+Inf",stage="api.getMediaLikers"} 4' in text
+
+def test_serve(metrics):
+    port = metrics.serve(0)
+    response = requests.get('http://127.0.0.1:%s/metrics.json' % port, timeout = 5)
+    assert json.loads(response.text)['counters']['posts'] == 19
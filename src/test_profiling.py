@@ -0,0 +1,72 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import sys
+import os
+import json
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from profiling import Profiler
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def profiler(tmpdir):
+    _profiler = Profiler()
+    _profiler.enable(str(tmpdir))
+    yield _profiler
+    _profiler.disable()
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_disabled():
+    profiler = Profiler()
+    function = profiler.section('square')(lambda x: x * x)
+    assert function(3) == 9
+    assert profiler.functions == dict()
+
+def test_sections(profiler):
+    square = profiler.section('square')(lambda x: [x] * 1000)
+
+    @profiler.section('analyze', scope = lambda username: username)
+    def analyze(username):
+        profiler.tag(users = 1, posts = 2)
+        square(1)
+        square(2)
+
+    analyze('foo')
+    report = profiler.report()
+    assert report['counts'] == {'users': 1, 'posts': 2}
+    assert report['functions']['square']['calls'] == 2
+    assert report['functions']['square']['wall_per_post'] is not None
+    assert set(report['profiles']['foo']['functions'].keys()) == {'square', 'analyze'}
+    assert report['profiles']['foo']['counts'] == {'users': 1, 'posts': 2}
+
+def test_dump(profiler):
+    path = profiler.dump()
+    with open(path) as f:
+        assert 'functions' in json.load(f)
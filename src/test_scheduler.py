@@ -0,0 +1,58 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from scheduler import HashtagScheduler
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def scheduler():
+    return HashtagScheduler(['ad', 'sponsored'], ['love', 'food', 'love', 'ad'], exploration = 0.1)
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_dedup_hashtags(scheduler):
+    assert scheduler.random_hashtags == ['love', 'food']
+
+def test_choose_sponsor_share(scheduler):
+    assert scheduler.choose(0) in ['ad', 'sponsored']
+    assert scheduler.choose(1) in ['ad', 'sponsored']
+    assert scheduler.choose(2) in ['love', 'food']
+
+def test_choose_most_productive(scheduler):
+    for _ in range(5):
+        scheduler.record('love', api_calls = 40, posts = 10, unseen_posts = 0, new_authors = 0, influencers = 0)
+        scheduler.record('food', api_calls = 40, posts = 10, unseen_posts = 10, new_authors = 10, influencers = 1)
+    assert scheduler.choose(2) == 'food'
+
+def test_isSaturated(scheduler):
+    assert scheduler.isSaturated(10, 1)
+    assert not scheduler.isSaturated(10, 5)
+    assert scheduler.isSaturated(0, 0)
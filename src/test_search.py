@@ -0,0 +1,66 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+
+import sys
+import os
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+import search
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def data():
+    rng = np.random.RandomState(0)
+    features = rng.lognormal(0, 1, (270, 4)).astype(np.float32)
+    labels = (np.log(features[:, 0]) + 0.5 * rng.normal(size = 270) > 0).astype(int)
+    return features, labels
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_cache(data, tmp_path):
+    search.save_matrix(*data, directory = str(tmp_path))
+    features, labels = search.load_matrix(str(tmp_path))
+    assert isinstance(features, np.memmap)
+    assert np.array_equal(features, data[0]) and np.array_equal(labels, data[1])
+
+def test_candidates():
+    assert len(search.candidates(['gaussian_nb'])) == 3
+    assert len(search.candidates(['random_forest'], n_iter = 4, seed = 0)) == 4
+
+def test_search(data, tmp_path):
+    search.save_matrix(*data, directory = str(tmp_path))
+    features, labels = search.load_matrix(str(tmp_path))
+    leaderboard = search.search(features, labels, models = ['logistic_regression', 'gaussian_nb'], min_samples = 30, cv = 3, n_jobs = 1, seed = 0)
+    assert len(leaderboard) == 7
+    assert [result['round'] for result in leaderboard] == [1, 1, 1, 0, 0, 0, 0]
+    assert leaderboard[0]['samples'] == 270 and leaderboard[-1]['samples'] == 90
+    assert leaderboard[0]['score'] > 0.7
+    search.write_leaderboard(leaderboard, str(tmp_path / 'leaderboard.json'))
@@ -0,0 +1,72 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from sql_client import SqlClient
+
+IMAGES = [('http://cdn/1.jpg', '1_10'), ('http://cdn/2.jpg', '2_10')]
+
+class FakeCursor(object):
+    """
+    Curseur en mémoire sur une table `images` réduite à (url, post_id), qui applique le filtre de `getKnownImages`.
+    """
+
+    def __init__(self, images):
+        super().__init__()
+        self.images = images
+        self.queries = list()
+
+    def execute(self, query, params = None):
+        self.queries.append((query, params))
+        urls, post_ids = params
+        self.rows = [(url, post_id) for url, post_id in self.images if url in urls or post_id in post_ids]
+
+    def fetchall(self):
+        return self.rows
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def client():
+    _client = SqlClient.__new__(SqlClient)
+    _client.cursor = FakeCursor(IMAGES)
+    return _client
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_getKnownImages_by_url(client):
+    assert client.getKnownImages(['http://cdn/1.jpg', 'http://cdn/3.jpg'], ['1_99', '3_10']) == ({'http://cdn/1.jpg'}, {'1_10'})
+    assert len(client.cursor.queries) == 1
+
+def test_getKnownImages_by_post_id(client):
+    assert client.getKnownImages(['http://cdn/2.jpg?signed=new'], ['2_10']) == ({'http://cdn/2.jpg'}, {'2_10'})
+
+def test_getKnownImages_empty(client):
+    assert client.getKnownImages([], []) == (set(), set())
+    assert client.cursor.queries == list()
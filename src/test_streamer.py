@@ -0,0 +1,76 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import sys
+import os
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+### L'import du streamer télécharge ffmpeg (imageio) : sans réseau, les tests sont sautés. ###
+try:
+    from streamer import Streamer
+except OSError as e:
+    pytest.skip('streamer cannot be imported (%s)' % str(e), allow_module_level = True)
+
+class FakeClient(object):
+    """
+    Client SQL en mémoire, dont la table `images` est réduite à (url, post_id).
+    """
+
+    def __init__(self, images):
+        super().__init__()
+        self.images = images
+        self.calls = 0
+
+    def getKnownImages(self, urls, post_ids):
+        self.calls += 1
+        urls, post_ids = set(urls), set(post_ids)
+        known = [(url, post_id) for url, post_id in self.images if url in urls or post_id in post_ids]
+        return set(url for url, _ in known), set(post_id for _, post_id in known)
+
+def make_post(post_id, url):
+    return {'id': post_id, 'media_type': 1, 'image_versions2': {'candidates': [dict(), {'url': url}]}}
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def streamer():
+    _streamer = Streamer.__new__(Streamer)
+    _streamer.sqlClient = FakeClient([('http://cdn/1.jpg', '1_10'), ('http://cdn/2.jpg', '2_10')])
+    return _streamer
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_filterKnownImages_by_url(streamer):
+    posts = [make_post('1_99', 'http://cdn/1.jpg'), make_post('3_10', 'http://cdn/3.jpg')]
+    assert streamer.filterKnownImages(posts) == [posts[1]]
+    assert streamer.sqlClient.calls == 1
+
+def test_filterKnownImages_by_post_id(streamer):
+    posts = [make_post('2_10', 'http://cdn/2.jpg?signed=new'), make_post('4_10', 'http://cdn/4.jpg')]
+    assert streamer.filterKnownImages(posts) == [posts[1]]
+
+def test_filterKnownImages_empty(streamer):
+    assert streamer.filterKnownImages(list()) == list()
@@ -0,0 +1,68 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+
+
+import sys
+import os
+from collections import Counter
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from vocabulary import CompactVocabulary, counter_nbytes
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def counter():
+    return Counter({'love': 27.5, 'it': 27.5, 'beautiful': 19.0, '😍': 19.0, 'été': 0.25, '#paris': 0.5})
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_lookup(counter):
+    vocabulary = CompactVocabulary().build(counter)
+    assert len(vocabulary) == 6
+    assert vocabulary.tokens() == sorted(counter)
+    for token, weight in counter.items():
+        assert vocabulary[token] == pytest.approx(weight)
+    assert vocabulary['unknown'] == 0 and 'unknown' not in vocabulary
+
+def test_prune(counter):
+    vocabulary = CompactVocabulary().build(counter, min_weight = 1)
+    assert vocabulary.pruned == 2
+    assert vocabulary['été'] == 1 and vocabulary['#paris'] == 1 and vocabulary['love'] == pytest.approx(27.5)
+    assert vocabulary['unknown'] == 0
+
+def test_prune_save_load(counter, tmp_path):
+    CompactVocabulary().build(counter, min_weight = 1).save(str(tmp_path / 'comments'))
+    vocabulary = CompactVocabulary().load(str(tmp_path / 'comments'))
+    assert vocabulary.min_weight == 1 and vocabulary['été'] == 1 and vocabulary['unknown'] == 0
+
+def test_save_load(counter, tmp_path):
+    CompactVocabulary().build(counter).save(str(tmp_path / 'comments'))
+    vocabulary = CompactVocabulary().load(str(tmp_path / 'comments'))
+    assert vocabulary['😍'] == pytest.approx(19.0)
+    assert vocabulary.nbytes() < counter_nbytes(counter)
@@ -0,0 +1,128 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import sys
+import os
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(__file__))
+
+from writer import WriteBehindWriter, encode_unit, decode_unit
+
+class FakeClient(object):
+    """
+    Client SQL en mémoire, qui échoue tant que la base est marquée indisponible.
+    """
+    database = list()
+    available = True
+
+    def openCursor(self):
+        if not FakeClient.available:
+            raise ConnectionError('database is down')
+
+    def insertUnits(self, units):
+        if not FakeClient.available:
+            raise ConnectionError('database is down')
+        if any(unit.get('poison') for unit in units):
+            raise ValueError('schema error')
+        FakeClient.database.append([unit['post']['id'] for unit in units if not unit.get('invalid')])
+        return [unit for unit in units if unit.get('invalid')]
+
+    def isClosed(self):
+        return not FakeClient.available
+
+    def close(self):
+        pass
+
+def make_unit(post_id, invalid = False, poison = False):
+    return {'hashtag': 'ad', 'post': {'id': post_id}, 'images': {'http://cdn/%s.jpg' % post_id: b'\x00\xff'}, 'invalid': invalid, 'poison': poison}
+
+##############################
+## _______ FIXTURES _______ ##
+##############################
+
+@pytest.fixture
+def writer(tmpdir):
+    FakeClient.database, FakeClient.available = list(), True
+    _writer = WriteBehindWriter(FakeClient, batch_size = 3, flush_interval = 0.2, spill_path = str(tmpdir.join('spill.jsonl')), retry_delay = 0)
+    yield _writer
+    _writer.close()
+
+#####################################
+## _______ TESTS UNITAIRES _______ ##
+#####################################
+
+def test_encode_unit():
+    assert decode_unit(encode_unit(make_unit('1'))) == make_unit('1')
+
+def test_batches(writer):
+    for post_id in range(7):
+        writer.put(make_unit(str(post_id)))
+    writer.flush()
+    assert sorted(post_id for batch in FakeClient.database for post_id in batch) == [str(post_id) for post_id in range(7)]
+    assert max(len(batch) for batch in FakeClient.database) == 3
+    assert sorted(writer.drainDurable()) == [str(post_id) for post_id in range(7)]
+    assert not writer.isPending('1')
+
+def test_spill_and_replay(writer):
+    FakeClient.available = False
+    writer.put(make_unit('1'))
+    writer.put(make_unit('2'))
+    writer.flush()
+    assert FakeClient.database == list()
+    assert os.path.isfile(writer.spill_path)
+    assert sorted(writer.drainDurable()) == ['1', '2']
+
+    ### Le thread d'écriture rejoue le journal de lui-même dès que la base répond. ###
+    FakeClient.available = True
+    deadline = time.time() + 5
+    while (not FakeClient.database or os.path.isfile(writer.spill_path + '.replaying')) and time.time() < deadline:
+        time.sleep(0.1)
+    assert sorted(post_id for batch in FakeClient.database for post_id in batch) == ['1', '2']
+    assert not os.path.isfile(writer.spill_path)
+
+def test_rejected(writer):
+    writer.put(make_unit('1'))
+    writer.put(make_unit('2', invalid = True))
+    writer.flush()
+    assert FakeClient.database == [['1']]
+    with open(writer.spill_path + '.rejected', 'r', encoding = 'utf8') as f:
+        assert [decode_unit(line)['post']['id'] for line in f] == ['2']
+    assert not os.path.isfile(writer.spill_path)
+    assert sorted(writer.drainDurable()) == ['1', '2']
+
+def test_poison_batch(writer):
+    writer.put(make_unit('1'))
+    writer.put(make_unit('2', poison = True))
+    writer.flush()
+    assert FakeClient.database == list()
+
+    ### Le lot rejoué échoue de façon répétée : ses unités saines sont écrites une à une, l'unité fautive est mise de côté. ###
+    deadline = time.time() + 10
+    while not os.path.isfile(writer.spill_path + '.rejected') and time.time() < deadline:
+        time.sleep(0.1)
+    while os.path.isfile(writer.spill_path + '.replaying') and time.time() < deadline:
+        time.sleep(0.1)
+    assert FakeClient.database == [['1']]
+    with open(writer.spill_path + '.rejected', 'r', encoding = 'utf8') as f:
+        assert [decode_unit(line)['post']['id'] for line in f] == ['2']
+    assert not os.path.isfile(writer.spill_path)
@@ -21,17 +21,16 @@ along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
 import sys
 import os
 import pickle
+import shutil
 import random
 import argparse
-import math
-import operator
-from itertools import chain
-from statistics import mean
+import time
+import json
 
 ### Installed libs. ###
 import pprint
+import numpy as np
 import pandas as pd
-from sklearn.feature_extraction import DictVectorizer
 from sklearn.svm import SVC
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestClassifier
@@ -39,7 +38,6 @@ from sklearn.naive_bayes import GaussianNB
 from sklearn.metrics import confusion_matrix, classification_report, roc_curve, auc
 from sklearn.utils import shuffle
 from sklearn.model_selection import cross_val_score
-import matplotlib.pyplot as plt
 from tqdm import tqdm
 
 sys.path.append(os.path.dirname(__file__))
@@ -47,16 +45,34 @@ sys.path.append(os.path.dirname(__file__))
 ### Custom libs. ###
 from user import User
 from sql_client import SqlClient
+from features import FeatureMatrixBuilder
+from correlation import correlation_report, write_report
+from forest import CompactForest
+from artifacts import is_artifact, save_records, load_records
+from profiling import profiled, enable as enable_profiling
 
 ### Setup du PrettyPrinter, ainsi que des chemin d'accès aux fichiers. ###
 pp = pprint.PrettyPrinter(indent = 2)
 
 model_path = os.path.join(os.path.dirname(__file__), './models/classifier.model')
+compact_model_path = os.path.join(os.path.dirname(__file__), './models/classifier')
 users_model_path = os.path.join(os.path.dirname(__file__), './models/users_sample.model')
+users_artifact_path = os.path.join(os.path.dirname(__file__), './models/users_sample')
 labels_model_path = os.path.join(os.path.dirname(__file__), './models/labels.model')
-dictvec_model_path = os.path.join(os.path.dirname(__file__), './models/dictvec.model')
+features_model_path = os.path.join(os.path.dirname(__file__), './models/features.model')
+correlation_report_path = os.path.join(os.path.dirname(__file__), './models/correlation.json')
+reports_dir = os.path.join(os.path.dirname(__file__), './models/reports')
 ig_url = 'http://www.instagram.com/'
 
+### Paramètres de la forêt et de la validation croisée : tous les cœurs (n_jobs = -1), et l'écart maximal toléré entre les scores du modèle compact et du modèle complet. ###
+N_ESTIMATORS = 500
+N_JOBS = -1
+CV_FOLDS = 5
+COMPACT_TOLERANCE = 1e-4
+
+### Nombre de nouveaux utilisateurs entre deux sauvegardes du modèle d'utilisateurs. ###
+SAVE_EVERY = 50
+
 class Trainer(object):
 	"""
 	Classe d'entraînement du modèle de détection des influenceurs.
@@ -92,6 +108,7 @@ class Trainer(object):
 		self.labels_test = list()
 		self.users_array = list()
 
+	@profiled('Trainer.buildUsersModel')
 	def buildUsersModel(self):
 		"""
 		Construit la liste des utilisateurs utile pour l'entrainement, avec les features correspondantes.
@@ -115,21 +132,25 @@ class Trainer(object):
 		users_array = [user['user_name'] for user in users]
 
 		### Si le modèle d'utilisateurs existe déjà, on l'ouvre. ###
-		if os.path.isfile(users_model_path):
-			with open(users_model_path, 'rb') as f:
-				self.users_array = pickle.load(f)
+		self.users_array = self.loadUsersModel()
+		known_users = set(user['username'] for user in self.users_array)
+
+		### Les features numériques de tous les utilisateurs annotés sont calculées en BDD, en une requête. ###
+		self.sqlClient.openCursor()
+		numeric_features = {features['user_name']: features for features in self.sqlClient.getUserFeatures()}
+		self.sqlClient.closeCursor()
 
 		### On parcourt le tableau des utilisateurs pour leur assigner les features. ###
 		for user in tqdm(users):
 
 			### Si l'utilisateur se trouve déjà dans le teableau, on n'a pas à réeffectuer le traitement. ###
-			if user['user_name'] in [_user['username'] for _user in self.users_array]:
+			if user['user_name'] in known_users:
 				continue
 
 			self.user_model.username = user['user_name']
 
 			### Récupère les features via la classe User. ###
-			self.user_model.getUserInfoSQL()
+			self.user_model.getUserInfoSQL(features = numeric_features.get(user['user_name']))
 			item = {
 				'avglikes': self.user_model.avglikes,
 				'avgcomments': self.user_model.avgcomments,
@@ -154,38 +175,27 @@ class Trainer(object):
 				'testset': self.user_model.testset,
 			}
 			self.users_array.append(item)
+			known_users.add(item['username'])
 
-			### Sauvegarde du modèle d'utilisateurs. ###
-			with open(users_model_path, 'wb') as f:
-				pickle.dump(self.users_array, f)
-
-		self.users_array = [user for user in self.users_array if user['username'] in users_array]
-
-		features_dict = [{key: user[key] for key in self.key_features} for user in self.users_array]
-
-		### Assignation de la liste des features en tant que liste, et les labels correspondants. ###
-		self.dictvec = DictVectorizer()
-		self.dictvec.fit(features_dict)
+			### Sauvegarde régulière du modèle d'utilisateurs, pour reprendre là où on en était en cas d'arrêt. ###
+			if len(self.users_array) % SAVE_EVERY == 0:
+				self.saveUsersModel(self.users_array)
 
-		### Sauvegarde le modèle du vectorisateur de dico. ###
-		with open(dictvec_model_path, 'wb') as f:
-			pickle.dump(self.dictvec, f)
+		self.saveUsersModel(self.users_array)
 
-		self.correlationAnalysis()
+		self.users_array = [user for user in self.users_array if user['username'] in users_array]
 
-		for user in self.users_array:
+		### Le schéma des colonnes est fixé sur les utilisateurs, puis la matrice des features est assemblée en une passe. ###
+		self.builder = FeatureMatrixBuilder(self.key_features)
+		features_matrix = self.builder.fit_transform(self.users_array)
 
-			### On n'a pas besoin de filtrer de nouveau les champs ici: le DictVec s'en charge! ###
-			### S'il ne connait pas un champ, il l'ignore. 									    ###
-			features_list = self.dictvec.transform(user).toarray().flatten()
+		### Sauvegarde le modèle du builder de features. ###
+		with open(features_model_path, 'wb') as f:
+			pickle.dump(self.builder, f)
 
-			if user['testset']:
-				self.features_array_test.append(features_list)
-				self.labels_test.append(user['label'])
+		self.correlationAnalysis(features_matrix)
 
-			else:
-				self.features_array_train.append(features_list)
-				self.labels_train.append(user['label'])
+		self.features_array_train, self.features_array_test, self.labels_train, self.labels_test = self.builder.split(features_matrix, self.users_array)
 		
 	def alterUsersModel(self):
 		"""
@@ -201,9 +211,7 @@ class Trainer(object):
 		self.user_model = User()
 
 		### Charge le tableau des utilisateurs dont les features sont déjà extraites. ###
-		if os.path.isfile(users_model_path):
-			with open(users_model_path, 'rb') as f:
-				users_array = pickle.load(f)
+		users_array = self.loadUsersModel()
 
 		adjusted_users = list()
 
@@ -216,46 +224,83 @@ class Trainer(object):
 			user['is_verified'] = userserver['is_verified']
 			adjusted_users.append(user)
 			
-		with open(users_model_path, 'wb') as f:
-			pickle.dump(adjusted_users, f)
+		self.saveUsersModel(adjusted_users)
+
+	def loadUsersModel(self):
+		"""
+		Charge le modèle d'utilisateurs : l'artefact en colonnes, ou à défaut l'ancien pickle.
+
+				Args:
+					(none)
+
+				Returns:
+					(dict[]) Les utilisateurs dont les features sont déjà extraites.
+		"""
+
+		if is_artifact(users_artifact_path):
+			return load_records(users_artifact_path, 'users')
+		if os.path.isfile(users_model_path):
+			with open(users_model_path, 'rb') as f:
+				return pickle.load(f)
+		return list()
+
+	def saveUsersModel(self, users_array):
+		"""
+		Enregistre le modèle d'utilisateurs en artefact, une colonne par feature.
+		"""
+
+		save_records(users_artifact_path, users_array, 'users')
 
-	def train(self):
+	def train(self, headless = False, reports_dir = reports_dir):
 		"""
 		Entraînement du modèle de classification.
+		Les métriques (validation croisée, matrice de confusion, rapport de classification, importance des features, courbe ROC et durées)
+		sont écrites dans `metrics.json`, et la courbe ROC dans `roc.png`.
 		
 			Args:
-				(none)
+				headless (bool) : mode non interactif, sans fenêtre matplotlib (backend Agg), pour les entraînements planifiés.
+				reports_dir (str) : le dossier des rapports d'entraînement.
 			
 			Returns:
-				(none)
+				(dict) Les métriques de l'entraînement.
 		"""
 
-		### Définition du classifieur de type Random Forest à 500 estimateurs. ###
-		self.clf = RandomForestClassifier(n_estimators = 500)
+		time_start = time.time()
+
+		### Score de la classification, en validation croisée. ###
+		### Les plis sont répartis sur tous les cœurs, chacun avec une forêt sur un seul cœur pour ne pas multiplier les processus. ###
+		### `pre_dispatch` borne le nombre de plis en mémoire au nombre de workers.                                                  ###
+		scores = cross_val_score(
+			RandomForestClassifier(n_estimators = N_ESTIMATORS, n_jobs = 1),
+			np.concatenate([self.features_array_train, self.features_array_test]),
+			np.concatenate([self.labels_train, self.labels_test]),
+			cv = CV_FOLDS,
+			n_jobs = N_JOBS,
+			pre_dispatch = 'n_jobs'
+		)
+		print("\nAccuracy: %0.2f (+/- %0.2f)\n" % (scores.mean(), scores.std() * 2))
+		cv_seconds = time.time() - time_start
+
+		### Définition du classifieur de type Random Forest à 500 estimateurs, entraîné sur tous les cœurs (par threads, sans copie des données). ###
+		self.clf = RandomForestClassifier(n_estimators = N_ESTIMATORS, n_jobs = N_JOBS)
 
 		### On entraîne le classifieur avec le set d'entraînement (jusqu'à l'index n_split). ###
+		time_start = time.time()
 		self.clf.fit(self.features_array_train, self.labels_train)
+		fit_seconds = time.time() - time_start
 
 		### On peut avoir l'importance des features dans la décision de la classification. ###
 		importance = self.clf.feature_importances_
 
-		### Score de la classification. ###
-		scores = cross_val_score(
-			self.clf,
-			self.features_array_train + self.features_array_test,
-			self.labels_train + self.labels_test,
-			cv = 5
-		)
-		print("\nAccuracy: %0.2f (+/- %0.2f)\n" % (scores.mean(), scores.std() * 2))
-
 		### On calcule une prédiction pour la matrice de confusion et le rapport de classification. ###
 		pred = self.clf.predict(self.features_array_test)
-		print(confusion_matrix(self.labels_test, pred))
+		matrix = confusion_matrix(self.labels_test, pred)
+		print(matrix)
 		print('\n')
 
 		### On affiche l'importance des critères de classification. ###
 		categories_total = 0
-		for couple in zip(self.dictvec.get_feature_names(), importance):
+		for couple in zip(self.builder.get_feature_names(), importance):
 			### Malheureusement lorsqu'on boucle là dessus on a l'importance de chaque type de catégories... ###
 			### Pour n'afficher que les catégories au global, on fait un test sur les features names.        ###
 			if 'category=' in couple[0]:
@@ -275,11 +320,55 @@ class Trainer(object):
 		pred2 = [predclass[1] for predclass in y_score]
 
 		### Construction de la courbe ROC. ###
-		fpr, tpr, _ = roc_curve(self.labels_test, pred2)
+		fpr, tpr, thresholds = roc_curve(self.labels_test, pred2)
 		### Aire sous la courbe. ###
 		roc_auc = auc(fpr, tpr)
 
+		### Sauvegarde le classifieur en tant que modèle. ###
+		with open(model_path, 'wb') as __f:
+			pickle.dump(self.clf, __f)
+
+		self.compactModel()
+
+		### Rapports de l'entraînement. ###
+		os.makedirs(reports_dir, exist_ok = True)
+		metrics = {
+			'accuracy': {'mean': float(scores.mean()), 'std': float(scores.std()), 'folds': scores.tolist()},
+			'confusion_matrix': matrix.tolist(),
+			'classification_report': classification_report(self.labels_test, pred, output_dict = True),
+			'feature_importances': dict(zip(self.builder.get_feature_names(), importance.tolist())),
+			'roc': {'auc': float(roc_auc), 'fpr': fpr.tolist(), 'tpr': tpr.tolist(), 'thresholds': np.nan_to_num(thresholds, posinf = 1).tolist()},
+			'seconds': {'cross_validation': round(cv_seconds, 4), 'fit': round(fit_seconds, 4)},
+			'n_train': len(self.labels_train),
+			'n_test': len(self.labels_test)
+		}
+		with open(os.path.join(reports_dir, 'metrics.json'), 'w', encoding = 'utf8') as f:
+			json.dump(metrics, f, indent = 2)
+
 		### Affichage de la courbe ROC. ###
+		self.plotRoc(fpr, tpr, roc_auc, os.path.join(reports_dir, 'roc.png'), headless)
+		return metrics
+
+	def plotRoc(self, fpr, tpr, roc_auc, path, headless = False):
+		"""
+		Trace la courbe ROC et l'enregistre en PNG. matplotlib n'est importé qu'ici, avec le backend Agg en mode non interactif.
+
+				Args:
+					fpr (float[]) : les taux de faux positifs.
+					tpr (float[]) : les taux de vrais positifs.
+					roc_auc (float) : l'aire sous la courbe.
+					path (str) : le chemin du PNG.
+					headless (bool) : n'ouvre pas de fenêtre.
+
+				Returns:
+					(none)
+		"""
+
+		import matplotlib
+		if headless:
+			matplotlib.use('Agg')
+		import matplotlib.pyplot as plt
+
 		plt.figure()
 		lw = 2
 		plt.plot(fpr, tpr, color='darkorange', lw=lw, label='ROC curve (area = %0.2f)' % roc_auc)
@@ -290,11 +379,34 @@ class Trainer(object):
 		plt.ylabel('True Positive Rate')
 		plt.title('Receiver operating characteristic example')
 		plt.legend(loc="lower right")
-		plt.show()
+		plt.savefig(path)
+		if headless:
+			plt.close()
+		else:
+			plt.show()
 
-		### Sauvegarde le classifieur en tant que modèle. ###
-		with open(model_path, 'wb') as __f:
-			pickle.dump(self.clf, __f)
+	def compactModel(self):
+		"""
+		Enregistre la forme compacte de la forêt pour l'inférence, après avoir vérifié que ses scores sur le jeu de test sont ceux du modèle complet.
+
+				Args:
+					(none)
+
+				Returns:
+					(float) L'écart maximal entre les scores des deux modèles.
+		"""
+
+		compact = CompactForest().compact(self.clf)
+		difference = float(np.abs(compact.predict_proba(self.features_array_test) - self.clf.predict_proba(self.features_array_test)).max(initial = 0))
+		if difference > COMPACT_TOLERANCE:
+			print('Compact model differs from the full model by %.6f, not saved.' % difference)
+			### Un modèle compact périmé ne doit pas être utilisé à la place du nouveau modèle complet. ###
+			if is_artifact(compact_model_path):
+				shutil.rmtree(compact_model_path)
+			return difference
+		compact.save(compact_model_path)
+		print('Compact model saved (max score difference: %.2e).' % difference)
+		return difference
 		
 	def displayFPFN(self, preds):
 		"""
@@ -336,13 +448,16 @@ class Trainer(object):
 					(none)
 		"""
 
-		### Ouvre le modèle de classification. ###
-		with open(model_path, 'rb') as f:
-			self.clf = pickle.load(f)
+		### Ouvre le modèle de classification, dans sa forme compacte s'il y en a une. ###
+		if is_artifact(compact_model_path):
+			self.clf = CompactForest().load(compact_model_path)
+		else:
+			with open(model_path, 'rb') as f:
+				self.clf = pickle.load(f)
 		
-		### Ouvre le modèle DictVec. ###
-		with open(dictvec_model_path, 'rb') as f:
-			self.dictvec = pickle.load(f)
+		### Ouvre le modèle du builder de features. ###
+		with open(features_model_path, 'rb') as f:
+			self.builder = pickle.load(f)
 
 			### L'utilisateur entre un nom de profil Instagram afin d'utiliser le modèle de classification, et estimer si cette personne est un influenceur ou non. ###
 			while True:
@@ -352,8 +467,7 @@ class Trainer(object):
 				user.getUserInfoIG()
 
 				try:
-					features_dict = {key: user.__dict__[key] for key in self.key_features}
-					features_array = self.dictvec.transform(features_dict)
+					features_array = self.builder.transform([user.__dict__])
 
 					### Prédiction. ###
 					pred = self.clf.predict(features_array)
@@ -365,47 +479,41 @@ class Trainer(object):
 					print('The user doesn\'t exist or has a private account. Please try again.')
 					pass
 
-	def pearsonr(self, x, y):
+	def correlationAnalysis(self, features_matrix):
 		"""
-		Calcule le coefficient de corrélation de Pearson.
+		Calcule les corrélations de Pearson et de Spearman entre les features, et avec le label, en une passe vectorisée sur la matrice des features.
+		Le rapport est affiché et écrit en JSON.
 
-			Args:
-				x (float[]) : La liste des échantillons de la variable aléatoire X.
-				y (float[]) : La liste des échantillons de la variable aléatoire Y.
-			
-			Returns:
-				(float) Le coefficient de corrélation de Pearson compris entre 1 (corrélation linéaire parfaite) et -1 (corrélation linéaire négative parfaite).
+				Args:
+					features_matrix (np.ndarray) : la matrice des features des utilisateurs.
+
+				Returns:
+					(dict) Le rapport de corrélations.
 		"""
-		
-		multlist = lambda a, b: map(operator.mul, a, b)
-		xy = multlist(x, y)
-		xx = multlist(x, x)
-		yy = multlist(y, y)
-		return (mean(xy) - mean(x) * mean(y)) / math.sqrt((mean(xx) - mean(x)**2) * (mean(yy) - mean(y)**2))
-
-	def correlationAnalysis(self):
-		mat = []
-		for index, xkey in enumerate(tqdm(self.key_features)):
-			row = []
-			for ykey in self.key_features[index:]:
-				row.append(
-					self.pearsonr(
-						[user[xkey] for user in self.users_array],
-						[user[ykey] for user in self.users_array]
-					)
-				)
-			row = [0] * index + row
-			mat.append(row)
-		pp.pprint(mat)
+
+		labels = [user['label'] for user in self.users_array]
+		report = correlation_report(features_matrix, self.builder.get_feature_names(), labels)
+		pp.pprint(report['pearson'])
+		pp.pprint(report['label'])
+		if report['constant']:
+			print('Constant features: %s' % ', '.join(report['constant']))
+		write_report(report, correlation_report_path)
+		return report
 
 if __name__ == "__main__":
 	parser = argparse.ArgumentParser()
 	parser.add_argument('--alter-users', action = 'store_true')
+	parser.add_argument('--profile', default = None, help = 'Active le profilage des fonctions chaudes, avec les rapports dans ce dossier.')
+	parser.add_argument('--headless', action = 'store_true', help = 'Entraîne sans fenêtre matplotlib, les rapports sont seulement écrits sur disque.')
+	parser.add_argument('--reports-dir', default = reports_dir, help = 'Le dossier des rapports d\'entraînement (métriques JSON et courbe ROC).')
 	args = parser.parse_args()
 
+	if args.profile:
+		enable_profiling(args.profile)
+
 	trainer = Trainer()
 	if args.alter_users:
 		trainer.alterUsersModel()
 	
 	trainer.buildUsersModel()
-	trainer.train()
\ No newline at end of file
+	trainer.train(headless = args.headless, reports_dir = args.reports_dir)
\ No newline at end of file
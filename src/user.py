@@ -26,6 +26,7 @@ import regex
 import sys
 import os
 import configparser
+import warnings
 import numpy as np
 
 from ast import literal_eval as make_tuple
@@ -38,28 +39,27 @@ import scipy
 import scipy.misc
 import scipy.cluster
 from cv2 import cv2
-import matplotlib.pyplot as plt
-import requests
 from InstagramAPI import InstagramAPI
 from tqdm import tqdm
 from PIL import Image
 from colormath.color_objects import LabColor, sRGBColor
 from colormath.color_conversions import convert_color
 from mpl_toolkits.mplot3d import Axes3D
-from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
-from sklearn.svm import LinearSVC
-from sklearn.calibration import CalibratedClassifierCV
 
 sys.path.append(os.path.dirname(__file__))
 
 ### Custom libs. ###
 from sql_client import SqlClient
-from utils import get_post_image_url
+from fetcher import AsyncFetcher
+from profiling import profiled, tag
+from artifacts import is_artifact
+from vocabulary import CompactVocabulary, counter_nbytes, MIN_WEIGHT
+from biography import BiographyScorer, biographies_model_path, save_trained, NEUTRAL_SCORE
 
 ### On set les chemins d'accès et le prettyprinter. ###
 pp = pprint.PrettyPrinter(indent=2)
 comments_model_path = os.path.join(os.path.dirname(__file__), './models/comments.model')
-biographies_model_path = os.path.join(os.path.dirname(__file__), './models/biographies.model')
+comments_vocabulary_path = os.path.join(os.path.dirname(__file__), './models/comments')
 users_model_path = os.path.join(os.path.dirname(__file__), './models/users_sample.model')
 config_path = os.path.join(os.path.dirname(__file__), './config.ini')
 
@@ -128,24 +128,27 @@ class User(object):
 		self.sqlClient.closeCursor()
 		return allUsers
 
-	def getUserInfoIG(self):
+	@profiled('User.getUserInfoIG', scope = lambda self, *args, **kwargs: self.username)
+	def getUserInfoIG(self, api = None, fetcher = None):
 		"""
 		Récupération des critères de l'utilisateur via l'API d'Instagram.
 		Utilisée lorsqu'on veut tester notre modèle en live, sur un utilisateur qui n'est pas forcément en base.
 
 		Args:
-				(none)
+				api (InstagramAPI) : une API déjà connectée (par exemple rejouée depuis une archive), à la place de celle du fichier de config.
+				fetcher (AsyncFetcher) : la couche de récupération des images et des commentaires, par défaut un `AsyncFetcher` sur l'API.
 
 		Returns:
 				(none)
 		"""
 
-		igusername = self.config['Instagram']['user']
-		igpassword = self.config['Instagram']['password']
-
 		### Connexion à l'API. ###
-		self.InstagramAPI = InstagramAPI(igusername, igpassword)
-		self.InstagramAPI.login()
+		if api is None:
+			igusername = self.config['Instagram']['user']
+			igpassword = self.config['Instagram']['password']
+			api = InstagramAPI(igusername, igpassword)
+			api.login()
+		self.InstagramAPI = api
 		### On essaye d'extraire les features du profil Instagram. 								  					 ###
 		### Si il y a une erreur, on pass (on ne veut pas break e script en cas de re-promptage). 					 ###
 		### Les `time.sleep` préviennent des erreurs 503, dues à une sollicitation trop soudaine de l'API Instagram. ###
@@ -176,6 +179,7 @@ class User(object):
 		### On récupère le feed entier de l'utilisateur, afin d'analyser certaines métriques. ###
 		self.InstagramAPI.getUserFeed(user_server['pk'])
 		self.feed = self.InstagramAPI.LastJson['items']
+		tag(users = 1, posts = len(self.feed))
 
 		if len(self.feed) == 0:
 			print('This user has no posts !')
@@ -187,9 +191,14 @@ class User(object):
 		### On initialise les listes utiles pour l'étude. ###
 		self.initLists()
 
+		### On récupère en parallèle les images et les commentaires de tout le feed, au lieu de deux requêtes séquentielles par post. ###
+		fetcher = fetcher or AsyncFetcher(self.InstagramAPI)
+		images, comments_list = fetcher.fetchFeed(self.feed)
+		fetcher.close()
+
 		### On boucle sur le feed afin d'en extraire les données pertinentes pour le calcul de nos features. 					       ###
 		### On prend l'intégralité de la première réponse de l'API (~ 12 - 18 posts) pour ne pas avoir un temps d'éxécution trop long. ###
-		for post in tqdm(self.feed): ### ICI CA PEUT PETER
+		for post, image, comments in tqdm(zip(self.feed, images, comments_list), total = len(self.feed)):
 
 			###################################
 			### LIKES, COMMENTS, ENGAGEMENT ###
@@ -208,12 +217,9 @@ class User(object):
 			### IMAGES ###
 			##############	
 
-			### Depuis le JSON de réponse de l'API, on récupère l'adresse URL de la plus petite image. ###
-			url = get_post_image_url(post)
-
-			### On fait une requête HTTP.GET sur l'adresse récupérée, puis on entrait les octets de l'image en réponse. ###
-			response = requests.get(url)
-			self.imageAnalysis(response.content)
+			### Les octets de l'image ont déjà été récupérés par le fetcher; `None` si la requête a échoué. ###
+			if image is not None:
+				self.imageAnalysis(image)
 
 			##############
 			### BRANDS ###
@@ -229,14 +235,6 @@ class User(object):
 			################
 
 			### On récupère le score de commentaires sur tout le feed de l'utilisateur. ###
-			self.InstagramAPI.getMediaComments(str(post['id']))
-			comments_server = self.InstagramAPI.LastJson
-
-			if 'comments' in comments_server:
-				comments = [comment['text'] for comment in comments_server['comments']]
-			else:
-				comments = list()
-
 			self.addCommentScore(comments)
 
 		################
@@ -248,15 +246,17 @@ class User(object):
 
 		self.printFeatures()
 
-	def getUserInfoSQL(self):
+	@profiled('User.getUserInfoSQL', scope = lambda self, *args, **kwargs: self.username)
+	def getUserInfoSQL(self, features = None):
 		"""
 		On récupère les posts de l'utilisateur à partir de la BDD, et on en extrait les features nécessaires pour l'apprentissage.
 		L'intérêt de cette méthode est qu'on peut solliciter la BDD très vite par rapport à l'API Instagram, ce qui nous permet de faire un
 		apprentissage 'rapide'!
-		La méthode est cependant très similaire à `self.getUserInfoIG()`.
+		Les features numériques (likes, commentaires, engagement, fréquence...) sont calculées dans Postgres (cf. `SqlClient.getUserFeatures`) :
+		on ne rapatrie que les images et les commentaires, pour les features d'image et de texte.
 
 				Args:
-						(none)
+						features (dict) : les features numériques de l'utilisateur, si elles ont déjà été calculées pour tout un lot d'utilisateurs.
 
 				Returns:
 						(none)
@@ -264,7 +264,9 @@ class User(object):
 		self.sqlClient = SqlClient()
 
 		self.sqlClient.openCursor()
-		posts = self.sqlClient.getUserPosts(self.username)
+		if features is None:
+			features = self.sqlClient.getUserFeatures([self.username])[0]
+		tag(users = 1, posts = features['n_posts'])
 
 		###	Initialisation des listes de stockage pour les métriques. ###
 		self.initLists()
@@ -274,60 +276,22 @@ class User(object):
 		### AUDIENCE, MEDIAS ###
 		########################
 
-		self.followings = int(posts[0]['n_following'])
-		self.followers = int(posts[0]['n_follower'])
-		self.usermentions = int(posts[0]['n_usertags'])
-		self.nmedias = int(posts[0]['n_media'])
-		self.biography = str(posts[0]['biography'])
-		self.category = str(posts[0]['category'])
-		self.is_verified = posts[0]['is_verified']
-
-		self.feed = posts
-
-		for post in posts:
-
-			self.likeslist.append(post['n_likes'])
-			self.commentslist.append(post['n_comments'])
-
-			#######################################
-			### TIMESTAMPS ET TAUX D'ENGAGEMENT ###
-			#######################################
-			
-			self.timestamps.append(int(post['timestamp']))
-			self.addEngagementRate(n_likes = post['n_likes'], n_comments = post['n_comments'])
-
-			##############
-			### IMAGES ###
-			##############
-
-			img = post['image']
-
-			self.imageAnalysis(img)
+		self.setNumericFeatures(features)
 
-			##############
-			### BRANDS ###
-			##############
-
-			### Pour l'instant on ne s'en sert pas, à ré-utiliser quand on s'intéressera à la détection des placements de produits. ###
-			"""
-			brpsc = self.getBrandPresence(post)
-			if brpsc:
-				brpscs.extend(brpsc)
-			"""
-
-			################
-			### COMMENTS ###
-			################
+		##############
+		### IMAGES ###
+		##############
 
-			# On récupère les commentaires depuis la BDD, grâce à l'ID du post.
-			self.sqlClient.openCursor()
-			comments = self.sqlClient.getComments(str(post['id_post']))
-			self.sqlClient.closeCursor()
+		for image in self.sqlClient.getUserImages(self.username):
+			self.imageAnalysis(image)
 
-			comments_only = [comment['comment'] for comment in comments]
+		################
+		### COMMENTS ###
+		################
 
-			### On parcourt les commentaires du post pour en extraire le "score de commentaires". ###
-			self.addCommentScore(comments_only)
+		### On parcourt les commentaires de chaque post pour en extraire le "score de commentaires". ###
+		for comments in self.sqlClient.getUserComments(self.username):
+			self.addCommentScore(comments)
 
 		### Dernière phase: on affecte les variables d'instance (= features) une fois que tous les critères ont été traités. ###
 
@@ -335,14 +299,34 @@ class User(object):
 		### FEATURES ###
 		################
 
-		self.extractFeatures()
+		self.extractFeatures(numeric = False)
 
-		### Ici, on cherche à avoir la distorsion des k-means des couleurs du feed. 						###
-		### Parfois, on peut avoir que une ou deux couleurs outputées du k-mean.                            ###
-		### Si on a une erreur, on baisse le nombre de clusters jusqu'à ce que le k-mean puisse être opéré. ###
+		self.label = int(features['label'])
+		self.testset = features['test_set']
 
-		self.label = int(post['label'])
-		self.testset = post['test_set']
+	def setNumericFeatures(self, features):
+		"""
+		Affecte les features numériques calculées en BDD (cf. `SqlClient.getUserFeatures`).
+
+				Args:
+					features (dict) : les features numériques de l'utilisateur.
+
+				Returns:
+					None
+		"""
+
+		self.followings = int(features['n_following'])
+		self.followers = int(features['n_follower'])
+		self.usermentions = int(features['n_usertags'])
+		self.nmedias = int(features['n_media'])
+		self.biography = str(features['biography'])
+		self.category = str(features['category'])
+		self.is_verified = features['is_verified']
+		self.avglikes = features['avglikes']
+		self.avgcomments = features['avgcomments']
+		self.engagement = features['engagement']
+		self.frequency = features['frequency']
+		self.lastpost = features['lastpost']
 
 	def loadModels(self):
 		"""
@@ -355,24 +339,36 @@ class User(object):
 					None
 		"""
 
-		if not os.path.isfile(os.path.join(comments_model_path)):
-			print('Creating comments model...')
+		if not is_artifact(comments_vocabulary_path):
+			if os.path.isfile(comments_model_path):
+				### Convertit l'ancien modèle de commentaires (un `Counter` picklé) en vocabulaire compact. ###
+				print('Converting comments model...')
+				self.saveCommentsModel(pickle.load(open(comments_model_path, 'rb')))
+			else:
+				print('Creating comments model...')
 
-			### Crée le modèle de commentaires s'il n'existe pas. ###
-			self.createCommentsModel()
-		
-		if not os.path.isfile(os.path.join(biographies_model_path)):
+				### Crée le modèle de commentaires s'il n'existe pas. ###
+				self.createCommentsModel()
+
+		### Charge le modèle de commentaires, projeté en mémoire. ###
+		self.comments_model = CompactVocabulary().load(comments_vocabulary_path)
+
+		self.loadBiographiesModel()
+
+	def loadBiographiesModel(self):
+		"""
+		Charge le modèle de biographies, projeté en mémoire, ou le crée s'il n'existe pas.
+		Sans utilisateur annoté, le modèle créé reste vide et n'est pas enregistré (cf. `getBiographyScores`).
+		"""
+
+		if is_artifact(biographies_model_path):
+			self.biographies_model = BiographyScorer().load(biographies_model_path)
+		else:
 			print('Creating biographies model...')
 
 			### Crée le modèle de biographies s'il n'existe pas. ###
 			self.createBiographiesModel()
 
-		### Charge le modèle de commentaires. ###
-		self.comments_model = pickle.load(open(comments_model_path, 'rb'))
-
-		### Charge le modèle de biographies. ###
-		self.count_vect, self.tfidf_transformer, self.clf = pickle.load(open(biographies_model_path, 'rb'))
-
 	def initLists(self):
 		"""
 		Initialise les listes de stockage utilisées pour l'étude du profil.
@@ -429,6 +425,7 @@ class User(object):
 		### On ajoute le taux d'engagement du post à la liste de taux d'engagement. ###
 		self.rates.append(engagement_rate)
 
+	@profiled('User.imageAnalysis')
 	def imageAnalysis(self, imageIO):
 		"""
 		Effectue une analyse des images du feed de l'utilisateur à partir de l'URL donnée.
@@ -482,22 +479,24 @@ class User(object):
 			score = self.getCommentScore(comment)
 			self.comment_scores.append(score)
 
-	def extractFeatures(self):
+	@profiled('User.extractFeatures')
+	def extractFeatures(self, numeric = True):
 		"""
 		Extrait les features relatives à l'étude.
 
 			Args:
-				None
+				numeric (bool) : calcule aussi les features numériques à partir des listes du feed (faux si elles viennent de la BDD).
 
 			Returns:
 				None
 		"""
 
-		self.lastpost = time.time() - max(self.timestamps)
-		self.frequency = self.calculateFrequency(len(self.feed), min(self.timestamps))
-		self.engagement = mean(self.rates)
-		self.avglikes = mean(self.likeslist) if len(self.likeslist) > 1 else 0
-		self.avgcomments = mean(self.commentslist) if len(self.commentslist) > 1 else 0
+		if numeric:
+			self.lastpost = time.time() - max(self.timestamps)
+			self.frequency = self.calculateFrequency(len(self.feed), min(self.timestamps))
+			self.engagement = mean(self.rates)
+			self.avglikes = mean(self.likeslist) if len(self.likeslist) > 1 else 0
+			self.avgcomments = mean(self.commentslist) if len(self.commentslist) > 1 else 0
 		self.brandpresence = self.brpscs
 		self.brandtypes = self.getBrandTypes(self.brpscs)
 		self.commentscore = mean(self.comment_scores) * (1 + stdev(self.comment_scores)) if len(self.comment_scores) > 1 else 0
@@ -532,7 +531,7 @@ class User(object):
 		print('Is verified: %s' % str(self.is_verified))
 		print('Category: %s' % str(self.category))
 		print('N media: %s' % str(self.nmedias))
-		print('Last post: %s' % self.uiGetIlya(max(self.timestamps)))
+		print('Last post: %s' % self.uiGetIlya(time.time() - self.lastpost))
 		print('Frequency: %.2f' % float(self.frequency))
 		print('Engagement: %.2f%%' % float(self.engagement))
 		print('Average like count: %.2f' % float(self.avglikes))
@@ -639,6 +638,7 @@ class User(object):
 		distances = [np.linalg.norm(data - centroid) for data in _list]
 		return float(mean(distances))
 
+	@profiled('User.getMostDominantColour')
 	def getMostDominantColour(self, image):
 		"""
 		Retourne la couleur dominante de l'image.
@@ -794,26 +794,35 @@ class User(object):
 		Retourne le score de biographie basé sur le modèle de biographies.
 		
 				Args:
-					comment (str): la biographie sous forme de texte.
+					bio (str): la biographie sous forme de texte.
 				
 				Returns:
-					(int) Le score de qualité de biographie.
+					(float) Le score de qualité de biographie.
 		"""
 
-		if not os.path.isfile(os.path.join(biographies_model_path)):
-			print('Creating biographies model...')
+		return float(self.getBiographyScores([bio])[0])
 
-			### Crée le modèle de biographies s'il n'existe pas. ###
-			self.createBiographiesModel()
+	def getBiographyScores(self, bios):
+		"""
+		Retourne les scores d'un lot de biographies, en un seul passage dans le modèle.
+		Tant que le modèle n'est pas entraîné (aucun utilisateur annoté), les scores sont neutres.
 
-		self.count_vect, self.tfidf_transformer, self.clf = pickle.load(open(biographies_model_path, 'rb'))
+				Args:
+					bios (str[]): les biographies.
 
-		X_test_counts = self.count_vect.transform([bio])
-		self.X_test_tfidf = self.tfidf_transformer.transform(X_test_counts)
+				Returns:
+					(np.ndarray) Les scores de qualité de biographie.
+		"""
+
+		if getattr(self, 'biographies_model', None) is None:
+			self.loadBiographiesModel()
 
-		pred = self.clf.predict_proba(self.X_test_tfidf)[0][1]
-		return float(pred)
+		if not self.biographies_model.trained():
+			warnings.warn('The biography model is not trained, biographies get a neutral score of %s' % str(NEUTRAL_SCORE))
+			return np.full(len(bios), NEUTRAL_SCORE)
+		return self.biographies_model.score(bios)
 
+	@profiled('User.getCommentScore')
 	def getCommentScore(self, comment):
 		
 		"""
@@ -843,8 +852,9 @@ class User(object):
 			if _word:
 
 				### Attribue un score de commentaire inversement proportionnel à ses occurences dans tous les commentaires de la BDD. ###
-				if self.comments_model[_word] > 0:
-					word_score = 1 / self.comments_model[_word]
+				weight = self.comments_model[_word]
+				if weight > 0:
+					word_score = 1 / weight
 
 				else:
 					word_score = 1
@@ -868,12 +878,12 @@ class User(object):
 
 		return k * j * comment_score * len(word_scores)
 
-	def createCommentsModel(self):
+	def createCommentsModel(self, min_weight = None):
 		"""
 		Crée le modèle de commentaires.
 
 				Args:
-					(none)
+					min_weight (float) : le poids en dessous duquel un mot rare est élagué, par défaut celui de la section [Comments] du fichier de config.
 				
 				Returns:
 					(none)
@@ -914,12 +924,36 @@ class User(object):
 		print('Éléments non considérés : %s' % str(j))
 
 		### Sauvegarde le modèle dans le dossier models. ###
-		with open(os.path.join(comments_model_path), 'wb') as outfile:
-			pickle.dump(comment_count, outfile)
+		self.saveCommentsModel(comment_count, min_weight)
+
+	def saveCommentsModel(self, comment_count, min_weight = None):
+		"""
+		Enregistre le modèle de commentaires en vocabulaire compact, et affiche la mémoire économisée par rapport au `Counter`.
+		Les mots élagués gardent le poids plancher `min_weight` (seul le crc32 de leur forme est gardé) : ils restent parmi les mots rares au lieu de passer pour des mots jamais vus.
+
+				Args:
+					comment_count (Counter) : les poids des mots.
+					min_weight (float) : le poids en dessous duquel un mot rare est élagué, par défaut celui de la section [Comments] du fichier de config.
+
+				Returns:
+					(CompactVocabulary) Le vocabulaire.
+		"""
+
+		if min_weight is None:
+			min_weight = self.config.getfloat('Comments', 'min_weight', fallback = MIN_WEIGHT)
+		vocabulary = CompactVocabulary().build(comment_count, min_weight)
+		vocabulary.save(comments_vocabulary_path)
+		print('Vocabulary: %s words (%s pruned), %.1f MB instead of %.1f MB as a Counter.' % (
+			str(len(vocabulary)),
+			str(vocabulary.pruned),
+			vocabulary.nbytes() / 1e6,
+			counter_nbytes(comment_count) / 1e6
+		))
+		return vocabulary
 
 	def createBiographiesModel(self):
 		"""
-		Crée le modèle de commentaires.
+		Crée le modèle de biographies, à partir des biographies des utilisateurs annotés lues par lots depuis la BDD.
 
 				Args:
 					(none)
@@ -929,32 +963,11 @@ class User(object):
 		"""
 
 		self.sqlClient = SqlClient()
-
-		### Récupère toutes les biographies des utilisateurs annotés. ###
 		self.sqlClient.openCursor()
-		response = self.sqlClient.getAllBiographies()
-		self.sqlClient.closeCursor()
-
-		### Récupération des champs biographies, et labels. ###
-		bios = [row['biography'] for row in response]
-		labels = [row['label'] for row in response]
-		
-		### Construction du modèle TF-IDF et apprentissage d'un classifieur calibré pour sortir des probabilités. ###
-		### Vecteurs de comptage. ###
-		self.count_vect = CountVectorizer()
-		X_train_counts = self.count_vect.fit_transform(bios)
-
-		### Transformateur TF-IDF. ###
-		self.tfidf_transformer = TfidfTransformer()
-		self.X_train_tfidf = self.tfidf_transformer.fit_transform(X_train_counts)
-
-		### Entraînement du classificateur. ###
-		oneVsRest = CalibratedClassifierCV()
-		self.clf = oneVsRest.fit(self.X_train_tfidf, labels)
-
-		### Sauvegarde du modèle. ###
-		with open(os.path.join(biographies_model_path), 'wb') as outfile:
-			pickle.dump((self.count_vect, self.tfidf_transformer, self.clf), outfile)
+		try:
+			self.biographies_model = save_trained(BiographyScorer().fit_stream(self.sqlClient.iterBiographies), biographies_model_path)
+		finally:
+			self.sqlClient.closeCursor()
 
 	def processWordComment(self, word):
 		"""
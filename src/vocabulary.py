@@ -0,0 +1,197 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import zlib
+import bisect
+
+### Installed libs. ###
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+### Custom libs. ###
+from artifacts import save_artifact, load_artifact
+
+ARTIFACT_KIND = 'vocabulary'
+
+### Poids en dessous duquel un mot est élagué (0 : aucun élagage), et taux de remplissage maximal de la table de hachage. ###
+MIN_WEIGHT = 0
+LOAD_FACTOR = 0.5
+
+def counter_nbytes(counter):
+	"""
+	Estime la mémoire occupée par un dictionnaire de mots et de poids Python : la table du dictionnaire, les chaînes et les flottants.
+	"""
+
+	return sys.getsizeof(counter) + sum(sys.getsizeof(token) + sys.getsizeof(weight) for token, weight in counter.items())
+
+class CompactVocabulary(object):
+	"""
+	Vocabulaire compact du modèle de commentaires, à la place d'un `Counter` de millions de chaînes et de flottants Python.
+	Les mots sont concaténés en UTF-8 dans un seul tableau d'octets, avec leurs positions, et leurs poids dans un tableau float32.
+	Une table de hachage ouverte (crc32, sondage linéaire) donne l'index d'un mot; le tout est enregistré en artefact projetable en mémoire.
+	Un mot absent a un poids nul, comme dans le `Counter`. Un mot élagué garde le poids plancher `min_weight` : seul le crc32 de sa forme
+	est gardé (4 octets), pour qu'il reste parmi les mots rares au lieu de passer pour un mot inconnu.
+	"""
+
+	def __init__(self):
+		"""
+		__init__ function.
+		"""
+
+		super().__init__()
+		self.setArrays(
+			np.zeros(0, dtype = np.uint8),
+			np.zeros(1, dtype = np.int32),
+			np.zeros(0, dtype = np.float32),
+			np.full(1, -1, dtype = np.int32),
+			np.zeros(0, dtype = np.uint32)
+		)
+		self.pruned = 0
+		self.min_weight = 0.0
+
+	def setArrays(self, data, offsets, weights, slots, pruned_hashes):
+		"""
+		Installe les tableaux du vocabulaire, et leurs vues `memoryview` pour des accès unitaires rapides dans `get`.
+		"""
+
+		self.data, self.offsets, self.weights, self.slots, self.pruned_hashes = data, offsets, weights, slots, pruned_hashes
+		self._data = memoryview(data)
+		self._offsets = memoryview(offsets)
+		self._weights = memoryview(weights)
+		self._slots = memoryview(slots)
+		self._pruned_hashes = memoryview(pruned_hashes)
+		self.mask = len(slots) - 1
+
+	def build(self, counter, min_weight = MIN_WEIGHT):
+		"""
+		Construit le vocabulaire à partir d'un dictionnaire de mots et de poids.
+
+				Args:
+					counter (dict) : les poids des mots.
+					min_weight (float) : le poids en dessous duquel un mot rare est élagué.
+
+				Returns:
+					(CompactVocabulary) Le vocabulaire lui-même.
+		"""
+
+		items = sorted((token, weight) for token, weight in counter.items() if weight >= min_weight)
+		self.pruned = len(counter) - len(items)
+		self.min_weight = float(min_weight)
+		pruned_hashes = np.unique(np.array([zlib.crc32(token.encode('utf8')) for token, weight in counter.items() if weight < min_weight], dtype = np.uint32))
+		keys = [token.encode('utf8') for token, _ in items]
+
+		lengths = np.array([len(key) for key in keys], dtype = np.int64)
+		offsets = np.zeros(len(keys) + 1, dtype = np.int32 if lengths.sum() < 2 ** 31 else np.int64)
+		offsets[1:] = np.cumsum(lengths)
+		data = np.frombuffer(b''.join(keys), dtype = np.uint8).copy()
+		weights = np.array([weight for _, weight in items], dtype = np.float32)
+
+		### Table en puissance de deux, remplie au plus à `LOAD_FACTOR` : en moyenne moins de deux sondages par recherche. ###
+		size = 1 << max(3, int(np.ceil(np.log2(max(len(keys), 1) / LOAD_FACTOR))))
+		slots = [-1] * size
+		mask = size - 1
+		for index, key in enumerate(keys):
+			slot = zlib.crc32(key) & mask
+			while slots[slot] >= 0:
+				slot = (slot + 1) & mask
+			slots[slot] = index
+
+		self.setArrays(data, offsets, weights, np.array(slots, dtype = np.int32), pruned_hashes)
+		return self
+
+	def get(self, token, default = 0.0):
+		"""
+		Retourne le poids du mot, `min_weight` s'il a été élagué, ou `default` s'il est absent.
+		"""
+
+		key = token.encode('utf8')
+		crc = zlib.crc32(key)
+		slot = crc & self.mask
+		while True:
+			index = self._slots[slot]
+			if index < 0:
+				position = bisect.bisect_left(self._pruned_hashes, crc)
+				if position < len(self._pruned_hashes) and self._pruned_hashes[position] == crc:
+					return self.min_weight
+				return default
+			if self._data[self._offsets[index]:self._offsets[index + 1]] == key:
+				return self._weights[index]
+			slot = (slot + 1) & self.mask
+
+	def __getitem__(self, token):
+		return self.get(token)
+
+	def __contains__(self, token):
+		return self.get(token, None) is not None
+
+	def __len__(self):
+		return len(self.weights)
+
+	def tokens(self):
+		"""
+		Retourne la liste des mots, dans l'ordre trié.
+		"""
+
+		data = bytes(self._data)
+		return [data[start:end].decode('utf8') for start, end in zip(self.offsets[:-1].tolist(), self.offsets[1:].tolist())]
+
+	def nbytes(self):
+		"""
+		Retourne la taille des tableaux du vocabulaire, en octets.
+		"""
+
+		return int(self.data.nbytes + self.offsets.nbytes + self.weights.nbytes + self.slots.nbytes + self.pruned_hashes.nbytes)
+
+	def save(self, path):
+		"""
+		Enregistre le vocabulaire en artefact (cf. `artifacts.py`).
+		"""
+
+		save_artifact(path, {
+			'data': self.data,
+			'offsets': self.offsets,
+			'weights': self.weights,
+			'slots': self.slots,
+			'pruned_hashes': self.pruned_hashes
+		}, ARTIFACT_KIND, {'n_tokens': len(self), 'pruned': self.pruned, 'min_weight': self.min_weight})
+
+	def load(self, path, mmap = True):
+		"""
+		Charge un vocabulaire enregistré avec `save`.
+
+				Args:
+					path (str) : le chemin de l'artefact.
+					mmap (bool) : projette les tableaux en mémoire, partagés entre les processus, plutôt que de les lire.
+
+				Returns:
+					(CompactVocabulary) Le vocabulaire lui-même.
+		"""
+
+		arrays, metadata = load_artifact(path, ARTIFACT_KIND, mmap = mmap)
+		### Les vocabulaires enregistrés sans plancher n'ont pas de mots élagués à retrouver. ###
+		pruned_hashes = arrays.get('pruned_hashes', np.zeros(0, dtype = np.uint32))
+		self.setArrays(arrays['data'], arrays['offsets'], arrays['weights'], arrays['slots'], pruned_hashes)
+		self.pruned = metadata['pruned']
+		self.min_weight = metadata.get('min_weight', 0.0)
+		return self
@@ -0,0 +1,367 @@
+"""
+Copyright © 2018 Valentin Berthelot.
+
+This file is part of Instaseek.
+
+Instaseek is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+Instaseek is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with Instaseek. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+### System libs. ###
+import sys
+import os
+import json
+import time
+import base64
+import queue
+import threading
+
+sys.path.append(os.path.dirname(__file__))
+
+### Paramètres par défaut de l'écriture différée. ###
+QUEUE_SIZE = 1000
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 5
+RETRY_DELAY = 30
+
+### Nombre de rejeux en échec d'un même lot, la base répondant, avant de l'écrire unité par unité et de mettre de côté celles qui échouent. ###
+MAX_REPLAY_ATTEMPTS = 5
+spill_path = os.path.join(os.path.dirname(__file__), './spill.jsonl')
+
+def encode_unit(unit):
+	"""
+	Sérialise une unité d'ingestion en une ligne JSON, images encodées en base64.
+	"""
+
+	unit = dict(unit)
+	unit['images'] = {url: base64.b64encode(image).decode('ascii') for url, image in unit.get('images', dict()).items()}
+	return json.dumps(unit)
+
+def decode_unit(line):
+	"""
+	Désérialise une unité d'ingestion écrite par `encode_unit`.
+	"""
+
+	unit = json.loads(line)
+	unit['images'] = {url: base64.b64decode(image) for url, image in unit.get('images', dict()).items()}
+	return unit
+
+class WriteBehindWriter(object):
+	"""
+	Écriture différée des unités d'ingestion du streamer en base.
+	Un thread d'écriture vide une file bornée et écrit les unités par lots, en une transaction par lot, dès que le lot est plein ou
+	que l'intervalle d'écriture est écoulé. Les unités que la base rejette sont mises de côté dans un journal `.rejected`. Si Postgres est indisponible, les lots sont ajoutés à un journal local (une unité JSON par ligne),
+	rejoué dès que la base répond de nouveau.
+	"""
+
+	def __init__(self, clientFactory, queue_size = QUEUE_SIZE, batch_size = BATCH_SIZE, flush_interval = FLUSH_INTERVAL, spill_path = spill_path, retry_delay = RETRY_DELAY, metrics = None):
+		"""
+		__init__ function.
+
+				Args:
+					clientFactory (function) : crée un client SQL (`SqlClient`), propre au thread d'écriture.
+					queue_size (int) : le nombre maximal d'unités en attente; au-delà, `put` bloque le streamer.
+					batch_size (int) : le nombre maximal d'unités par transaction.
+					flush_interval (float) : le délai maximal, en secondes, avant l'écriture d'un lot incomplet.
+					spill_path (str) : le journal local des unités qui n'ont pas pu être écrites.
+					retry_delay (float) : le délai avant de retenter la base après une erreur, en secondes.
+					metrics (Metrics) : les métriques du streamer, optionnelles.
+		"""
+
+		super().__init__()
+		self.clientFactory = clientFactory
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.spill_path = spill_path
+		self.retry_delay = retry_delay
+		self.metrics = metrics
+		self.client = None
+		self.retry_at = 0
+		self.replay_failures = 0
+		self.replay_at = 0
+		self.queue = queue.Queue(maxsize = queue_size)
+		self.lock = threading.Lock()
+		self.pending = dict()
+		self.durable = list()
+		self.stopping = threading.Event()
+		self.thread = threading.Thread(target = self.run, name = 'write-behind')
+		self.thread.daemon = True
+		self.thread.start()
+
+	def put(self, unit):
+		"""
+		Met une unité en attente d'écriture. Bloque si la file est pleine, pour que le streamer ralentisse au rythme de la base.
+
+				Args:
+					unit (dict) : l'unité d'ingestion d'un post.
+
+				Returns:
+					(none)
+		"""
+
+		with self.lock:
+			post_id = str(unit['post']['id'])
+			self.pending[post_id] = self.pending.get(post_id, 0) + 1
+		self.queue.put(unit)
+
+	def isPending(self, post_id):
+		"""
+		Indique si un post est en attente d'écriture.
+		"""
+
+		with self.lock:
+			return str(post_id) in self.pending
+
+	def drainDurable(self):
+		"""
+		Retourne, et oublie, les ids des posts écrits en base ou dans le journal depuis le dernier appel.
+		"""
+
+		with self.lock:
+			durable, self.durable = self.durable, list()
+		return durable
+
+	def run(self):
+		"""
+		Boucle du thread d'écriture : constitue les lots et les écrit.
+		"""
+
+		while not (self.stopping.is_set() and self.queue.empty()):
+			try:
+				batch = [self.queue.get(timeout = 0.5)]
+			except queue.Empty:
+				self.replay()
+				continue
+
+			### On complète le lot jusqu'à sa taille maximale, sans attendre plus que l'intervalle d'écriture. ###
+			deadline = time.time() + self.flush_interval
+			while len(batch) < self.batch_size:
+				timeout = deadline - time.time()
+				if timeout <= 0 or self.stopping.is_set():
+					break
+				try:
+					batch.append(self.queue.get(timeout = min(timeout, 0.5)))
+				except queue.Empty:
+					if self.stopping.is_set():
+						break
+
+			try:
+				self.write(batch)
+			finally:
+				for _ in batch:
+					self.queue.task_done()
+		self.replay()
+
+	def connect(self):
+		"""
+		Retourne le client SQL du thread d'écriture, en le (re)créant si besoin. `None` si la base est indisponible.
+		"""
+
+		if self.client is not None:
+			return self.client
+		if time.time() < self.retry_at:
+			return None
+		try:
+			self.client = self.clientFactory()
+			self.client.openCursor()
+		except Exception as e:
+			print('Write-behind: database unavailable (%s)' % str(e).strip(), flush = True)
+			self.fail()
+		return self.client
+
+	def fail(self):
+		"""
+		Abandonne le client SQL après une erreur, et reporte la prochaine tentative.
+		"""
+
+		if self.metrics is not None:
+			self.metrics.error('postgres')
+		try:
+			self.client.close()
+		except Exception:
+			pass
+		self.client = None
+		self.retry_at = time.time() + self.retry_delay
+
+	def insert(self, units):
+		"""
+		Écrit un lot d'unités en base, en une transaction.
+
+				Args:
+					units (dict[]) : les unités.
+
+				Returns:
+					(bool) Vrai si le lot a été écrit.
+		"""
+
+		client = self.connect()
+		if client is None:
+			return False
+		time_start = time.time()
+		try:
+			rejected = client.insertUnits(units) or list()
+		except Exception as e:
+			print('Write-behind: batch of %s units failed (%s)' % (str(len(units)), str(e).strip()), flush = True)
+			### La transaction est déjà annulée : on ne se reconnecte que si la connexion est perdue. ###
+			if client.isClosed():
+				self.fail()
+			elif self.metrics is not None:
+				self.metrics.error('postgres')
+			return False
+		if rejected:
+			self.reject(rejected)
+		if self.metrics is not None:
+			self.metrics.observe('sql.insertUnits', time.time() - time_start)
+			self.metrics.inc('units_written', len(units) - len(rejected))
+		return True
+
+	def reject(self, units):
+		"""
+		Met de côté les unités rejetées par la base (données invalides) dans un journal à part, qui n'est pas rejoué.
+		"""
+
+		try:
+			with open(self.spill_path + '.rejected', 'a', encoding = 'utf8') as f:
+				for unit in units:
+					f.write(encode_unit(unit) + '\n')
+		except Exception as e:
+			print('Write-behind: could not log %s rejected units (%s)' % (str(len(units)), str(e).strip()), flush = True)
+		if self.metrics is not None:
+			self.metrics.inc('units_rejected', len(units))
+
+	def write(self, batch):
+		"""
+		Écrit un lot en base, ou l'ajoute au journal local si la base est indisponible. Dans les deux cas, ses posts deviennent durables.
+		"""
+
+		durable = True
+		if not self.insert(batch):
+			try:
+				self.spill(batch)
+			except Exception as e:
+				print('Write-behind: could not spill %s units (%s)' % (str(len(batch)), str(e).strip()), flush = True)
+				durable = False
+		with self.lock:
+			for unit in batch:
+				post_id = str(unit['post']['id'])
+				self.pending[post_id] -= 1
+				if self.pending[post_id] == 0:
+					del self.pending[post_id]
+				if durable:
+					self.durable.append(post_id)
+
+	def spill(self, units):
+		"""
+		Ajoute des unités au journal local, synchronisé sur le disque.
+		"""
+
+		with open(self.spill_path, 'a', encoding = 'utf8') as f:
+			for unit in units:
+				f.write(encode_unit(unit) + '\n')
+			f.flush()
+			os.fsync(f.fileno())
+		if self.metrics is not None:
+			self.metrics.inc('units_spilled', len(units))
+
+	def replay(self):
+		"""
+		Rejoue le journal local si la base est disponible. Les unités non écrites sont remises dans le journal.
+		Les écritures étant des upserts, rejouer une unité déjà écrite est sans effet.
+		Un lot qui échoue alors que la base répond (erreur de schéma, de contrainte...) est retenté avec un délai qui double à chaque échec;
+		après `MAX_REPLAY_ATTEMPTS` échecs, il est écrit unité par unité et les unités qui échouent encore sont mises de côté (cf. `reject`).
+
+				Args:
+					(none)
+
+				Returns:
+					(int) Le nombre d'unités rejouées.
+		"""
+
+		if not os.path.isfile(self.spill_path) or time.time() < self.replay_at or self.connect() is None:
+			return 0
+
+		replaying_path = self.spill_path + '.replaying'
+		if not os.path.isfile(replaying_path):
+			os.replace(self.spill_path, replaying_path)
+		with open(replaying_path, 'r', encoding = 'utf8') as f:
+			units = [decode_unit(line) for line in f if line.strip()]
+
+		replayed = 0
+		for index in range(0, len(units), self.batch_size):
+			batch = units[index:index + self.batch_size]
+			if self.insert(batch):
+				replayed += len(batch)
+				self.replay_failures = 0
+				continue
+			### Sans client, la connexion est perdue : la reconnexion a déjà son propre délai. ###
+			remaining = units[index:]
+			if self.client is not None:
+				self.replay_failures += 1
+				if self.replay_failures >= MAX_REPLAY_ATTEMPTS:
+					self.replay_failures = 0
+					written, lost = self.isolate(batch)
+					replayed += written
+					if not lost:
+						continue
+					remaining = lost + units[index + self.batch_size:]
+				else:
+					self.replay_at = time.time() + self.retry_delay * 2 ** (self.replay_failures - 1)
+			self.spill(remaining)
+			break
+		os.remove(replaying_path)
+		if replayed:
+			print('Write-behind: replayed %s spilled units' % str(replayed), flush = True)
+			if self.metrics is not None:
+				self.metrics.inc('units_replayed', replayed)
+		return replayed
+
+	def isolate(self, batch):
+		"""
+		Écrit un lot unité par unité, et met de côté les unités que la base refuse encore.
+
+				Args:
+					batch (dict[]) : les unités d'un lot qui échoue de façon répétée.
+
+				Returns:
+					(tuple) Le nombre d'unités écrites, et les unités restantes si la connexion a été perdue en route.
+		"""
+
+		written = 0
+		for position, unit in enumerate(batch):
+			if self.insert([unit]):
+				written += 1
+			elif self.client is not None:
+				print('Write-behind: post %s failed %s replays, set aside' % (str(unit['post']['id']), str(MAX_REPLAY_ATTEMPTS)), flush = True)
+				self.reject([unit])
+			else:
+				return written, batch[position:]
+		return written, list()
+
+	def flush(self):
+		"""
+		Attend que toutes les unités en attente soient écrites (en base ou dans le journal).
+		"""
+
+		self.queue.join()
+
+	def close(self):
+		"""
+		Écrit les unités en attente, arrête le thread d'écriture et ferme le client SQL.
+		"""
+
+		self.stopping.set()
+		self.thread.join()
+		if self.client is not None:
+			self.client.close()
+			self.client = None